@@ -0,0 +1,262 @@
+# admission.py
+"""
+Admission control for upstream model runs.
+
+Every run holds a worker thread and an upstream slot, for minutes (chat runs)
+or hours (ABM validation). Before calling the upstream, a run takes a ticket:
+
+- concurrency caps per user (sub), per session and per model route, held as
+  leases so a crashed worker cannot keep a slot forever;
+- a token bucket per user, limiting how fast new runs start.
+
+Runs over a limit are queued FIFO per model route instead of being rejected.
+A queued run is skipped over (not waited for) while only its own user or
+session caps hold it back, so one heavy user cannot block everyone else's
+runs. Waiters poll and get their queue position pushed to their open tabs as
+``queue.position`` events (notifications.py); ``queue.admitted`` follows when
+the run starts. Queue entries whose waiter stopped polling are dropped.
+Callers that must not hold a thread while queued (sweeps.py) poll a ticket
+themselves with ``try_admit`` and give it back with ``release``.
+
+The decision is one Lua script, so the limits hold across all workers
+(standalone Redis: the script reads other users' keys from the queue).
+
+Config (env):
+    ADMISSION_ENABLED               0 to disable admission control (default: 1)
+    ADMISSION_USER_CONCURRENCY      parallel runs per user (default: 3)
+    ADMISSION_SESSION_CONCURRENCY   parallel runs per session (default: 2)
+    ADMISSION_MODEL_CONCURRENCY     parallel runs per model route (default: 8)
+    ADMISSION_RATE_PER_MIN          run starts per user per minute, sustained (default: 6)
+    ADMISSION_BURST                 run starts per user in a burst (default: 3)
+    ADMISSION_POLL_SEC              how often a queued run re-checks (default: 1)
+    ADMISSION_STALE_SEC             drop queue entries not polled for this long (default: 30)
+    ADMISSION_DEFAULT_LEASE_SEC     slot lease for runs without a read timeout (default: 30 min)
+"""
+import os
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from redis_conn import redis_client
+from notifications import publish_event
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+ADMISSION_USER_CONCURRENCY = int(os.getenv("ADMISSION_USER_CONCURRENCY", "3"))
+ADMISSION_SESSION_CONCURRENCY = int(os.getenv("ADMISSION_SESSION_CONCURRENCY", "2"))
+ADMISSION_MODEL_CONCURRENCY = int(os.getenv("ADMISSION_MODEL_CONCURRENCY", "8"))
+ADMISSION_RATE_PER_MIN = float(os.getenv("ADMISSION_RATE_PER_MIN", "6"))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "3"))
+ADMISSION_POLL_SEC = float(os.getenv("ADMISSION_POLL_SEC", "1"))
+ADMISSION_STALE_SEC = int(os.getenv("ADMISSION_STALE_SEC", "30"))
+ADMISSION_DEFAULT_LEASE_SEC = int(os.getenv("ADMISSION_DEFAULT_LEASE_SEC", str(30 * 60)))
+
+# queue/active members are "ticket|sub|session"; these prefixes are rebuilt inside the script
+_ACTIVE_USER = "admit:active:user:"
+_ACTIVE_SESSION = "admit:active:session:"
+_BUCKET = "admit:bucket:"
+
+
+class AdmissionTimeout(Exception):
+    """The run waited longer than allowed for a free slot."""
+
+
+# ---------- Key helpers ----------
+def _k_queue(model: str) -> str:
+    return f"admit:queue:{model}"
+
+def _k_seen(model: str) -> str:
+    return f"admit:seen:{model}"
+
+def _k_seq(model: str) -> str:
+    return f"admit:seq:{model}"
+
+def _k_active_model(model: str) -> str:
+    return f"admit:active:model:{model}"
+
+
+# ---------- Scripts ----------
+# returns {admitted (0/1), queue position, what holds it back}
+_ACQUIRE_LUA = """
+local member = ARGV[1]
+local now = tonumber(ARGV[2])
+local lease_ms = tonumber(ARGV[3])
+local model_cap = tonumber(ARGV[4])
+local user_cap = tonumber(ARGV[5])
+local session_cap = tonumber(ARGV[6])
+local rate = tonumber(ARGV[7])      -- tokens per ms
+local burst = tonumber(ARGV[8])
+local stale_ms = tonumber(ARGV[9])
+local ttl = math.ceil((lease_ms + stale_ms) / 1000)
+
+local function split(m)
+    local _, sub, sid = string.match(m, "^([^|]*)|([^|]*)|(.*)$")
+    return sub, sid
+end
+
+local function active(key)
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    return redis.call('ZCARD', key)
+end
+
+local function tokens(sub)
+    local b = redis.call('HMGET', ARGV[12] .. sub, 'tokens', 'ts')
+    local t = tonumber(b[1]) or burst
+    local ts = tonumber(b[2]) or now
+    return math.min(burst, t + (now - ts) * rate)
+end
+
+local function can_start(sub, sid)
+    if active(ARGV[10] .. sub) >= user_cap then return 'user' end
+    if active(ARGV[11] .. sid) >= session_cap then return 'session' end
+    if tokens(sub) < 1 then return 'rate' end
+    return nil
+end
+
+if not redis.call('ZSCORE', KEYS[1], member) then
+    redis.call('ZADD', KEYS[1], redis.call('INCR', KEYS[3]), member)
+end
+redis.call('HSET', KEYS[2], member, now)
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('EXPIRE', KEYS[3], ttl)
+
+-- runs ahead that could start now; those held back by their own limits don't count
+local ahead = 0
+local queued = redis.call('ZRANGE', KEYS[1], 0, -1)
+for _, m in ipairs(queued) do
+    if m == member then break end
+    local seen = tonumber(redis.call('HGET', KEYS[2], m))
+    if not seen or seen < now - stale_ms then
+        redis.call('ZREM', KEYS[1], m)
+        redis.call('HDEL', KEYS[2], m)
+    else
+        local sub, sid = split(m)
+        if not can_start(sub, sid) then ahead = ahead + 1 end
+    end
+end
+
+local sub, sid = split(member)
+local blocked = can_start(sub, sid)
+if blocked then return {0, ahead + 1, blocked} end
+if active(KEYS[4]) + ahead >= model_cap then return {0, ahead + 1, 'model'} end
+
+redis.call('HSET', ARGV[12] .. sub, 'tokens', tokens(sub) - 1, 'ts', now)
+redis.call('EXPIRE', ARGV[12] .. sub, math.ceil(burst / rate / 1000) + 1)
+for _, key in ipairs({KEYS[4], ARGV[10] .. sub, ARGV[11] .. sid}) do
+    redis.call('ZADD', key, now + lease_ms, member)
+    if redis.call('PTTL', key) < lease_ms then redis.call('PEXPIRE', key, lease_ms) end
+end
+redis.call('ZREM', KEYS[1], member)
+redis.call('HDEL', KEYS[2], member)
+return {1, 0, 'ok'}
+"""
+_acquire_script = redis_client.register_script(_ACQUIRE_LUA)
+
+
+# ---------- Ticket ----------
+def _lease_sec(timeout) -> int:
+    """Slot lease from a requests timeout ((connect, read) or read seconds) plus a minute of slack."""
+    read = timeout[-1] if isinstance(timeout, (tuple, list)) else timeout
+    return int(read) + 60 if read else ADMISSION_DEFAULT_LEASE_SEC
+
+def _try_acquire(model: str, member: str, lease_sec: int):
+    admitted, position, reason = _acquire_script(
+        keys=[_k_queue(model), _k_seen(model), _k_seq(model), _k_active_model(model)],
+        args=[member, int(time.time() * 1000), lease_sec * 1000,
+              ADMISSION_MODEL_CONCURRENCY, ADMISSION_USER_CONCURRENCY, ADMISSION_SESSION_CONCURRENCY,
+              ADMISSION_RATE_PER_MIN / 60000.0, ADMISSION_BURST, ADMISSION_STALE_SEC * 1000,
+              _ACTIVE_USER, _ACTIVE_SESSION, _BUCKET],
+    )
+    return bool(admitted), int(position), reason
+
+def _release(model: str, member: str) -> None:
+    _, sub, sid = member.split("|", 2)
+    pipe = redis_client.pipeline()
+    pipe.zrem(_k_active_model(model), member)
+    pipe.zrem(_ACTIVE_USER + sub, member)
+    pipe.zrem(_ACTIVE_SESSION + sid, member)
+    pipe.zrem(_k_queue(model), member)
+    pipe.hdel(_k_seen(model), member)
+    pipe.execute()
+
+
+def ticket(sub: Optional[str], session_id: Optional[str]) -> str:
+    """A new queue ticket for try_admit / release."""
+    return f"{uuid.uuid4().hex}|{sub or '-'}|{session_id or '-'}"
+
+def try_admit(model: str, member: str, timeout=None) -> bool:
+    """
+    One non-blocking admission attempt: True once the ticket holds a run slot
+    (give it back with ``release``). A ticket that got False stays queued; poll
+    it again within ADMISSION_STALE_SEC or release it. Fails open.
+    """
+    if not ADMISSION_ENABLED:
+        return True
+    try:
+        return _try_acquire(model, member, _lease_sec(timeout))[0]
+    except Exception:
+        logger.exception("Admission check failed; running without it | model=%s", model)
+        return True
+
+def release(model: str, member: str) -> None:
+    """Give back a ticket's slot, or take it out of the queue."""
+    if not ADMISSION_ENABLED:
+        return
+    try:
+        _release(model, member)
+    except Exception:
+        logger.exception("Failed to release run slot | model=%s", model)
+
+
+@contextmanager
+def admitted(model: str, sub: Optional[str], session_id: Optional[str], timeout=None,
+             wait_timeout: Optional[float] = None) -> Iterator[None]:
+    """
+    Hold a run slot for the body of the ``with`` block, waiting in the queue
+    first if needed. ``timeout`` is the upstream request timeout (sets the
+    lease); raises AdmissionTimeout after ``wait_timeout`` seconds in the queue.
+    Fails open if Redis is unavailable.
+    """
+    if not ADMISSION_ENABLED:
+        yield
+        return
+
+    member = f"{uuid.uuid4().hex}|{sub or '-'}|{session_id or '-'}"
+    lease_sec = _lease_sec(timeout)
+    deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+    last_position = None
+
+    try:
+        while True:
+            ok, position, reason = _try_acquire(model, member, lease_sec)
+            if ok:
+                break
+            if position != last_position:
+                last_position = position
+                logger.info("Run queued | model=%s sub=%s pos=%s reason=%s", model, sub, position, reason)
+                publish_event(sub, "queue.position", {"session_id": session_id, "model": model,
+                                                      "position": position, "reason": reason})
+            if deadline is not None and time.monotonic() >= deadline:
+                _release(model, member)
+                raise AdmissionTimeout(f"no free {model} slot after {wait_timeout}s")
+            time.sleep(ADMISSION_POLL_SEC)
+    except AdmissionTimeout:
+        raise
+    except Exception:
+        logger.exception("Admission check failed; running without it | model=%s", model)
+        member = None
+
+    if last_position is not None:
+        publish_event(sub, "queue.admitted", {"session_id": session_id, "model": model})
+    try:
+        yield
+    finally:
+        if member is not None:
+            try:
+                _release(model, member)
+            except Exception:
+                logger.exception("Failed to release run slot | model=%s", model)
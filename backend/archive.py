@@ -0,0 +1,97 @@
+# archive.py
+"""
+Cold storage for idle chat sessions (see compaction.py).
+
+An archived session document is kept as one row of a local SQLite database,
+keyed by session id, with its blob refs resolved and its full-resolution plot
+series stored alongside (sessions.ARCHIVE_BLOBS_KEY), so the row is self-contained.
+The body is codec-framed (zstd-compressed when zstandard is installed, as in
+Redis), so a restore decodes it exactly like a Redis value.
+
+Rows are deleted when the session is restored or deleted, and purged once the
+Redis stub that points at them has expired. The file is local to the host:
+workers on one host share it (WAL mode), separate hosts need a shared volume.
+
+Config (env):
+    ARCHIVE_DB_PATH   SQLite file of archived sessions (default: /var/lib/esa/session-archive.sqlite3)
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import codec
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH", "/var/lib/esa/session-archive.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid         TEXT PRIMARY KEY,
+    sub         TEXT NOT NULL,
+    updated_at  REAL,
+    archived_at REAL NOT NULL,
+    expires_at  REAL NOT NULL,
+    body        BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+"""
+
+_local = threading.local()
+
+
+# ---------- Connection (one per thread) ----------
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        parent = os.path.dirname(ARCHIVE_DB_PATH)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        conn = sqlite3.connect(ARCHIVE_DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+# ---------- Rows ----------
+def put(sub: str, sid: str, doc: dict, expires_at: float) -> int:
+    """Store (or replace) a session doc; returns the stored size in bytes."""
+    body = codec.dumps(doc)
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (sid, sub, updated_at, archived_at, expires_at, body) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (sid, sub, doc.get("updated_at"), time.time(), expires_at, body),
+        )
+    return len(body)
+
+def get(sid: str) -> Optional[Tuple[str, dict]]:
+    """(owner sub, doc) of an archived session, or None."""
+    row = _conn().execute("SELECT sub, body FROM sessions WHERE sid = ?", (sid,)).fetchone()
+    return (row[0], codec.loads(row[1])) if row else None
+
+def contains(sid: str) -> bool:
+    return _conn().execute("SELECT 1 FROM sessions WHERE sid = ?", (sid,)).fetchone() is not None
+
+def delete(sid: str) -> None:
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+def expired(now: Optional[float] = None, limit: int = 1000) -> List[str]:
+    """Session ids whose archived copy outlived the expiry recorded with it."""
+    rows = _conn().execute(
+        "SELECT sid FROM sessions WHERE expires_at < ? LIMIT ?", (now or time.time(), limit)
+    ).fetchall()
+    return [r[0] for r in rows]
+
+def extend(sid: str, expires_at: float) -> None:
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (expires_at, sid))
@@ -0,0 +1,310 @@
+# blobs.py
+"""
+Content-addressed storage for large message payloads (GeoJSON, wmsLayers, chart data).
+
+A payload whose encoded size reaches BLOB_MIN_BYTES is stored once under
+blob:{sha256} and the message keeps {"$blob": "<sha256>"} in its place, so the
+per-user and global session docs (and every message that carries the same
+GeoJSON forward) share a single copy.
+
+blob:{sha256}:refs is a SET of the session ids referencing the blob. It is
+idempotent, so re-saving a doc never inflates the count; deleting a session
+releases its references and the blob is dropped with the last one. Both keys
+carry the session TTL, so blobs of expired sessions expire with them.
+
+session:{sid}:blobs is the reverse SET: every hash a session references. It
+is rebuilt on every save, releasing the payloads the messages no longer carry
+(an edited or replaced result), and it is one of the session's keys (state_manager.session_keys), and refreshing the
+session's TTL renews its blobs too (``touch_refs``), so a session that is
+read for weeks without being saved does not lose its payloads.
+
+Full-resolution plot series of large validation results are stored the same
+way with ``put_blob`` and fetched lazily by the SPA (GET /api/blobs/{hash});
+blob:{sha256}:owners records the users allowed to read them. Saving a message
+whose chart data carries such a ``full_data`` hash adds the session to the
+blob's refs, so it is refreshed, released and archived with the session.
+"""
+import os
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import codec
+from redis_conn import redis_bin
+
+logger = logging.getLogger(__name__)
+
+BLOB_MIN_BYTES = int(os.getenv("BLOB_MIN_BYTES", "1024"))
+BLOB_TTL_SEC = 14 * 24 * 60 * 60  # same as SESSION_TTL_SEC
+
+REF_KEY = "$blob"
+FULL_DATA_KEY = "full_data"
+
+# Heavy fields of the SPA message shape (see ChatArea.vue / persist_async_result_to_session)
+BLOB_PATHS = (
+    ("mapData", "geoJsonData"),
+    ("mapData", "wmsLayers"),
+    ("profitMapData", "geoJsonData"),
+    ("profitMapData", "wmsLayers"),
+    ("graphData",),
+    ("barChartData",),
+    ("profitGraphData",),
+    ("raw",),
+)
+
+
+# ---------- Key helpers ----------
+def _k_blob(h: str) -> str:
+    return f"blob:{h}"
+
+def _k_refs(h: str) -> str:
+    return f"blob:{h}:refs"
+
+def _k_owners(h: str) -> str:
+    return f"blob:{h}:owners"
+
+def session_blobs_key(sid: str) -> str:
+    """SET of the blob hashes a session references."""
+    return f"session:{sid}:blobs"
+
+
+# ---------- Ref helpers ----------
+def is_ref(v: Any) -> bool:
+    return isinstance(v, dict) and len(v) == 1 and isinstance(v.get(REF_KEY), str)
+
+def _digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+def _canonical(v: Any) -> bytes:
+    """Stable bytes for hashing (sorted keys) so equal payloads share a blob."""
+    if codec.orjson is not None:
+        return codec.orjson.dumps(v, option=codec.orjson.OPT_SORT_KEYS)
+    import json
+    return json.dumps(v, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def _walk(msg: dict, path: tuple):
+    """Return (parent_dict, key) for path inside msg, or (None, None)."""
+    parent = msg
+    for k in path[:-1]:
+        parent = parent.get(k) if isinstance(parent, dict) else None
+        if not isinstance(parent, dict):
+            return None, None
+    return parent, path[-1]
+
+def _path_refs(messages: Iterable[dict]) -> Set[str]:
+    """Hashes of the refs standing in for BLOB_PATHS payloads (what hydration resolves)."""
+    out: Set[str] = set()
+    for m in messages or []:
+        if not isinstance(m, dict):
+            continue
+        for path in BLOB_PATHS:
+            parent, key = _walk(m, path)
+            if parent is not None and is_ref(parent.get(key)):
+                out.add(parent[key][REF_KEY])
+    return out
+
+def full_data_refs(messages: Iterable[dict]) -> Set[str]:
+    """Hashes of full-resolution plot series (barChartData[*].full_data, see normalize) in inline chart data."""
+    out: Set[str] = set()
+    for m in messages or []:
+        charts = m.get("barChartData") if isinstance(m, dict) else None
+        if isinstance(charts, list):
+            out.update(e[FULL_DATA_KEY] for e in charts if isinstance(e, dict) and isinstance(e.get(FULL_DATA_KEY), str))
+    return out
+
+def refs_in_messages(messages: Iterable[dict]) -> Set[str]:
+    """
+    All blob hashes referenced by messages: refs in place of payloads, and the
+    full_data hashes of chart data that is inline (hydrated). Full-data hashes
+    inside a dehydrated barChartData are covered by session:{sid}:blobs.
+    """
+    messages = list(messages or [])
+    return _path_refs(messages) | full_data_refs(messages)
+
+
+# ---------- Write path ----------
+def dehydrate_messages(messages: List[dict], sid: str, pipe) -> List[dict]:
+    """
+    Return a copy of messages with large payloads replaced by blob refs.
+    Blob writes and ref bookkeeping are queued on `pipe` (caller executes).
+    The input list and its messages are not modified.
+    """
+    out: List[dict] = []
+    new_blobs = {}
+    hashes: Set[str] = set()
+
+    for m in messages or []:
+        if not isinstance(m, dict):
+            out.append(m)
+            continue
+        # full-resolution series already are blobs; the session becomes one of their refs
+        hashes |= full_data_refs([m])
+        m2 = m
+        for path in BLOB_PATHS:
+            parent, key = _walk(m2, path)
+            if parent is None or key not in parent:
+                continue
+            value = parent[key]
+            if value is None:
+                continue
+            if is_ref(value):
+                hashes.add(value[REF_KEY])
+                continue
+
+            body = _canonical(value)
+            if len(body) < BLOB_MIN_BYTES:
+                continue
+            h = _digest(body)
+            hashes.add(h)
+            if h not in new_blobs:
+                new_blobs[h] = value
+
+            # copy-on-write along the path
+            if m2 is m:
+                m2 = dict(m)
+            node = m2
+            for k in path[:-1]:
+                node[k] = dict(node[k])
+                node = node[k]
+            node[key] = {REF_KEY: h}
+        out.append(m2)
+
+    for h, value in new_blobs.items():
+        pipe.set(_k_blob(h), codec.dumps(value), nx=True, ex=BLOB_TTL_SEC)
+    for h in hashes:
+        pipe.expire(_k_blob(h), BLOB_TTL_SEC)
+        pipe.sadd(_k_refs(h), sid)
+        pipe.expire(_k_refs(h), BLOB_TTL_SEC)
+    # the messages are the session's whole content: payloads they no longer carry are released
+    _sync_script(keys=[session_blobs_key(sid)], args=[sid, _k_blob(""), BLOB_TTL_SEC, *sorted(hashes)], client=pipe)
+    return out
+
+
+def put_blob(value: Any, sid: str, owner: Optional[str] = None, pipe=None) -> str:
+    """
+    Store one payload referenced by sid (readable by owner); returns its hash.
+    Queued on `pipe` when given (caller executes). It joins session:{sid}:blobs
+    when a saved message carries the hash (dehydrate_messages), so a save
+    racing the message that will carry it does not release it.
+    """
+    body = _canonical(value)
+    h = _digest(body)
+    own = pipe is None
+    pipe = redis_bin.pipeline() if own else pipe
+    pipe.set(_k_blob(h), codec.dumps(value), nx=True, ex=BLOB_TTL_SEC)
+    pipe.expire(_k_blob(h), BLOB_TTL_SEC)
+    pipe.sadd(_k_refs(h), sid)
+    pipe.expire(_k_refs(h), BLOB_TTL_SEC)
+    if owner:
+        pipe.sadd(_k_owners(h), owner)
+        pipe.expire(_k_owners(h), BLOB_TTL_SEC)
+    if own:
+        pipe.execute()
+    return h
+
+
+# ---------- Read path ----------
+def get_blob(h: str) -> Optional[Any]:
+    raw = redis_bin.get(_k_blob(h))
+    return codec.loads(raw) if raw else None
+
+def get_blobs(hashes: Iterable[str]) -> Dict[str, Any]:
+    """hash -> payload for the blobs that still exist, in one MGET."""
+    hashes = sorted(set(hashes))
+    if not hashes:
+        return {}
+    raws = redis_bin.mget([_k_blob(h) for h in hashes])
+    return {h: codec.loads(r) for h, r in zip(hashes, raws) if r}
+
+def blob_readers(h: str) -> Tuple[Set[str], Set[str]]:
+    """(users recorded by put_blob, session ids referencing the blob)."""
+    pipe = redis_bin.pipeline()
+    pipe.smembers(_k_owners(h))
+    pipe.smembers(_k_refs(h))
+    owners, sids = pipe.execute()
+    return {v.decode("utf-8") for v in owners}, {v.decode("utf-8") for v in sids}
+
+def hydrate_messages(messages: List[dict]) -> List[dict]:
+    """Resolve blob refs in place with a single MGET. Missing blobs become None."""
+    hashes = sorted(_path_refs(messages))
+    if not hashes:
+        return messages
+    raws = redis_bin.mget([_k_blob(h) for h in hashes])
+    values = {h: (codec.loads(r) if r else None) for h, r in zip(hashes, raws)}
+
+    for m in messages:
+        if not isinstance(m, dict):
+            continue
+        for path in BLOB_PATHS:
+            parent, key = _walk(m, path)
+            if parent is not None and is_ref(parent.get(key)):
+                h = parent[key][REF_KEY]
+                if values.get(h) is None:
+                    logger.warning("Missing blob %s", h)
+                parent[key] = values.get(h)
+    return messages
+
+
+# ---------- Release ----------
+# SREM + delete-if-empty must be atomic against a concurrent save that re-adds a ref.
+# Releases every hash in session:{sid}:blobs plus the ones passed, then drops the set.
+_RELEASE_LUA = """
+local hashes = redis.call('SMEMBERS', KEYS[1])
+for i = 3, #ARGV do hashes[#hashes + 1] = ARGV[i] end
+local dropped = 0
+for _, h in ipairs(hashes) do
+    local blob = ARGV[2] .. h
+    redis.call('SREM', blob .. ':refs', ARGV[1])
+    if redis.call('SCARD', blob .. ':refs') == 0 then
+        dropped = dropped + redis.call('DEL', blob, blob .. ':refs', blob .. ':owners')
+    end
+end
+redis.call('DEL', KEYS[1])
+return dropped
+"""
+_release_script = redis_bin.register_script(_RELEASE_LUA)
+
+# Replaces session:{sid}:blobs with the hashes of the saved messages (ARGV[4..]) and
+# releases the old members that are not among them.
+_SYNC_LUA = """
+local keep = {}
+for i = 4, #ARGV do keep[ARGV[i]] = true end
+for _, h in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if not keep[h] then
+        local blob = ARGV[2] .. h
+        redis.call('SREM', blob .. ':refs', ARGV[1])
+        if redis.call('SCARD', blob .. ':refs') == 0 then
+            redis.call('DEL', blob, blob .. ':refs', blob .. ':owners')
+        end
+    end
+end
+redis.call('DEL', KEYS[1])
+for i = 4, #ARGV do redis.call('SADD', KEYS[1], ARGV[i]) end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+_sync_script = redis_bin.register_script(_SYNC_LUA)
+
+def release_refs(sid: str, hashes: Iterable[str] = (), pipe=None) -> None:
+    """
+    Drop all of sid's references (its session:{sid}:blobs set, plus `hashes`);
+    delete blobs that are no longer referenced. Queued on `pipe` when given.
+    """
+    _release_script(keys=[session_blobs_key(sid)], args=[sid, _k_blob(""), *sorted(set(hashes))], client=pipe)
+
+
+# ---------- TTL ----------
+# renews blob:{h}, blob:{h}:refs and blob:{h}:owners of every hash in the session's set
+_TOUCH_LUA = """
+for _, h in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    redis.call('EXPIRE', ARGV[1] .. h, ARGV[2])
+    redis.call('EXPIRE', ARGV[1] .. h .. ':refs', ARGV[2])
+    redis.call('EXPIRE', ARGV[1] .. h .. ':owners', ARGV[2])
+end
+return 1
+"""
+_touch_script = redis_bin.register_script(_TOUCH_LUA)
+
+def touch_refs(sid: str, pipe=None) -> None:
+    """Renew the TTL of every blob the session references (queued on `pipe` when given)."""
+    _touch_script(keys=[session_blobs_key(sid)], args=[_k_blob(""), BLOB_TTL_SEC], client=pipe)
@@ -0,0 +1,130 @@
+# codec.py
+"""
+Serialization of values stored in Redis (state, chat history, session docs).
+
+Encoded values start with a 4-byte header: MAGIC + format byte + compression
+byte. Anything without the header is a legacy JSON string written before the
+codec existed and is decoded with json.loads, so old keys keep reading.
+
+Config (env):
+    REDIS_CODEC               json | orjson | msgpack   (default: orjson)
+                              "json" writes plain legacy JSON (no header),
+                              which is handy for rolling back.
+    REDIS_COMPRESS_MIN_BYTES  zstd-compress encoded values at/above this size;
+                              0 disables compression (default: 4096)
+    REDIS_ZSTD_LEVEL          zstd compression level (default: 3)
+"""
+import os
+import json
+import logging
+import threading
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional codec
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional compression
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"\x00\xc7"
+HEADER_LEN = 4
+
+FMT_JSON = b"j"
+FMT_MSGPACK = b"m"
+COMP_NONE = b"-"
+COMP_ZSTD = b"z"
+
+REDIS_CODEC = os.getenv("REDIS_CODEC", "orjson").strip().lower()
+REDIS_COMPRESS_MIN_BYTES = int(os.getenv("REDIS_COMPRESS_MIN_BYTES", "4096"))
+REDIS_ZSTD_LEVEL = int(os.getenv("REDIS_ZSTD_LEVEL", "3"))
+
+if REDIS_CODEC == "msgpack" and msgpack is None:
+    logger.warning("REDIS_CODEC=msgpack but msgpack is not installed; falling back to orjson")
+    REDIS_CODEC = "orjson"
+if REDIS_COMPRESS_MIN_BYTES and zstandard is None:
+    REDIS_COMPRESS_MIN_BYTES = 0
+
+# zstd (de)compressor objects must not be shared between threads
+_local = threading.local()
+
+
+def _zstd_c():
+    c = getattr(_local, "zc", None)
+    if c is None:
+        c = _local.zc = zstandard.ZstdCompressor(level=REDIS_ZSTD_LEVEL)
+    return c
+
+
+def _zstd_d():
+    d = getattr(_local, "zd", None)
+    if d is None:
+        d = _local.zd = zstandard.ZstdDecompressor()
+    return d
+
+
+# ---------- JSON helpers (orjson when available) ----------
+def json_dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(raw: Union[bytes, bytearray, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# ---------- Public API ----------
+def dumps(obj: Any) -> bytes:
+    """Encode a value for Redis according to REDIS_CODEC."""
+    if REDIS_CODEC == "json":
+        return json.dumps(obj).encode("utf-8")
+
+    if REDIS_CODEC == "msgpack":
+        fmt, body = FMT_MSGPACK, msgpack.packb(obj, use_bin_type=True)
+    else:
+        fmt, body = FMT_JSON, json_dumps(obj)
+
+    comp = COMP_NONE
+    if REDIS_COMPRESS_MIN_BYTES and len(body) >= REDIS_COMPRESS_MIN_BYTES:
+        comp, body = COMP_ZSTD, _zstd_c().compress(body)
+
+    return MAGIC + fmt + comp + body
+
+
+def loads(raw: Optional[Union[bytes, bytearray, str]]) -> Any:
+    """Decode a Redis value written by dumps() or by the old json.dumps path."""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if raw[:2] != MAGIC:
+        return json_loads(raw)
+
+    fmt = raw[2:3]
+    comp = raw[3:4]
+    body = raw[HEADER_LEN:]
+
+    if comp == COMP_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed value found but zstandard is not installed")
+        body = _zstd_d().decompress(body)
+
+    if fmt == FMT_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("msgpack value found but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    return json_loads(body)
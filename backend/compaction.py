@@ -0,0 +1,132 @@
+# compaction.py
+"""
+Background compaction of idle chat sessions into cold storage.
+
+Session docs stay whole in Redis (memory, and AOF rewrites) for as long as
+their TTL, although most are never opened again after a few days. A worker
+thread periodically moves sessions idle for COMPACT_IDLE_SEC into the SQLite
+archive (archive.py) and leaves a small stub under both doc keys: id, title,
+timestamps, message count and ``"archived": true``. The session list and the
+header endpoint are served from the stub; anything that needs the messages
+(get_session, message pages, saves, renames, async results) restores the doc
+transparently via sessions._get_doc_for_user_or_global, with a fresh TTL.
+
+"Idle" is read from the doc's TTL, which every write and TTL refresh resets,
+so sessions still in use are never archived. The stub keeps the doc's TTL, so
+an archived session expires when it would have; archive rows whose stub is
+gone are purged, and so are search index entries (session_index.py) of
+sessions whose doc expired. A Redis lock lets one worker per interval run a pass.
+
+Config (env):
+    COMPACT_ENABLED        1 to run the compaction worker (default: 1)
+    COMPACT_IDLE_SEC       archive sessions idle for this long (default: 3 days)
+    COMPACT_INTERVAL_SEC   time between compaction passes (default: 1 h)
+    COMPACT_BATCH          sessions archived per pass at most (default: 500)
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+import codec
+import archive
+import session_index
+from redis_conn import redis_client, redis_bin
+from state_manager import SESSION_TTL_SEC
+from sessions import archive_session, _k_doc, _k_doc_global
+
+logger = logging.getLogger(__name__)
+
+COMPACT_ENABLED = os.getenv("COMPACT_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+COMPACT_IDLE_SEC = int(os.getenv("COMPACT_IDLE_SEC", str(3 * 24 * 60 * 60)))
+COMPACT_INTERVAL_SEC = int(os.getenv("COMPACT_INTERVAL_SEC", "3600"))
+COMPACT_BATCH = int(os.getenv("COMPACT_BATCH", "500"))
+
+_LOCK_KEY = "compact:lock"
+_IDX_PREFIX = "sessidx:"
+_SEARCH_IDX_MATCH = "sessix:*:updated"
+
+_worker: Optional[threading.Thread] = None
+
+
+# ---------- Passes ----------
+def compact_idle_sessions(idle_sec: int = COMPACT_IDLE_SEC, batch: int = COMPACT_BATCH) -> Dict[str, int]:
+    """Archive up to `batch` sessions not updated for idle_sec; returns counts for the log."""
+    cutoff = time.time() - idle_sec
+    stats = {"archived": 0, "bytes": 0, "failed": 0}
+    for idx in redis_client.scan_iter(match=f"{_IDX_PREFIX}*", count=500):
+        sub = idx[len(_IDX_PREFIX):]
+        prefix = f"user:{sub}:session:"
+        # index scores are updated_at, so these are the candidates; the TTL check in archive_session decides
+        for member in redis_client.zrangebyscore(idx, "-inf", cutoff):
+            if not member.startswith(prefix):
+                continue
+            sid = member[len(prefix):]
+            if archive.contains(sid):
+                continue
+            try:
+                size = archive_session(sub, sid, idle_sec)
+            except Exception:
+                logger.exception("Session compaction failed | sess=%s", sid)
+                stats["failed"] += 1
+                continue
+            if size is not None:
+                stats["archived"] += 1
+                stats["bytes"] += size
+                if stats["archived"] >= batch:
+                    return stats
+    return stats
+
+def purge_archive() -> int:
+    """Drop archive rows whose session is gone from Redis; push back the expiry of the rest."""
+    purged = 0
+    for sid in archive.expired():
+        key = _k_doc_global(sid)
+        raw = redis_bin.get(key)
+        ttl = redis_bin.ttl(key)
+        doc = codec.loads(raw) if raw else None
+        if doc and doc.get("archived") and ttl > 0:
+            archive.extend(sid, time.time() + ttl)   # its TTL was refreshed meanwhile
+        else:
+            archive.delete(sid)
+            purged += 1
+    return purged
+
+def prune_search_index() -> int:
+    """Drop search index entries of sessions whose doc expired; returns how many."""
+    before = time.time() - SESSION_TTL_SEC   # a doc updated since then cannot have expired yet
+    pruned = 0
+    for key in redis_client.scan_iter(match=_SEARCH_IDX_MATCH, count=500):
+        sub = key[len("sessix:"):-len(":updated")]
+        pruned += session_index.prune(sub, _k_doc(sub, ""), before)
+    return pruned
+
+
+# ---------- Worker ----------
+def _run_pass() -> None:
+    # one pass per interval across all workers; the lock simply expires
+    if not redis_client.set(_LOCK_KEY, str(os.getpid()), nx=True, ex=COMPACT_INTERVAL_SEC):
+        return
+    started = time.monotonic()
+    stats = compact_idle_sessions()
+    purged = purge_archive()
+    pruned = prune_search_index()
+    logger.info("Session compaction | archived=%s bytes=%s failed=%s purged=%s pruned=%s in %.1fs",
+                stats["archived"], stats["bytes"], stats["failed"], purged, pruned, time.monotonic() - started)
+
+def _loop() -> None:
+    while True:
+        try:
+            _run_pass()
+        except Exception:
+            logger.exception("Session compaction pass failed")
+        time.sleep(min(COMPACT_INTERVAL_SEC, 300))
+
+def start_compaction_worker() -> None:
+    """Start the compaction thread of this process (once; no-op if disabled)."""
+    global _worker
+    if not COMPACT_ENABLED or _worker is not None:
+        return
+    _worker = threading.Thread(target=_loop, name="session-compaction", daemon=True)
+    _worker.start()
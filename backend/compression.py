@@ -0,0 +1,73 @@
+# compression.py
+"""
+Response compression for the API.
+
+Session documents and chat results are large, repetitive JSON (layer names,
+chart arrays) and shrink several times over. Responses of at least
+COMPRESS_MIN_BYTES are compressed with Brotli when the brotli-asgi package is
+installed and the client accepts it, with gzip otherwise. Server-sent events
+(/api/events) are never compressed: the compressor would buffer the stream.
+Session exports (/api/sessions/export) encode themselves: zip entries are
+already deflated, and NDJSON is gzipped by the export as it streams. WMS map
+tiles and legends (/api/geoserver/wms GetMap, GetLegendGraphic) are PNG/JPEG
+and would cost CPU on every tile for no gain; other WMS requests are XML/JSON
+and are compressed.
+
+Config (env):
+    COMPRESS_MIN_BYTES   smallest response body to compress (default: 1024)
+    GZIP_LEVEL           gzip compression level, 1-9 (default: 6)
+    BROTLI_QUALITY       brotli quality, 0-11 (default: 4)
+"""
+import os
+import logging
+from typing import Iterable
+from urllib.parse import parse_qsl
+
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # pragma: no cover - optional codec
+    BrotliMiddleware = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# streams (and anything else that must not be buffered), and responses that compress themselves
+DEFAULT_EXCLUDED_PATHS = ("/api/events", "/api/sessions/export")
+
+# WMS requests answered with images
+WMS_PATH = "/api/geoserver/wms"
+WMS_IMAGE_REQUESTS = frozenset(("GETMAP", "GETLEGENDGRAPHIC"))
+
+
+def _is_wms_image(scope) -> bool:
+    if not scope["path"].startswith(WMS_PATH):
+        return False
+    query = scope.get("query_string", b"").decode("latin-1")
+    return any(k.upper() == "REQUEST" and v.upper() in WMS_IMAGE_REQUESTS for k, v in parse_qsl(query))
+
+
+class CompressionMiddleware:
+    """Brotli/gzip for HTTP responses, except under the excluded path prefixes and for WMS images."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES,
+                 excluded_paths: Iterable[str] = DEFAULT_EXCLUDED_PATHS):
+        self.app = app
+        self.excluded_paths = tuple(excluded_paths)
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, quality=BROTLI_QUALITY, minimum_size=minimum_size,
+                                               gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=GZIP_LEVEL)
+        logger.info("Response compression: %s (min %s bytes)",
+                    "brotli+gzip" if BrotliMiddleware is not None else "gzip", minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith(self.excluded_paths) and not _is_wms_image(scope):
+            await self.compressed(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -0,0 +1,246 @@
+# geometry.py
+"""
+Ingest stage for user-drawn areas (GeoJSON from MapDisplayDraw.vue).
+
+The raw text is parsed once, checked for topology, clipped to the pilot's
+bounding area, reduced in precision (and optionally simplified), held to a
+vertex budget and serialized to a compact canonical FeatureCollection. The
+result is what goes into Redis state, area calculation and upstream payloads.
+
+Config (env):
+    GEOJSON_MAX_BYTES                raw input size limit (default: 2 MiB)
+    GEOJSON_MAX_VERTICES             vertex budget of the stored area (default: 5000)
+    GEOJSON_PRECISION                coordinate decimals, 6 ≈ 0.1 m (default: 6)
+    GEOJSON_SIMPLIFY_TOLERANCE       simplification tolerance in degrees; 0 disables (default: 0)
+    GEOJSON_SIMPLIFY_MAX_AREA_DELTA  max relative area change allowed by simplification (default: 0.01)
+    PILOT_BOUNDARIES_FILE            optional GeoJSON FeatureCollection of pilot boundary polygons
+                                     (properties.pilot = "PILOT_..."); replaces the bounding boxes
+    DETECTABLE_PILOTS                comma-separated pilots that detect_pilot may return
+                                     (default: PILOT_THESSALONIKI,PILOT_PILSEN,PILOT_OLOMOUC)
+"""
+import os
+import json
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+import shapely
+from shapely.geometry import MultiPolygon, shape, mapping, box
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+from shapely.validation import explain_validity
+from pyproj import Geod
+
+logger = logging.getLogger(__name__)
+
+GEOJSON_MAX_BYTES = int(os.getenv("GEOJSON_MAX_BYTES", str(2 * 1024 * 1024)))
+GEOJSON_MAX_VERTICES = int(os.getenv("GEOJSON_MAX_VERTICES", "5000"))
+GEOJSON_PRECISION = int(os.getenv("GEOJSON_PRECISION", "6"))
+GEOJSON_SIMPLIFY_TOLERANCE = float(os.getenv("GEOJSON_SIMPLIFY_TOLERANCE", "0"))
+GEOJSON_SIMPLIFY_MAX_AREA_DELTA = float(os.getenv("GEOJSON_SIMPLIFY_MAX_AREA_DELTA", "0.01"))
+
+# Pilot bounding areas (lon/lat), kept in sync with frontend utils/areaConfigs.js
+PILOT_BOUNDS = {
+    "PILOT_THESSALONIKI": (21.95, 40.55, 22.52, 40.94),
+    "PILOT_PILSEN": (12.45, 49.35, 13.55, 50.15),
+    "PILOT_OLOMOUC": (16.55, 49.26, 18.05, 50.55),
+    "GREECE": (18.95, 33.95, 29.05, 43.05),
+    "CZECHIA": (10.95, 47.95, 19.05, 52.05),
+}
+
+PILOT_BOUNDARIES_FILE = os.getenv("PILOT_BOUNDARIES_FILE", "")
+DETECTABLE_PILOTS = tuple(
+    p.strip().upper()
+    for p in os.getenv("DETECTABLE_PILOTS", "PILOT_THESSALONIKI,PILOT_PILSEN,PILOT_OLOMOUC").split(",")
+    if p.strip()
+)
+
+_GEOD = Geod(ellps="WGS84")
+
+
+class GeometryError(ValueError):
+    """Raised for drawn areas that cannot be accepted; the message is user-facing."""
+
+
+@dataclass(frozen=True)
+class IngestedArea:
+    geojson: str        # compact canonical FeatureCollection
+    area_m2: float
+    vertices: int
+    pilot: Optional[str] = None
+
+
+# ---------- Pilot areas (loaded once at import) ----------
+def _load_pilot_shapes() -> dict:
+    shapes = {name: box(*bounds) for name, bounds in PILOT_BOUNDS.items()}
+    if PILOT_BOUNDARIES_FILE:
+        try:
+            with open(PILOT_BOUNDARIES_FILE, encoding="utf-8") as fh:
+                fc = json.load(fh)
+            for f in fc.get("features", []):
+                name = ((f.get("properties") or {}).get("pilot") or "").upper()
+                if name:
+                    shapes[name] = shape(f["geometry"])
+        except Exception:
+            logger.exception("Could not load PILOT_BOUNDARIES_FILE=%s; using bounding boxes", PILOT_BOUNDARIES_FILE)
+    return shapes
+
+PILOT_SHAPES = _load_pilot_shapes()
+
+# STRtree over the detectable pilots + prepared geometries for the exact predicates
+_INDEX_NAMES = [n for n in DETECTABLE_PILOTS if n in PILOT_SHAPES]
+_INDEX_GEOMS = [PILOT_SHAPES[n] for n in _INDEX_NAMES]
+_INDEX_PREPARED = [prep(g) for g in _INDEX_GEOMS]
+_INDEX_TREE = STRtree(_INDEX_GEOMS)
+
+
+def detect_pilot(geom) -> Optional[str]:
+    """
+    Resolve a drawn geometry to a pilot: the smallest pilot that contains it,
+    else the pilot with the largest overlap. None if it touches no pilot.
+    """
+    candidates = _INDEX_TREE.query(geom)
+    if len(candidates) == 0:
+        return None
+
+    containing = [i for i in candidates if _INDEX_PREPARED[i].contains(geom)]
+    if containing:
+        best = min(containing, key=lambda i: _INDEX_GEOMS[i].area)
+        return _INDEX_NAMES[best]
+
+    overlaps = [(i, _INDEX_GEOMS[i].intersection(geom).area) for i in candidates if _INDEX_PREPARED[i].intersects(geom)]
+    overlaps = [(i, a) for i, a in overlaps if a > 0]
+    if not overlaps:
+        return None
+    return _INDEX_NAMES[max(overlaps, key=lambda t: t[1])[0]]
+
+
+# ---------- Helpers ----------
+def area_sq_meters(geom) -> float:
+    """Geodesic area on WGS84 (holes subtracted)."""
+    area, _ = _GEOD.geometry_area_perimeter(geom)
+    return abs(area)
+
+def _polygons_from(data: dict) -> List:
+    kind = data.get("type") if isinstance(data, dict) else None
+    if kind == "FeatureCollection":
+        geoms = [f.get("geometry") for f in data.get("features") or [] if isinstance(f, dict)]
+    elif kind == "Feature":
+        geoms = [data.get("geometry")]
+    elif kind in ("Polygon", "MultiPolygon"):
+        geoms = [data]
+    else:
+        raise GeometryError("expected a GeoJSON FeatureCollection, Feature or Polygon")
+
+    out = []
+    for g in geoms:
+        if not g:
+            continue
+        try:
+            geom = shape(g)
+        except Exception:
+            raise GeometryError("the geometry could not be parsed")
+        if geom.geom_type not in ("Polygon", "MultiPolygon"):
+            raise GeometryError(f"only polygons are supported (got {geom.geom_type})")
+        if geom.is_empty:
+            continue
+        if not geom.is_valid:
+            raise GeometryError(f"the polygon is not valid ({explain_validity(geom)})")
+        out.append(geom)
+    if not out:
+        raise GeometryError("no polygon found")
+    return out
+
+def _polygonal(geom):
+    """
+    The polygon parts of a clip result. A drawn area that touches the clip
+    boundary comes back as a GeometryCollection (polygon + line or point);
+    its polygons are kept as a MultiPolygon. None if there are none.
+    """
+    if geom.is_empty:
+        return None
+    if geom.geom_type in ("Polygon", "MultiPolygon"):
+        return geom
+    polygons = []
+    for part in shapely.get_parts(geom):
+        if part.geom_type == "Polygon":
+            polygons.append(part)
+        elif part.geom_type == "MultiPolygon":
+            polygons.extend(part.geoms)
+    if not polygons:
+        return None
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+def _simplify_within_bound(geom, tolerance: float):
+    """Simplify only if the area stays within GEOJSON_SIMPLIFY_MAX_AREA_DELTA."""
+    simplified = geom.simplify(tolerance, preserve_topology=True)
+    if simplified.is_empty or not simplified.is_valid:
+        return geom
+    if geom.area and abs(simplified.area - geom.area) / geom.area > GEOJSON_SIMPLIFY_MAX_AREA_DELTA:
+        return geom
+    return simplified
+
+def _fit_vertex_budget(geom):
+    """Coarsen progressively until the vertex budget is met (area bound still applies)."""
+    tolerance = max(GEOJSON_SIMPLIFY_TOLERANCE, 10 ** -GEOJSON_PRECISION)
+    while shapely.get_num_coordinates(geom) > GEOJSON_MAX_VERTICES:
+        candidate = _simplify_within_bound(geom, tolerance)
+        if candidate is geom:
+            break
+        geom = candidate
+        tolerance *= 2
+    return geom
+
+
+# ---------- Public API ----------
+def ingest_geojson(raw: str, pilot: Optional[str] = None, detect: bool = False) -> IngestedArea:
+    """
+    Parse, validate and normalize a drawn area; raises GeometryError.
+    With detect=True and no pilot, the pilot is resolved from the area itself.
+    """
+    if not isinstance(raw, str) or not raw.strip().startswith("{"):
+        raise GeometryError("expected GeoJSON text")
+    if len(raw.encode("utf-8")) > GEOJSON_MAX_BYTES:
+        raise GeometryError(f"the GeoJSON is larger than {GEOJSON_MAX_BYTES // 1024} KB")
+
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        raise GeometryError("the GeoJSON could not be parsed")
+
+    polygons = _polygons_from(data)
+
+    if not pilot and detect:
+        pilot = detect_pilot(shapely.union_all(polygons))
+        if not pilot:
+            raise GeometryError("the area lies outside every supported pilot area")
+
+    clip = PILOT_SHAPES.get((pilot or "").upper())
+
+    features = []
+    total_area = 0.0
+    total_vertices = 0
+    for geom in polygons:
+        if clip is not None:
+            geom = _polygonal(geom.intersection(clip))
+            if geom is None:
+                continue
+
+        if GEOJSON_SIMPLIFY_TOLERANCE > 0:
+            geom = _simplify_within_bound(geom, GEOJSON_SIMPLIFY_TOLERANCE)
+        geom = shapely.set_precision(geom, 10 ** -GEOJSON_PRECISION)
+        if geom.is_empty:
+            continue
+        geom = _fit_vertex_budget(geom)
+
+        total_vertices += shapely.get_num_coordinates(geom)
+        total_area += area_sq_meters(geom)
+        features.append({"type": "Feature", "properties": {}, "geometry": mapping(geom)})
+
+    if not features:
+        raise GeometryError(f"the area lies outside {pilot}" if clip is not None else "the area is empty")
+    if total_vertices > GEOJSON_MAX_VERTICES:
+        raise GeometryError(f"the area has too many vertices ({total_vertices} > {GEOJSON_MAX_VERTICES})")
+
+    canonical = json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"))
+    return IngestedArea(geojson=canonical, area_m2=total_area, vertices=total_vertices, pilot=pilot)
@@ -0,0 +1,318 @@
+# geoserver_proxy.py
+"""
+Caching proxy in front of GeoServer WMS (GetMap, GetFeatureInfo, legends, capabilities).
+
+Requests are keyed by their normalized WMS parameters (upper-cased names,
+sorted, BBOX rounded), served from a bounded in-memory LRU, then a bounded
+on-disk cache, and only then from GeoServer. Concurrent misses for the same
+key are coalesced into a single upstream request. Responses carry an ETag and
+Cache-Control so browsers revalidate with If-None-Match and get a 304.
+
+Only answers of the requested kind are cached (see ``cacheable``): GeoServer
+returns OGC service exceptions as HTTP 200, and a transient layer error must
+not be served for the whole TTL.
+
+Point the SPA at it with VITE_WMS_BASE_URL=/api/geoserver/wms.
+
+Config (env):
+    GEOSERVER_WMS_URL           upstream WMS endpoint (required)
+    WMS_CACHE_DIR               on-disk cache directory (default: /tmp/wms-cache)
+    WMS_CACHE_DISK_MAX_BYTES    on-disk cache budget (default: 512 MiB)
+    WMS_CACHE_MEM_MAX_BYTES     in-memory cache budget (default: 64 MiB)
+    WMS_CACHE_TTL_SEC           freshness of map/feature responses (default: 1 day)
+    WMS_CAPABILITIES_TTL_SEC    freshness of GetCapabilities; new run layers show up here (default: 60)
+    WMS_UPSTREAM_TIMEOUT_S      upstream request timeout (default: 30)
+"""
+import os
+import time
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+from fastapi import APIRouter, HTTPException, Request, Response
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+GEOSERVER_WMS_URL = os.getenv("GEOSERVER_WMS_URL", "").strip()
+WMS_CACHE_DIR = os.getenv("WMS_CACHE_DIR", "/tmp/wms-cache")
+WMS_CACHE_DISK_MAX_BYTES = int(os.getenv("WMS_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+WMS_CACHE_MEM_MAX_BYTES = int(os.getenv("WMS_CACHE_MEM_MAX_BYTES", str(64 * 1024 * 1024)))
+WMS_CACHE_TTL_SEC = int(os.getenv("WMS_CACHE_TTL_SEC", str(24 * 60 * 60)))
+WMS_CAPABILITIES_TTL_SEC = int(os.getenv("WMS_CAPABILITIES_TTL_SEC", "60"))
+WMS_UPSTREAM_TIMEOUT_S = float(os.getenv("WMS_UPSTREAM_TIMEOUT_S", "30"))
+
+ALLOWED_REQUESTS = {"GETMAP", "GETFEATUREINFO", "GETLEGENDGRAPHIC", "GETCAPABILITIES", "GETTIMESERIES"}
+BBOX_DECIMALS = 6
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    status: int
+    content_type: str
+    body: bytes
+    etag: str
+    stored_at: float
+
+
+# ---------- Key normalization ----------
+def normalize_params(params) -> Tuple[Tuple[str, str], ...]:
+    """Canonical, hashable form of WMS query params (case-insensitive names, rounded BBOX)."""
+    out: Dict[str, str] = {}
+    for k, v in params:
+        k = k.upper()
+        v = "" if v is None else str(v)
+        if k == "BBOX":
+            try:
+                v = ",".join(f"{float(c):.{BBOX_DECIMALS}f}" for c in v.split(","))
+            except ValueError:
+                pass
+        elif k in ("REQUEST", "SERVICE", "FORMAT", "INFO_FORMAT", "TRANSPARENT", "TILED"):
+            v = v.lower() if k in ("FORMAT", "INFO_FORMAT") else v.upper()
+        out[k] = v
+    return tuple(sorted(out.items()))
+
+def cache_key(norm: Tuple[Tuple[str, str], ...]) -> str:
+    return hashlib.sha256(urlencode(norm).encode("utf-8")).hexdigest()
+
+def _ttl_for(norm) -> int:
+    req = dict(norm).get("REQUEST", "")
+    return WMS_CAPABILITIES_TTL_SEC if req == "GETCAPABILITIES" else WMS_CACHE_TTL_SEC
+
+
+# ---------- Memory tier ----------
+class _MemoryLRU:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is not None:
+                self.items.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        n = len(entry.body)
+        if n > self.max_bytes // 4:
+            return  # don't let one big image flush the whole tier
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= len(old.body)
+            self.items[key] = entry
+            self.size += n
+            while self.size > self.max_bytes and self.items:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted.body)
+
+
+# ---------- Disk tier ----------
+class _DiskCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size: Optional[int] = None  # computed lazily
+        self.lock = threading.Lock()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        d = os.path.join(self.root, key[:2])
+        return os.path.join(d, key), os.path.join(d, key + ".meta")
+
+    def _scan(self):
+        files = []
+        for dirpath, _, names in os.walk(self.root):
+            for n in names:
+                p = os.path.join(dirpath, n)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+        return files
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as fh:
+                meta = json.load(fh)
+            with open(body_path, "rb") as fh:
+                body = fh.read()
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(meta["status"], meta["content_type"], body, meta["etag"], meta["stored_at"])
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        body_path, meta_path = self._paths(key)
+        meta = json.dumps({
+            "status": entry.status, "content_type": entry.content_type,
+            "etag": entry.etag, "stored_at": entry.stored_at,
+        })
+        try:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            # write-then-rename so readers never see a partial file
+            for path, data, mode in ((body_path, entry.body, "wb"), (meta_path, meta, "w")):
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, mode) as fh:
+                    fh.write(data)
+                os.replace(tmp, path)
+        except OSError:
+            logger.exception("WMS disk cache write failed | key=%s", key)
+            return
+
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self._scan())
+            else:
+                self.size += len(entry.body) + len(meta)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop oldest files until the cache is at 90% of its budget (caller holds the lock)."""
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in files:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        self.size = total
+
+
+_mem = _MemoryLRU(WMS_CACHE_MEM_MAX_BYTES)
+_disk = _DiskCache(WMS_CACHE_DIR, WMS_CACHE_DISK_MAX_BYTES)
+
+# in-flight upstream fetches, for request coalescing
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+# GeoServer reports OGC errors as HTTP 200 with one of these
+SERVICE_EXCEPTION_TYPES = ("application/vnd.ogc.se_xml", "application/vnd.ogc.se+xml")
+
+def _media_type(content_type: str) -> str:
+    return content_type.partition(";")[0].strip().lower()
+
+def cacheable(norm, entry: CachedResponse) -> bool:
+    """
+    Only successful answers of the requested kind are cached: images for
+    GetMap/GetLegendGraphic, XML for GetCapabilities, the requested
+    INFO_FORMAT/FORMAT otherwise. A 200 carrying a service exception is not.
+    """
+    if entry.status != 200:
+        return False
+    ctype = _media_type(entry.content_type)
+    if ctype in SERVICE_EXCEPTION_TYPES:
+        return False
+    params = dict(norm)
+    req = params.get("REQUEST", "")
+    if req in ("GETMAP", "GETLEGENDGRAPHIC"):
+        return ctype.startswith("image/")
+    if req == "GETCAPABILITIES":
+        return ctype.endswith("xml")
+    wanted = params.get("INFO_FORMAT" if req == "GETFEATUREINFO" else "FORMAT")
+    if wanted:
+        return _media_type(wanted) == ctype
+    # no format asked for: anything but an XML error document
+    return not (ctype.endswith("xml") and b"ServiceException" in entry.body[:1024])
+
+def _fresh(entry: Optional[CachedResponse], ttl: int) -> bool:
+    return entry is not None and time.time() - entry.stored_at < ttl
+
+def _fetch_upstream(norm) -> CachedResponse:
+    resp = requests.get(GEOSERVER_WMS_URL, params=list(norm), timeout=WMS_UPSTREAM_TIMEOUT_S)
+    body = resp.content
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    return CachedResponse(resp.status_code, resp.headers.get("Content-Type", "application/octet-stream"),
+                          body, etag, time.time())
+
+
+# ---------- Public API ----------
+def fetch_cached(params) -> CachedResponse:
+    """
+    Return the response for WMS params from memory, disk or GeoServer (in that order).
+    Concurrent misses for the same key wait on one upstream request.
+    """
+    if not GEOSERVER_WMS_URL:
+        raise RuntimeError("GEOSERVER_WMS_URL not configured")
+
+    norm = normalize_params(params)
+    key = cache_key(norm)
+    ttl = _ttl_for(norm)
+
+    entry = _mem.get(key)
+    if _fresh(entry, ttl):
+        return entry
+    entry = _disk.get(key)
+    if _fresh(entry, ttl):
+        _mem.put(key, entry)
+        return entry
+
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = _inflight[key] = Future()
+
+    if not leader:
+        return fut.result(timeout=WMS_UPSTREAM_TIMEOUT_S * 2)
+
+    try:
+        entry = _fetch_upstream(norm)
+        if cacheable(norm, entry):
+            _mem.put(key, entry)
+            _disk.put(key, entry)
+        elif entry.status == 200:
+            logger.warning("WMS answer not cached (%s) | request=%s", entry.content_type, dict(norm).get("REQUEST"))
+        fut.set_result(entry)
+        return entry
+    except Exception as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+# ---------- Routes ----------
+@router.get("/geoserver/wms")
+def wms_proxy(request: Request):
+    params = list(request.query_params.multi_items())
+    norm = normalize_params(params)
+    req = dict(norm).get("REQUEST", "")
+    if req not in ALLOWED_REQUESTS:
+        raise HTTPException(status_code=400, detail="unsupported_wms_request")
+
+    try:
+        entry = fetch_cached(params)
+    except RuntimeError:
+        raise HTTPException(status_code=503, detail="geoserver_not_configured")
+    except Exception as e:
+        logger.warning("WMS upstream failed: %s", e)
+        raise HTTPException(status_code=502, detail="geoserver_unavailable")
+
+    if not cacheable(norm, entry):
+        # errors (also OGC exceptions sent as 200) are passed through, never cached downstream
+        return Response(content=entry.body, status_code=entry.status, media_type=entry.content_type,
+                        headers={"Cache-Control": "no-store"})
+
+    max_age = WMS_CAPABILITIES_TTL_SEC if req == "GETCAPABILITIES" else WMS_CACHE_TTL_SEC
+    headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={max_age}"}
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.content_type, headers=headers)
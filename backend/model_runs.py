@@ -0,0 +1,243 @@
+# model_runs.py
+"""
+Model runs: the single upstream call behind the chat flow, plus a structured
+REST API that runs a model in one request instead of a chat conversation.
+
+    POST /api/models/{crop|pv|base-abm|pecs-abm|full-abm}/runs?mode=sync|async
+    GET  /api/models/runs/{run_id}
+
+The body mirrors the inputs the chat collects (see payloads.build_payload);
+the result has the same shape as the chat's model results. Async runs execute
+on a bounded worker pool, are kept in Redis and announced with a
+``run.completed`` event (notifications.py). ABM runs with validation take
+hours and are async only.
+
+Config (env):
+    MODEL_RUN_CONCURRENCY   parallel async runs (default: 4)
+    MODEL_RUN_TTL_SEC       how long async run records are kept (default: 7 days)
+    MODEL_RUN_ADMISSION_WAIT_SEC  how long a sync run may queue for a slot (default: 120)
+"""
+import os
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Annotated, Any, Dict, Optional, Union
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+from pydantic import BaseModel, Field, ValidationError
+
+import codec
+from authz_keycloak import require_user
+from redis_conn import redis_client
+from notifications import publish_event
+from geometry import ingest_geojson, GeometryError
+from payloads import MODEL_ROUTES, build_payload, post_payload
+from normalize import empty_result, normalize_result, read_api_data
+from blobs import put_blob
+from admission import AdmissionTimeout, admitted
+from tile_warmup import schedule_warmup
+from validators import MODEL_INPUTS, validate_inputs
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MODEL_RUN_CONCURRENCY = int(os.getenv("MODEL_RUN_CONCURRENCY", "4"))
+MODEL_RUN_TTL_SEC = int(os.getenv("MODEL_RUN_TTL_SEC", str(7 * 24 * 60 * 60)))
+MODEL_RUN_ADMISSION_WAIT_SEC = float(os.getenv("MODEL_RUN_ADMISSION_WAIT_SEC", "120"))
+
+# long-running ABM validation: connect 10s, read up to 5h (same as the chat's async job)
+VALIDATION_TIMEOUT = (10, 5 * 3600)
+
+# short names accepted in the URL
+MODEL_ALIASES = {"crop": "crop_suitability", "pv": "pv_suitability"}
+
+_pool = ThreadPoolExecutor(max_workers=MODEL_RUN_CONCURRENCY, thread_name_prefix="model-run")
+
+
+# ---------- Upstream call ----------
+def run_model(model: str, collected: dict, task_id: str, sub: Optional[str], text: str = "", timeout=None,
+              admission_wait: Optional[float] = MODEL_RUN_ADMISSION_WAIT_SEC) -> dict:
+    """
+    Call the upstream model for the collected inputs and return the result dict
+    the chat flow renders (layers, charts, explanation, text). Never raises.
+    Waits up to ``admission_wait`` seconds for a run slot (admission.py; None: no limit).
+    """
+    result = empty_result(text)
+
+    if model not in MODEL_ROUTES:
+        result["text"] += f"\n❌ Unsupported model type: {model}"
+        return result
+
+    collected, errors = validate_inputs(collected, MODEL_INPUTS[model])
+    if errors:
+        result["text"] += "\n❌ Invalid inputs: " + "; ".join(f"{k} {e}" for k, e in errors.items())
+        return result
+
+    url, payload = build_payload(model, collected, task_id, sub)
+
+    result["action"] = model
+    result["pilot"] = collected["area"].upper()
+
+    try:
+        with admitted(model, sub, task_id, timeout=timeout, wait_timeout=admission_wait):
+            response = post_payload(url, payload, timeout=timeout, stream=True)
+
+            if not response.ok:
+                logger.error("API call failed: %s - %s", response.status_code, response.text)
+                result["text"] += "\n⚠️ Something went wrong when calling the model API."
+                return result
+
+            try:
+                api_data = read_api_data(response)
+            finally:
+                response.close()
+        normalize_result(api_data, result, store_full=lambda data: put_blob(data, task_id, sub))
+        del api_data
+
+        result["text"] += "✅ Model execution completed."
+
+        # Start filling the WMS cache while the client renders the response
+        schedule_warmup(result["map_layers"] + result["profit_layers"], result["pilot"], collected.get("geojson"))
+        return result
+
+    except AdmissionTimeout:
+        result["text"] += "\n⏳ The model service is busy right now. Please try again in a few minutes."
+        return result
+
+    except Exception as e:
+        logger.exception("Exception during API call: %s", e)
+        result["text"] += "\n❌ Failed to contact model API."
+        return result
+
+
+# ---------- Models ----------
+ZeroOne = Annotated[float, Field(ge=0.0, le=1.0)]
+
+class _RunBase(BaseModel):
+    area: str
+    time_period: str = "past"
+
+class CropRun(_RunBase):
+    crop_type: str
+    show_profit: str = "no"          # yes | no (future runs only)
+
+class PvRun(_RunBase):
+    geojson: Union[str, Dict[str, Any]]
+    proximity_to_powerlines: float
+    road_network_accessibility: float
+    electricity_rate: float
+    efficiency: float
+    PV_area: Optional[float] = None  # default: geodesic area of the (clipped) geojson
+
+class AbmRun(_RunBase):
+    validation: str = "no"
+
+class PecsRun(AbmRun):
+    health_status: ZeroOne
+    labor_availability: ZeroOne
+    stress_level: ZeroOne
+    satisfaction: ZeroOne
+    policy_incentives: ZeroOne
+    information_access: ZeroOne
+    social_influence: ZeroOne
+    community_participation: ZeroOne
+
+class FullRun(PecsRun):
+    total_budget: Annotated[float, Field(gt=0)]
+    pv_installation_cost: Annotated[float, Field(gt=0)]
+    adoption_weight: ZeroOne
+    resilience_weight: ZeroOne
+    budget_overshoot_weight: ZeroOne
+
+RUN_SCHEMAS = {
+    "crop_suitability": CropRun,
+    "pv_suitability": PvRun,
+    "base-abm": AbmRun,
+    "pecs-abm": PecsRun,
+    "full-abm": FullRun,
+}
+
+class RunResponse(BaseModel):
+    run_id: str
+    model: str
+    status: str                      # queued | running | done
+    result: Optional[Dict[str, Any]] = None
+
+
+def collected_inputs(model: str, run: _RunBase) -> dict:
+    """Map a validated request body to the chat's collected_inputs; raises ValueError."""
+    collected = run.model_dump()
+    if model == "pv_suitability":
+        area, errors = validate_inputs(collected, ("area",))
+        if errors:
+            raise ValueError(f"area {errors['area']}")
+        raw = run.geojson if isinstance(run.geojson, str) else codec.json_dumps(run.geojson).decode("utf-8")
+        try:
+            ingested = ingest_geojson(raw, pilot=area["area"])
+        except GeometryError as e:
+            raise ValueError(f"geojson: {e}")
+        collected["geojson"] = ingested.geojson
+        if run.PV_area is None:
+            collected["PV_area"] = ingested.area_m2
+
+    keys = MODEL_INPUTS[model] + (("show_profit",) if model == "crop_suitability" else ())
+    collected, errors = validate_inputs(collected, keys)
+    if errors:
+        raise ValueError("; ".join(f"{k} {e}" for k, e in errors.items()))
+    return collected
+
+
+# ---------- Async runs ----------
+def _k_run(run_id: str) -> str:
+    return f"modelrun:{run_id}"
+
+def _save_run(run_id: str, record: dict) -> None:
+    redis_client.set(_k_run(run_id), codec.json_dumps(record).decode("utf-8"), ex=MODEL_RUN_TTL_SEC)
+
+def _run_job(run_id: str, record: dict, collected: dict, sub: str, timeout) -> None:
+    _save_run(run_id, dict(record, status="running"))
+    result = run_model(record["model"], collected, run_id, sub, timeout=timeout, admission_wait=None)
+    _save_run(run_id, dict(record, status="done", result=result, finished_at=datetime.now(timezone.utc).isoformat()))
+    publish_event(sub, "run.completed", {"run_id": run_id, "model": record["model"]})
+
+
+# ---------- Routes ----------
+@router.post("/models/{model}/runs", response_model=RunResponse)
+def create_run(model: str, mode: str = "sync", body: Dict[str, Any] = Body(...), user=Depends(require_user)):
+    model = MODEL_ALIASES.get(model, model)
+    if model not in RUN_SCHEMAS:
+        raise HTTPException(status_code=404, detail=f"Unknown model; expected one of crop, pv, {', '.join(list(RUN_SCHEMAS)[2:])}")
+    if mode not in ("sync", "async"):
+        raise HTTPException(status_code=422, detail="mode must be sync or async")
+
+    try:
+        run = RUN_SCHEMAS[model].model_validate(body)
+        collected = collected_inputs(model, run)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    validating = collected.get("validation") == "yes"
+    if validating and mode == "sync":
+        raise HTTPException(status_code=422, detail="Runs with validation take hours; use mode=async")
+
+    sub = user.get("sub")
+    run_id = str(uuid.uuid4())
+    if mode == "sync":
+        return RunResponse(run_id=run_id, model=model, status="done", result=run_model(model, collected, run_id, sub))
+
+    record = {"run_id": run_id, "model": model, "owner": sub, "status": "queued",
+              "created_at": datetime.now(timezone.utc).isoformat()}
+    _save_run(run_id, record)
+    _pool.submit(_run_job, run_id, record, collected, sub, VALIDATION_TIMEOUT if validating else None)
+    return RunResponse(run_id=run_id, model=model, status="queued")
+
+@router.get("/models/runs/{run_id}", response_model=RunResponse)
+def get_run(run_id: str, user=Depends(require_user)):
+    raw = redis_client.get(_k_run(run_id))
+    record = codec.json_loads(raw) if raw else None
+    if not record or record.get("owner") != user.get("sub"):
+        raise HTTPException(status_code=404, detail="Run not found")
+    return RunResponse(run_id=run_id, model=record["model"], status=record["status"], result=record.get("result"))
@@ -0,0 +1,171 @@
+# normalize.py
+"""
+Upstream model responses -> the result dict the chat and the run API render.
+
+Shared by the synchronous run path (model_runs.run_model) and the long-running
+ABM validation job (service.run_abm_validation_job_async), so both return the
+same layers, profit layers, explanation and per-scenario chart data.
+
+Validation responses can be large. ``read_api_data`` spools the response body
+to a temporary file (kept in memory up to API_SPOOL_MEMORY_BYTES), then parses
+it incrementally with ijson when it is installed, building only the top-level
+keys normalization uses; the raw text and the full parsed document are never
+held together. Without ijson it falls back to parsing the whole body.
+
+Explainability plot series above PLOT_MAX_POINTS are downsampled for the reply
+and the session doc; the full-resolution series goes to a separate blob
+(``store_full``, see blobs.put_blob) that the SPA fetches on demand.
+
+Config (env):
+    API_SPOOL_MEMORY_BYTES  response bytes kept in memory before spilling to disk (default: 4 MiB)
+    PLOT_MAX_POINTS         plot points per chart kept inline (default: 500)
+"""
+import os
+import logging
+import tempfile
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import codec
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional streaming parser
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+API_SPOOL_MEMORY_BYTES = int(os.getenv("API_SPOOL_MEMORY_BYTES", str(4 * 1024 * 1024)))
+PLOT_MAX_POINTS = int(os.getenv("PLOT_MAX_POINTS", "500"))
+
+RCP_SCENARIOS = ("RCP26", "RCP45", "RCP85")
+STATS_KEY = "Validation Statistics"
+
+# top-level keys of the upstream response that normalization reads
+NEEDED_KEYS = frozenset(
+    ("geoserver_data", "User Explanation", STATS_KEY)
+    + tuple(f"{STATS_KEY} - {rcp}" for rcp in RCP_SCENARIOS)
+)
+
+
+def empty_result(text: str = "", action: Optional[str] = None, pilot: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "action": action,
+        "pilot": pilot,
+        "chart_data": [],
+        "map_layers": [],
+        "profit_layers": [],
+        "profit_chart_data": [],
+        "map_explanation": None,
+        "text": text,
+    }
+
+
+# ---------- Parsing ----------
+def _pick_keys(events: Iterable, keys: frozenset, scalars: bool = False) -> Dict[str, Any]:
+    """Build only the wanted top-level values (and top-level numbers, with scalars) from an ijson event stream."""
+    out = {}
+    key, builder = None, None
+    for prefix, event, value in events:
+        if scalars and builder is None and event == "number" and prefix == key:
+            out[key] = value
+        elif prefix == "":
+            if builder is not None and event in ("map_key", "end_map"):
+                out[key] = builder.value
+                builder = None
+            if event == "map_key":
+                key = value
+                builder = ijson.ObjectBuilder() if value in keys else None
+        elif builder is not None:
+            builder.event(event, value)
+    return out
+
+def read_api_data(response, keys: frozenset = NEEDED_KEYS, scalars: bool = False) -> Dict[str, Any]:
+    """
+    The needed top-level keys of a JSON response, plus every top-level number
+    with scalars=True. Post the request with stream=True so the body is
+    spooled chunk by chunk instead of buffered whole.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=API_SPOOL_MEMORY_BYTES) as body:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            body.write(chunk)
+        size = body.tell()
+        body.seek(0)
+        if size > API_SPOOL_MEMORY_BYTES:
+            logger.info("Large upstream response (%s bytes) spooled to disk", size)
+
+        if ijson is None:
+            data = codec.json_loads(body.read())
+            if not isinstance(data, dict):
+                return {}
+            return {k: v for k, v in data.items()
+                    if k in keys or (scalars and isinstance(v, (int, float)) and not isinstance(v, bool))}
+        return _pick_keys(ijson.parse(body, use_float=True), keys, scalars)
+
+
+# ---------- Downsampling ----------
+def _stride(values: List[Any], limit: int) -> List[Any]:
+    """At most `limit` evenly spaced items, always keeping the first and the last."""
+    if len(values) <= limit:
+        return values
+    if limit < 2:
+        return values[:1]
+    step = (len(values) - 1) / (limit - 1)
+    return [values[round(i * step)] for i in range(limit)]
+
+def _point_count(data: List[Any]) -> int:
+    return sum(len(f["values"]) if isinstance(f, dict) and isinstance(f.get("values"), list) else 1 for f in data)
+
+def downsample_plot(data: List[Any], limit: int = PLOT_MAX_POINTS) -> List[Any]:
+    """
+    Plot data with at most about `limit` points. Features ({"feature", "values"})
+    keep their first value, which the bar chart draws; long value series are
+    thinned evenly, and a bare series of numbers is thinned as a whole.
+    """
+    if not isinstance(data, list) or _point_count(data) <= limit:
+        return data
+    if not any(isinstance(f, dict) for f in data):
+        return _stride(data, limit)
+    per_feature = max(1, limit // len(data))
+    return [
+        dict(f, values=_stride(f["values"], per_feature)) if isinstance(f, dict) and isinstance(f.get("values"), list) else f
+        for f in data
+    ]
+
+
+# ---------- Normalization ----------
+def _chart_entry(stats: dict, scenario: Optional[str], store_full: Optional[Callable[[Any], str]]) -> Dict[str, Any]:
+    data = stats.get("Explainability Plot Data", [])
+    entry = {
+        "data": data,
+        "offset": stats.get("Explainability Plot Offset", 0),
+        "explanation": stats.get("Explainability User Message", None),
+        "validation_explanation": stats.get("Ensemble Statistics User Message", None),
+        "scenario": scenario,
+    }
+    if store_full is not None and isinstance(data, list) and _point_count(data) > PLOT_MAX_POINTS:
+        entry["data"] = downsample_plot(data)
+        entry["full_data"] = store_full(data)   # blob hash, fetched via GET /api/blobs/{hash}
+    return entry
+
+def normalize_result(api_data: Dict[str, Any], result: Dict[str, Any],
+                     store_full: Optional[Callable[[Any], str]] = None) -> Dict[str, Any]:
+    """
+    Fill map/profit layers, explanation and chart data of ``result`` from an
+    upstream response. With ``store_full``, oversized plot series are kept
+    downsampled inline and stored at full resolution through the callback.
+    """
+    geoserver_data = api_data.get("geoserver_data") or {}
+    result["map_layers"].extend(geoserver_data.get("layers") or ())
+    result["profit_layers"].extend(geoserver_data.get("layers_profits") or ())
+    result["map_explanation"] = api_data.get("User Explanation", None)
+
+    # single block, or one block per climate scenario
+    if api_data.get(STATS_KEY):
+        result["chart_data"] = [_chart_entry(api_data[STATS_KEY], None, store_full)]
+    else:
+        result["chart_data"] = [
+            _chart_entry(api_data[f"{STATS_KEY} - {rcp}"], rcp, store_full)
+            for rcp in RCP_SCENARIOS
+            if f"{STATS_KEY} - {rcp}" in api_data
+        ]
+    return result
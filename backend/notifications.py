@@ -0,0 +1,96 @@
+# notifications.py
+"""
+Push channel for async job progress and results (Server-Sent Events over Redis pub/sub).
+
+Any worker publishes to the per-user channel ``events:{sub}``; every open tab
+of that user holds a ``GET /api/events`` stream on whichever worker it hit and
+receives the event there, so a finished ABM validation shows up without
+reloading the session.
+
+EventSource cannot set headers, so the token may also be passed as the
+``access_token`` query parameter.
+
+Events:
+    job.progress     {"session_id", "status": started|retrying, "attempt", "retry_in"}
+    session.message  {"session_id", "message"}  (same shape the SPA stores in session docs)
+
+Config (env):
+    EVENTS_HEARTBEAT_SEC   keep-alive comment interval (default: 15)
+"""
+import os
+import json
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from authz_keycloak import verify_jwt_token
+from redis_conn import redis_client, redis_async
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+EVENTS_HEARTBEAT_SEC = float(os.getenv("EVENTS_HEARTBEAT_SEC", "15"))
+
+
+def _k_channel(sub: str) -> str:
+    return f"events:{sub}"
+
+
+# ---------- Publish ----------
+def publish_event(sub: Optional[str], event: str, data: dict) -> None:
+    """Publish an event to all open streams of a user; never raises."""
+    if not sub:
+        return
+    try:
+        redis_client.publish(_k_channel(sub), json.dumps({"event": event, "data": data}, separators=(",", ":")))
+    except Exception:
+        logger.exception("Publish failed | sub=%s event=%s", sub, event)
+
+
+# ---------- Stream ----------
+def _token_from(request: Request, access_token: Optional[str]) -> str:
+    auth = request.headers.get("authorization") or ""
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    if access_token:
+        return access_token
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+def _sse(event: str, data: str) -> bytes:
+    return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+async def _stream(request: Request, sub: str):
+    pubsub = redis_async.pubsub()
+    await pubsub.subscribe(_k_channel(sub))
+    try:
+        yield b"retry: 5000\n\n"
+        while not await request.is_disconnected():
+            msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=EVENTS_HEARTBEAT_SEC)
+            if msg is None:
+                yield b": keep-alive\n\n"
+                continue
+            try:
+                envelope = json.loads(msg["data"])
+                yield _sse(envelope["event"], json.dumps(envelope["data"], separators=(",", ":")))
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Dropping malformed event | sub=%s", sub)
+    finally:
+        try:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+
+# ---------- Routes ----------
+@router.get("/events")
+async def events(request: Request, access_token: Optional[str] = None):
+    payload = verify_jwt_token(_token_from(request, access_token))
+    sub = payload.get("sub")
+    if not sub:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_stream(request, sub), media_type="text/event-stream", headers=headers)
@@ -0,0 +1,110 @@
+# payloads.py
+"""
+Builds and sends the upstream model payloads (crop / pv / base / pecs / full).
+
+The GeoJSON of PV runs is sent either as a minified string (what the upstream
+has always accepted) or as a nested object, and large bodies can be gzipped.
+
+Config (env):
+    UPSTREAM_BASE_URL        model API base (default: https://transitionapi.neuralio.ai)
+    UPSTREAM_GEOJSON_MODE    string | object (default: string)
+    UPSTREAM_GZIP            1 to gzip request bodies (default: 0)
+    UPSTREAM_GZIP_MIN_BYTES  only gzip bodies at/above this size (default: 1024)
+"""
+import os
+import json
+import gzip
+from typing import Optional, Tuple
+
+import requests
+
+import codec
+
+UPSTREAM_BASE_URL = os.getenv("UPSTREAM_BASE_URL", "https://transitionapi.neuralio.ai").rstrip("/")
+UPSTREAM_GEOJSON_MODE = os.getenv("UPSTREAM_GEOJSON_MODE", "string").strip().lower()
+UPSTREAM_GZIP = os.getenv("UPSTREAM_GZIP", "0").strip().lower() in ("1", "true", "yes")
+UPSTREAM_GZIP_MIN_BYTES = int(os.getenv("UPSTREAM_GZIP_MIN_BYTES", "1024"))
+
+# route prefix per model; "_past" / "_future" is appended from time_period
+MODEL_ROUTES = {
+    "crop_suitability": "crop",
+    "pv_suitability": "pv",
+    "base-abm": "base",
+    "pecs-abm": "pecs",
+    "full-abm": "full",
+}
+
+PV_FIELDS = ("proximity_to_powerlines", "road_network_accessibility", "PV_area", "electricity_rate", "efficiency")
+
+PECS_FIELDS = (
+    "health_status", "labor_availability", "stress_level", "satisfaction",
+    "policy_incentives", "information_access", "social_influence", "community_participation",
+)
+
+FULL_FIELDS = PECS_FIELDS + (
+    "total_budget", "pv_installation_cost", "adoption_weight", "resilience_weight", "budget_overshoot_weight",
+)
+
+
+def model_url(model: str, time_period: str) -> str:
+    suffix = "future" if time_period == "future" else "past"
+    return f"{UPSTREAM_BASE_URL}/{MODEL_ROUTES[model]}_{suffix}"
+
+
+def geojson_for_upstream(geojson):
+    """Minified string (default) or nested object, parsed at most once."""
+    if UPSTREAM_GEOJSON_MODE == "object":
+        return json.loads(geojson) if isinstance(geojson, str) else geojson
+    if isinstance(geojson, str):
+        return geojson  # already compact canonical form (see geometry.ingest_geojson)
+    return json.dumps(geojson, separators=(",", ":"))
+
+
+def build_payload(model: str, collected: dict, task_id: str, sub: Optional[str]) -> Tuple[str, dict]:
+    """
+    Return (url, payload) for a model run from its collected inputs, already
+    typed by validators.validate_inputs (numbers are sent as they are).
+    """
+    url = model_url(model, collected["time_period"])
+    area = collected["area"].upper()
+
+    if model == "crop_suitability":
+        payload = {
+            "crop_type": collected["crop_type"].upper(),
+            "area": area
+        }
+        if collected["time_period"] == "future":
+            payload["display_profits"] = collected["show_profit"]
+        return url, payload
+
+    payload = {
+        "task_id": task_id,
+        "user_id": sub,
+    }
+
+    if model == "pv_suitability":
+        payload["geojson"] = geojson_for_upstream(collected["geojson"])
+        payload["area"] = area
+        for f in PV_FIELDS:
+            payload[f] = collected[f]
+        return url, payload
+
+    payload["area"] = area
+    if model == "pecs-abm":
+        for f in PECS_FIELDS:
+            payload[f] = collected[f]
+    elif model == "full-abm":
+        for f in FULL_FIELDS:
+            payload[f] = collected[f]
+    payload["validation"] = collected["validation"].lower()
+    return url, payload
+
+
+def post_payload(url: str, payload: dict, timeout=None, **kwargs) -> requests.Response:
+    """POST a compact JSON body (gzipped above UPSTREAM_GZIP_MIN_BYTES when enabled)."""
+    body = codec.json_dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    if UPSTREAM_GZIP and len(body) >= UPSTREAM_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return requests.post(url, headers=headers, data=body, verify=False, timeout=timeout, **kwargs)
@@ -1,5 +1,6 @@
 # redis_conn.py
 import redis
+import redis.asyncio
 import os
 from dotenv import load_dotenv
 
@@ -10,4 +11,20 @@ redis_client = redis.Redis(
     port=6379,
     db=0,
     decode_responses=True
-)
\ No newline at end of file
+)
+
+# Binary client for values encoded with codec.py (state, history, session docs)
+redis_bin = redis.Redis(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=6379,
+    db=0,
+    decode_responses=False
+)
+
+# Asyncio client for long-lived pub/sub listeners (SSE) so they don't hold worker threads
+redis_async = redis.asyncio.Redis(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=6379,
+    db=0,
+    decode_responses=True
+)
@@ -0,0 +1,82 @@
+# responses.py
+"""
+Chat turn replies: the typed response model, a shared builder and the fast
+JSON response class.
+
+Every /api/chat reply has the same eight keys. Replies are built from an
+immutable template per (text, action) prompt, cached on first use, so a turn
+only copies the template and sets the pilot; model results map onto the same
+shape with ``result_reply``. The route serializes with orjson
+(``FastJSONResponse``) and skips per-reply model validation; ``ChatResponse``
+documents the contract in OpenAPI.
+"""
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional
+
+from fastapi import Response
+from pydantic import BaseModel
+
+import codec
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson (codec.json_dumps), like ORJSONResponse."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return codec.json_dumps(content)
+
+
+class ChatResponse(BaseModel):
+    response: str
+    chart_data: List[Any] = []
+    map_layers: List[Any] = []
+    profit_layers: List[Any] = []
+    profit_chart_data: List[Any] = []
+    map_explanation: Optional[str] = None
+    action: Optional[str] = None
+    pilot: Optional[str] = None
+
+
+# tuples, not lists: the template is shared by every reply built from it
+EMPTY_REPLY: Mapping[str, Any] = MappingProxyType({
+    "response": "",
+    "chart_data": (),
+    "map_layers": (),
+    "profit_layers": (),
+    "profit_chart_data": (),
+    "map_explanation": None,
+    "action": None,
+    "pilot": None,
+})
+
+
+@lru_cache(maxsize=512)
+def reply_template(text: str, action: Optional[str] = None) -> Mapping[str, Any]:
+    """Immutable reply for a prompt; built once per (text, action)."""
+    return MappingProxyType(dict(EMPTY_REPLY, response=text, action=action))
+
+
+def reply(text: str, action: Optional[str] = None, pilot: Optional[str] = None, static: bool = True) -> dict:
+    """
+    A chat reply without model output (prompts, validation errors, LLM answers).
+    Pass static=False for one-off texts so they don't crowd the template cache.
+    """
+    out = dict(reply_template(text, action)) if static else dict(EMPTY_REPLY, response=text, action=action)
+    out["pilot"] = pilot
+    return out
+
+
+def result_reply(result: dict) -> dict:
+    """A chat reply carrying a model result (see model_runs.run_model)."""
+    return {
+        "response": result["text"],
+        "chart_data": result["chart_data"],
+        "map_layers": result["map_layers"],
+        "profit_layers": result["profit_layers"],
+        "profit_chart_data": result["profit_chart_data"],
+        "map_explanation": result["map_explanation"],
+        "action": result["action"],
+        "pilot": result["pilot"],
+    }
@@ -8,22 +8,38 @@ import logging
 import json
 import os
 import gc
-from redis_conn import redis_client
-import json
-import requests
+import codec
+from redis_conn import redis_client, redis_bin
 import copy
 import time
 from shapely.geometry import shape
 from pyproj import Geod
 from requests.exceptions import ReadTimeout, ConnectTimeout, ConnectionError
 
-from state_manager import init_state, load_state, save_state, touch_session_ttl
-from validators import validate_crop_type, validate_pilot, validate_geojson, validate_time_period, \
-    validate_validation, validate_zero_one
+from state_manager import init_state, load_state, save_state, touch_session_ttl, SESSION_TTL_SEC
+from turns import TurnBusy, session_turn, invalidate_turns, cached_reply, claim_request, release_request, \
+    wait_for_reply, store_reply, IDEMPOTENCY_RETRY_AFTER_SEC
+from validators import validate_crop_type, validate_pilot, validate_time_period, \
+    validate_validation, validate_zero_one, parse_number, validate_inputs, MODEL_INPUTS
+from geometry import ingest_geojson, GeometryError
+from responses import ChatResponse, FastJSONResponse, reply, result_reply
+from slots import fill_slots, detect_service, next_missing_step, last_step, step_action, STEP_KEYS, STEP_PROMPTS
+from payloads import build_payload, post_payload
+from normalize import empty_result, normalize_result, read_api_data
+from blobs import put_blob
+from admission import admitted
 from authz_keycloak import require_user, require_role, verify_jwt_token
 from sessions import router as sessions_router, persist_async_result_to_session, _set_session_owner
+from session_export import router as export_router
+from geoserver_proxy import router as geoserver_router
+from notifications import router as events_router, publish_event
+from sweeps import router as sweeps_router, start_sweep_worker
+from model_runs import router as model_runs_router, run_model
+from tile_warmup import schedule_warmup
 from emailer import send_email, build_results_email_html
 from logging_config import configure_logging
+from compression import CompressionMiddleware
+from compaction import start_compaction_worker
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -36,8 +52,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
+# before sessions_router, whose /sessions/{session_id} would match /sessions/export
+app.include_router(export_router, prefix="/api", tags=["sessions"])
 app.include_router(sessions_router, prefix="/api", tags=["sessions"])
+app.include_router(geoserver_router, prefix="/api", tags=["geoserver"])
+app.include_router(events_router, prefix="/api", tags=["events"])
+app.include_router(sweeps_router, prefix="/api", tags=["sweeps"])
+app.include_router(model_runs_router, prefix="/api", tags=["models"])
+
+# Archive idle sessions to cold storage (restored on access, see compaction.py)
+start_compaction_worker()
+# Keep sweep leases alive and resume sweeps of dead workers (see sweeps.py)
+start_sweep_worker()
 
 # Logging
 configure_logging()
@@ -59,20 +87,6 @@ def retry_backoff(attempt: int) -> int:
     schedule = [300, 900, 1800]  # 5min, 15min, 30min
     return schedule[min(attempt, len(schedule)-1)]
 
-def parse_number(value):
-    try:
-        # Δοκίμασε πρώτα αν είναι ακέραιος
-        int_value = int(value)
-        return int_value
-    except (ValueError, TypeError):
-        try:
-            # Αν δεν είναι ακέραιος, δοκίμασε δεκαδικό
-            float_value = float(value)
-            return float_value
-        except (ValueError, TypeError):
-            return None
-
-
 def call_llm(session_id: str, user_message: str) -> str:
     history_key = f"chat:{session_id}:history"
 
@@ -85,15 +99,20 @@ def call_llm(session_id: str, user_message: str) -> str:
     }
 
     # ➕ Αν δεν υπάρχει ιστορικό, ξεκινάμε με system prompt
-    if redis_client.llen(history_key) == 0:
-        redis_client.rpush(history_key, json.dumps(system_prompt))
+    pipe = redis_bin.pipeline()
+    new_history = redis_client.llen(history_key) == 0
+    if new_history:
+        pipe.rpush(history_key, codec.dumps(system_prompt))
 
     # ➕ Πρόσθεσε το user μήνυμα
-    redis_client.rpush(history_key, json.dumps({"role": "user", "content": user_message}))
+    pipe.rpush(history_key, codec.dumps({"role": "user", "content": user_message}))
+    if new_history:
+        pipe.expire(history_key, SESSION_TTL_SEC)   # later refreshes are lazy (touch_session_ttl)
+    pipe.execute()
     touch_session_ttl(session_id)
 
     # 🔄 Πάρε όλο το ιστορικό
-    chat_history = [json.loads(m) for m in redis_client.lrange(history_key, 0, -1)]
+    chat_history = [codec.loads(m) for m in redis_bin.lrange(history_key, 0, -1)]
 
     # 📡 Κάλεσε το LLM μέσω agent
     response = client.agents.complete(
@@ -105,12 +124,20 @@ def call_llm(session_id: str, user_message: str) -> str:
     answer = response.choices[0].message.content.strip()
 
     # 💾 Αποθήκευση απάντησης στο ιστορικό
-    redis_client.rpush(history_key, json.dumps({"role": "assistant", "content": answer}))
-    touch_session_ttl(session_id)
+    redis_bin.rpush(history_key, codec.dumps({"role": "assistant", "content": answer}))
 
     return answer
 
 
+def extract_slots_llm(prompt: str) -> str:
+    """One-off agent call for slot extraction; kept out of the chat history."""
+    response = client.agents.complete(
+        agent_id=ag_id,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return response.choices[0].message.content.strip()
+
+
 def calculate_area_sq_meters(geojson_data):
     geod = Geod(ellps="WGS84")  # Use WGS84 ellipsoid
     total_area = 0.0
@@ -139,6 +166,20 @@ def calculate_area_sq_meters(geojson_data):
     return total_area  # in square meters
 
 
+def ingest_area(user_input: str, state: dict, detect: bool = False):
+    """
+    Run drawn GeoJSON through the geometry ingest stage, clipped to the selected pilot
+    (or to the pilot detected from the area itself when detect=True).
+    Returns (IngestedArea, None) or (None, user-facing reason).
+    """
+    pilot = (state.get("collected_inputs") or {}).get("area")
+    try:
+        return ingest_geojson(user_input, pilot=pilot, detect=detect), None
+    except GeometryError as e:
+        logger.info("Rejected GeoJSON: %s", e)
+        return None, str(e)
+
+
 def extract_identity(http_req: Optional[Request]) -> Dict[str, Optional[str]]:
     """
     Return {'sub': <keycloak sub or None>, 'email': <email or preferred_username or None>}
@@ -168,220 +209,7 @@ def extract_identity(http_req: Optional[Request]) -> Dict[str, Optional[str]]:
 def handle_llm_response(response_text: str, session_id: str , model: str, sub: str | None):
     state = load_state(session_id)
     collected = state.get("collected_inputs", {})
-
-    print("HANDLE STARTED")
-    print(state)
-    print(response_text)
-    result = {
-        "action": None,
-        "pilot": None,
-        "chart_data": [],
-        "map_layers": [],
-        "profit_layers": [],
-        "profit_chart_data": [],
-        "map_explanation": None,
-        "text": response_text.strip()
-    }
-
-    print("IFMODEL")
-    # --- Για μοντέλο crop ---
-    if model == "crop_suitability":
-        print("CROP VARIABLES")
-        print(collected)
-        crop_type = collected["crop_type"]
-        time_period = collected["time_period"]
-        pilot = collected["area"]
-
-        payload = {
-            "crop_type": crop_type.upper(),
-            "area": pilot.upper()
-        }
-
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/crop_future"
-            payload["display_profits"] = collected["show_profit"]
-        else:
-            url = "https://transitionapi.neuralio.ai/crop_past"
-
-        result["action"] = "crop_suitability"
-        result["pilot"] = pilot.upper()
-
-    # --- Για μοντέλο pv ---
-    elif model == "pv_suitability":
-        print("PV VARIABLES")
-        print(collected)
-        time_period = collected["time_period"]
-        pilot = collected["area"]
-        geojson_clean = json.loads(collected['geojson'])
-        pretty_geojson = json.dumps(geojson_clean, indent=2)
-
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/pv_future"
-        else:
-            url = "https://transitionapi.neuralio.ai/pv_past"
-
-        payload = {
-            "task_id": session_id,
-            "user_id": sub,
-            "geojson" : pretty_geojson,
-            "area": pilot.upper(),
-            "proximity_to_powerlines": float(collected["proximity_to_powerlines"]),
-            "road_network_accessibility": float(collected["road_network_accessibility"]),
-            "PV_area": float(collected["PV_area"]),
-            "electricity_rate": float(collected["electricity_rate"]),
-            "efficiency": float(collected["efficiency"])
-        }
-        result["action"] = "pv_suitability"
-        result["pilot"] = pilot.upper()
-
-    # --- Για μοντέλο base-abm ---
-    elif model == "base-abm":
-        print("BASE-ABM VARIABLES")
-        print(collected)
-        time_period = collected["time_period"]
-        pilot = collected["area"]
-        validation = collected["validation"]
-
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/base_future"
-        else:
-            url = "https://transitionapi.neuralio.ai/base_past"
-
-        payload = {
-            "task_id": session_id,
-            "user_id": sub,
-            "area": pilot.upper(),
-            "validation": validation.lower()
-        }
-
-        result["action"] = "base-abm"
-        result["pilot"] = pilot.upper()
-
-    # --- Για μοντέλο pecs-abm ---
-    elif model == "pecs-abm":
-        print("PECS-ABM VARIABLES")
-        print(collected)
-        time_period = collected["time_period"]
-        pilot = collected["area"]
-        validation = collected["validation"]
-
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/pecs_future"
-        else:
-            url = "https://transitionapi.neuralio.ai/pecs_past"
-
-        payload = {
-            "task_id": session_id,
-            "user_id": sub, 
-            "area": pilot.upper(),
-            "health_status": float(collected["health_status"]),
-            "labor_availability": float(collected["labor_availability"]),
-            "stress_level": float(collected["stress_level"]),
-            "satisfaction": float(collected["satisfaction"]),
-            "policy_incentives": float(collected["policy_incentives"]),
-            "information_access": float(collected["information_access"]),
-            "social_influence": float(collected["social_influence"]),
-            "community_participation": float(collected["community_participation"]),
-            "validation": validation.lower()
-        }
-
-        result["action"] = "pecs-abm"
-        result["pilot"] = pilot.upper()
-
-    # --- Για μοντέλο full-abm ---
-    elif model == "full-abm":
-        print("FULL-ABM VARIABLES")
-        print(collected)
-        time_period = collected["time_period"]
-        pilot = collected["area"]
-        validation = collected["validation"]
-
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/full_future"
-        else:
-            url = "https://transitionapi.neuralio.ai/full_past"
-
-        payload = {
-            "task_id": session_id,
-            "user_id": sub, 
-            "area": pilot.upper(),
-            "health_status": float(collected["health_status"]),
-            "labor_availability": float(collected["labor_availability"]),
-            "stress_level": float(collected["stress_level"]),
-            "satisfaction": float(collected["satisfaction"]),
-            "policy_incentives": float(collected["policy_incentives"]),
-            "information_access": float(collected["information_access"]),
-            "social_influence": float(collected["social_influence"]),
-            "community_participation": float(collected["community_participation"]),
-            "total_budget": float(collected["total_budget"]),
-            "pv_installation_cost": float(collected["pv_installation_cost"]),
-            "adoption_weight": float(collected["adoption_weight"]),
-            "resilience_weight": float(collected["resilience_weight"]),
-            "budget_overshoot_weight": float(collected["budget_overshoot_weight"]),
-            "validation": validation.lower()
-        }
-
-        result["action"] = "full-abm"
-        result["pilot"] = pilot.upper()
-
-    else:
-        result["text"] += f"\n❌ Unsupported model type: {model}"
-        return result
-
-    headers = {"Content-Type": "application/json"}
-
-    try:
-        response = requests.post(url, headers=headers, json=payload, verify=False)
-
-        if not response.ok:
-            logger.error("API call failed: %s - %s", response.status_code, response.text)
-            # print(f"❌ API call failed: {response.status_code} - {response.text}")
-            result["text"] += "\n⚠️ Something went wrong when calling the model API."
-            return result
-
-        api_data = response.json()
-
-        geoserver_data = api_data.get("geoserver_data", {})
-        for layer in geoserver_data.get("layers", []):
-            result["map_layers"].append(layer)
-
-        for profit_layer in geoserver_data.get("layers_profits", []):
-            result["profit_layers"].append(profit_layer)
-
-        result["map_explanation"] = api_data.get("User Explanation", None)
-
-        if api_data.get("Validation Statistics"):
-            stats = api_data["Validation Statistics"]
-            result["chart_data"] = [
-                {
-                    "data": stats.get("Explainability Plot Data", []),
-                    "offset": stats.get("Explainability Plot Offset", 0),
-                    "explanation": stats.get("Explainability User Message", None),
-                    "validation_explanation": stats.get("Ensemble Statistics User Message", None),
-                    "scenario": None
-                }
-            ]
-        elif any(k.startswith("Validation Statistics - RCP") for k in api_data.keys()):
-            for rcp in ["RCP26", "RCP45", "RCP85"]:
-                stats_key = f"Validation Statistics - {rcp}"
-                if stats_key in api_data:
-                    stats = api_data[stats_key]
-                    result["chart_data"].append({
-                        "data": stats.get("Explainability Plot Data", []),
-                        "offset": stats.get("Explainability Plot Offset", 0),
-                        "explanation": stats.get("Explainability User Message", None),
-                        "validation_explanation": stats.get("Ensemble Statistics User Message", None),
-                        "scenario": rcp
-                    })
-
-        result["text"] += "✅ Model execution completed."
-        return result
-
-    except Exception as e:
-        logger.exception("Exception during API call: %s", e)
-        # print("❌ Exception during API call:", str(e))
-        result["text"] += "\n❌ Failed to contact model API."
-        return result
+    return run_model(model, collected, session_id, sub, text=response_text.strip())
 
 
 def run_abm_validation_job_async(session_id: str, model: str, collected_inputs: dict, sub: str | None, email: str | None):
@@ -391,97 +219,44 @@ def run_abm_validation_job_async(session_id: str, model: str, collected_inputs:
     on final failure, append a failure message to the session.
     """
     # Gather inputs
-    time_period = collected_inputs["time_period"]
+    model_name = {"base-abm": "ABM", "pecs-abm": "PECS-ABM", "full-abm": "FULL-ABM"}.get(model)
+    collected_inputs, errors = validate_inputs(collected_inputs, MODEL_INPUTS[model])
+    if errors:
+        # not an upstream failure: report it once instead of retrying a payload that cannot be built
+        logger.error("%s async: invalid inputs | sess=%s errors=%s", model_name, session_id, errors)
+        area = collected_inputs.get("area")
+        result = empty_result("❌ Invalid inputs: " + "; ".join(f"{k} {e}" for k, e in errors.items()),
+                              action=model, pilot=area.upper() if isinstance(area, str) else None)
+        persist_async_result_to_session(sub, email, session_id, result)
+        return
     pilot = collected_inputs["area"]
-    validation = collected_inputs["validation"]
-    model_name = None
-    
-    if model == "base-abm":
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/base_future"
-        else:
-            url = "https://transitionapi.neuralio.ai/base_past"
-
-        payload = {
-            "task_id": session_id,
-            "user_id": sub,
-            "area": pilot.upper(),
-            "validation": validation.lower()
-        }
-
-        model_name = "ABM"
-    
-    elif model == "pecs-abm":
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/pecs_future"
-        else:
-            url = "https://transitionapi.neuralio.ai/pecs_past"
-       
-        payload = {
-            "task_id": session_id,
-            "user_id": sub, 
-            "area": pilot.upper(),
-            "health_status": float(collected_inputs["health_status"]),
-            "labor_availability": float(collected_inputs["labor_availability"]),
-            "stress_level": float(collected_inputs["stress_level"]),
-            "satisfaction": float(collected_inputs["satisfaction"]),
-            "policy_incentives": float(collected_inputs["policy_incentives"]),
-            "information_access": float(collected_inputs["information_access"]),
-            "social_influence": float(collected_inputs["social_influence"]),
-            "community_participation": float(collected_inputs["community_participation"]),
-            "validation": validation.lower()
-        }
-
-        model_name = "PECS-ABM"
-
-    elif model == "full-abm":
-        if time_period == "future":
-            url = "https://transitionapi.neuralio.ai/full_future"
-        else:
-            url = "https://transitionapi.neuralio.ai/full_past"
-
-        payload = {
-            "task_id": session_id,
-            "user_id": sub, 
-            "area": pilot.upper(),
-            "health_status": float(collected_inputs["health_status"]),
-            "labor_availability": float(collected_inputs["labor_availability"]),
-            "stress_level": float(collected_inputs["stress_level"]),
-            "satisfaction": float(collected_inputs["satisfaction"]),
-            "policy_incentives": float(collected_inputs["policy_incentives"]),
-            "information_access": float(collected_inputs["information_access"]),
-            "social_influence": float(collected_inputs["social_influence"]),
-            "community_participation": float(collected_inputs["community_participation"]),
-            "total_budget": float(collected_inputs["total_budget"]),
-            "pv_installation_cost": float(collected_inputs["pv_installation_cost"]),
-            "adoption_weight": float(collected_inputs["adoption_weight"]),
-            "resilience_weight": float(collected_inputs["resilience_weight"]),
-            "budget_overshoot_weight": float(collected_inputs["budget_overshoot_weight"]),
-            "validation": validation.lower()
-        }
-
-        model_name = "FULL-ABM"
-
-    headers = {"Content-Type": "application/json"}
+    url, payload = build_payload(model, collected_inputs, session_id, sub)
 
     max_attempts = 4  # 1 initial + 3 retries
     last_error_text = None
     api_data = None
 
+    publish_event(sub, "job.progress", {"session_id": session_id, "status": "started", "attempt": 1})
+
     for attempt in range(max_attempts):
         try:
             # connect timeout 10s; read timeout generously high (e.g. 3 * 3600s = 3h)
-            resp = requests.post(url, headers=headers, json=payload, verify=False, timeout=(10, 5 * 3600))
-            if resp.status_code == 200:
-                api_data = resp.json()
-                break  # success
-            elif resp.status_code in RETRYABLE_STATUS:
-                last_error_text = f"{resp.status_code} - {resp.text[:300]}"
-            else:
-                # Non-retryable (4xx etc.). Fail fast.
-                last_error_text = f"{resp.status_code} - {resp.text[:300]}"
-                logger.error("%s async: non-retryable response; %s", model_name, last_error_text)
-                break
+            # holds a run slot (admission.py) for the attempt, not for the backoff sleep
+            with admitted(model, sub, session_id, timeout=(10, 5 * 3600)):
+                resp = post_payload(url, payload, timeout=(10, 5 * 3600), stream=True)
+                if resp.status_code == 200:
+                    try:
+                        api_data = read_api_data(resp)
+                    finally:
+                        resp.close()
+                    break  # success
+                elif resp.status_code in RETRYABLE_STATUS:
+                    last_error_text = f"{resp.status_code} - {resp.text[:300]}"
+                else:
+                    # Non-retryable (4xx etc.). Fail fast.
+                    last_error_text = f"{resp.status_code} - {resp.text[:300]}"
+                    logger.error("%s async: non-retryable response; %s", model_name, last_error_text)
+                    break
         except (ReadTimeout, ConnectTimeout, ConnectionError) as e:
             last_error_text = f"{type(e).__name__}: {str(e)[:300]}"
 
@@ -489,6 +264,8 @@ def run_abm_validation_job_async(session_id: str, model: str, collected_inputs:
         if attempt < max_attempts - 1:
             delay = retry_backoff(attempt)
             logger.warning("%s async: attempt %s failed; retrying in %ss; last_error=%s", model_name, attempt + 1, delay, last_error_text)
+            publish_event(sub, "job.progress", {"session_id": session_id, "status": "retrying",
+                                                "attempt": attempt + 2, "retry_in": delay})
             time.sleep(delay)
 
 
@@ -497,48 +274,12 @@ def run_abm_validation_job_async(session_id: str, model: str, collected_inputs:
         if sub:
             _set_session_owner(session_id, sub)
 
-        result = {
-            "action": model,
-            "pilot": pilot.upper(),
-            "chart_data": [],
-            "map_layers": [],
-            "profit_layers": [],
-            "profit_chart_data": [],
-            "map_explanation": None,
-            "text": ""
-        }
-
-        # Map layers
-        geoserver_data = api_data.get("geoserver_data", {})
-        for layer in geoserver_data.get("layers", []):
-            result["map_layers"].append(layer)
-
-        result["map_explanation"] = api_data.get("User Explanation", None)
-
-        # Chart / explainability blocks (both single and per-RCP variants supported)
-        if api_data.get("Validation Statistics"):
-            stats = api_data["Validation Statistics"]
-            result["chart_data"] = [{
-                "data": stats.get("Explainability Plot Data", []),
-                "offset": stats.get("Explainability Plot Offset", 0),
-                "explanation": stats.get("Explainability User Message", None),
-                "validation_explanation": stats.get("Ensemble Statistics User Message", None),
-                "scenario": None
-            }]
-        elif any(k.startswith("Validation Statistics - RCP") for k in api_data.keys()):
-            for rcp in ["RCP26", "RCP45", "RCP85"]:
-                stats_key = f"Validation Statistics - {rcp}"
-                if stats_key in api_data:
-                    stats = api_data[stats_key]
-                    result["chart_data"].append({
-                        "data": stats.get("Explainability Plot Data", []),
-                        "offset": stats.get("Explainability Plot Offset", 0),
-                        "explanation": stats.get("Explainability User Message", None),
-                        "validation_explanation": stats.get("Ensemble Statistics User Message", None),
-                        "scenario": rcp
-                    })
+        result = normalize_result(api_data, empty_result(action=model, pilot=pilot.upper()),
+                                  store_full=lambda data: put_blob(data, session_id, sub))
+        api_data = None  # full-resolution plot data now lives in its blob
 
         result["text"] = "✅ ABM validation results are ready."
+        schedule_warmup(result["map_layers"] + result["profit_layers"], result["pilot"], collected_inputs.get("geojson"))
 
         # Persist + “email”
         persist_async_result_to_session(sub, email, session_id, result)
@@ -595,6 +336,7 @@ def run_abm_validation_job_async(session_id: str, model: str, collected_inputs:
 class ChatRequest(BaseModel):
     message: str
     session_id: str
+    request_id: Optional[str] = None   # client-generated; the same for retries of one message
 
 
 class SessionResetRequest(BaseModel):
@@ -602,8 +344,84 @@ class SessionResetRequest(BaseModel):
 
 
 # Main chat route
-@app.post("/api/chat")
+@app.post("/api/chat", response_model=ChatResponse, response_class=FastJSONResponse)
 def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Request = None):
+    session_id = request.session_id
+    # retries of a request (client timeout, 401 refresh, double click) get the first reply back
+    request_key = request.request_id or (http_req.headers.get("idempotency-key") if http_req is not None else None)
+
+    out = cached_reply(session_id, request_key)
+    claim = claim_request(session_id, request_key) if out is None else None
+    if out is None and claim is None:
+        # the first attempt is still running: wait briefly for its reply instead of re-running the turn
+        out = wait_for_reply(session_id, request_key)
+        claim = claim_request(session_id, request_key) if out is None else None
+        if out is None and claim is None:
+            # resend the same request_id later to get its answer
+            return FastJSONResponse(
+                reply("⏳ Still working on your previous request. Its answer will appear once it is ready."),
+                status_code=202, headers={"Retry-After": str(IDEMPOTENCY_RETRY_AFTER_SEC)})
+    if out is not None:
+        return FastJSONResponse(out)
+
+    try:
+        # one turn at a time per session (turns.py)
+        with session_turn(session_id):
+            # Load or init state
+            state = load_state(session_id)
+            if state is None:
+                state = init_state(session_id)
+
+            prefilled = bool(state.get("prefilled"))
+            out = chat_turn(request, bg, http_req, state)
+            if prefilled or state.get("prefilled"):
+                out = skip_prefilled_steps(request, bg, http_req, out)
+    except TurnBusy:
+        release_request(session_id, request_key, claim)
+        return FastJSONResponse(reply("⏳ Your previous message in this chat is still being processed. Please wait for its answer and try again."))
+    except Exception:
+        release_request(session_id, request_key, claim)
+        raise
+
+    store_reply(session_id, request_key, out)
+    # replies are built in the ChatResponse shape; serialize directly (no per-turn validation)
+    return FastJSONResponse(out)
+
+
+def skip_prefilled_steps(request: ChatRequest, bg: BackgroundTasks, http_req: Optional[Request], out: dict) -> dict:
+    """
+    The step handlers advance one step at a time; when the next step was already
+    filled from an earlier message, move on to the first missing one (or run the model).
+    """
+    session_id = request.session_id
+    state = load_state(session_id)
+    if not state:
+        return out
+
+    service = state.get("service")
+    step = state.get("current_step")
+    collected = state.get("collected_inputs") or {}
+    if not service or step == "select_service":
+        if state.pop("prefilled", None):
+            save_state(session_id, state)
+        return out
+    if collected.get(STEP_KEYS.get(step, step)) is None:
+        return out
+
+    nxt = next_missing_step(service, collected)
+    if nxt is None:
+        # Everything is known: replay the final answer through its step handler
+        final = state["current_step"] = last_step(service, collected)
+        value = collected.pop(STEP_KEYS.get(final, final))
+        return chat_turn(ChatRequest(message=str(value), session_id=session_id), bg, http_req, state)
+
+    state["current_step"] = nxt
+    save_state(session_id, state)
+    return reply(f"Thanks! {STEP_PROMPTS[nxt]}", action=step_action(service, nxt), pilot=out.get("pilot"), static=False)
+
+
+def chat_turn(request: ChatRequest, bg: BackgroundTasks, http_req: Optional[Request], state: dict) -> dict:
+    """One wizard/LLM turn for the given state (mutated and saved in place)."""
     session_id = request.session_id
     user_input = request.message.strip()
 
@@ -612,20 +430,10 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
     sub = ident.get("sub")
     email = ident.get("email")
 
-    # Load or init state
-    state = load_state(session_id)
-    if state is None:
-        state = init_state(session_id)
-
     current_step = state["current_step"]
     service = state["service"]
     collected = state["collected_inputs"]
 
-    chart_data = []
-    map_layers = []
-    profit_layers = []
-    profit_chart_data = []
-    map_explanation = None
     action = None
     pilot = None
 
@@ -634,41 +442,62 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
         save_state(session_id, state)
         redis_client.delete(f"chat:{session_id}:history")
         llm_response = call_llm(session_id, "Tell very quickly 'If you’d like to start a service, type its name with a hashtag (e.g., #crop, #pv, #abm, #pecs or #full). You can also ask me anything to learn more about how the services work.'")
-        return {
-            "response": llm_response,
-            "chart_data": [],
-            "map_layers": [],
-            "profit_layers": [],
-            "profit_chart_data": [],
-            "map_explanation": None,
-            "action": None,
-            "pilot": pilot
-        }
+        return reply(llm_response, pilot=pilot, static=False)
+
+
+    # A polygon drawn at the pilot step resolves the pilot itself, saving the typed-pilot turn
+    drawn_area = None
+    if current_step == "pilot" and user_input.startswith("{"):
+        drawn_area, geo_error = ingest_area(user_input, state, detect=True)
+        if not drawn_area:
+            return reply(f"Please provide a valid pilot or draw an area inside one of the pilot areas: {geo_error}. You can type #exit at any time if you want to change parameters or service.", action="open_map", pilot=pilot, static=False)
+        pilot = state["collected_inputs"]["area"] = drawn_area.pilot
+        current_step = state["current_step"] = "geojson"
+
+    # Several inputs in one message ("health=0.7, stress 0.2, ...") fill their slots at once;
+    # the wizard then asks only for what is still missing
+    slot_service = service or (detect_service(user_input) if current_step == "select_service" else None)
+    filled = fill_slots(slot_service, user_input, llm=extract_slots_llm) if slot_service and not drawn_area else {}
+    if filled:
+        if current_step == "select_service":
+            redis_client.delete(f"chat:{session_id}:history")
+        if filled.get("area") and collected.get("area") and filled["area"] != collected["area"]:
+            # the stored area was clipped to the previous pilot
+            collected.pop("geojson", None)
+            collected.pop("PV_area", None)
+        collected.update(filled)
+        state["prefilled"] = True
+        if slot_service == "pv_suitability" and collected.get("geojson") and collected.get("PV_area") is None:
+            collected["PV_area"] = parse_number(calculate_area_sq_meters(collected["geojson"]))
+
+        service = state["service"] = slot_service
+        step = next_missing_step(service, collected)
+        got = ", ".join(f"{k.replace('_', ' ')} = {v}" for k, v in filled.items())
+
+        if step is not None:
+            state["current_step"] = step
+            save_state(session_id, state)
+            return reply(f"Thanks! I got {got}. {STEP_PROMPTS[step]} You can type #exit at any time if you want to change parameters or service.", action=step_action(service, step), pilot=collected.get("area"), static=False)
 
+        # Everything is known: replay the final answer through its step handler, which runs the model
+        current_step = state["current_step"] = last_step(service, collected)
+        user_input = str(collected.pop(STEP_KEYS.get(current_step, current_step)))
+        pilot = collected.get("area")
 
     # Step 1: Επιλογή υπηρεσίας
     if current_step == "select_service":
-        reply = user_input.lower()
+        choice = user_input.lower()
 
-        if "#crop" in reply:
+        if "#crop" in choice:
             state["service"] = "crop_suitability"
             state["current_step"] = "crop_type"
 
             save_state(session_id, state)
             redis_client.delete(f"chat:{session_id}:history")
 
-            return {
-                "response": "Which crop would you like to evaluate?  Currently, we support the following crop types: **wheat** and **maize**. You can type #exit at any time if you want to change parameters or service.",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
-
-        elif "#pv" in reply:
+            return reply("Which crop would you like to evaluate?  Currently, we support the following crop types: **wheat** and **maize**. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
+
+        elif "#pv" in choice:
             state["service"] = "pv_suitability"
 
             if state.get("collected_inputs") is not None and state["collected_inputs"].get("area") is not None:
@@ -679,24 +508,16 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                 response = "Please enter the distance from powerlines in kilometers (e.g., 1.5):"
             else:
                 state["current_step"] = "pilot"
-                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC**. You can type #exit at any time if you want to change parameters or service."  # , **GREECE**, **CZECHIA** 
+                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC**. You can also draw your area of interest on the map below and the pilot will be detected automatically. You can type #exit at any time if you want to change parameters or service."  # , **GREECE**, **CZECHIA** 
+                action = "open_map"
 
 
             save_state(session_id, state)
             redis_client.delete(f"chat:{session_id}:history")
 
-            return {
-                "response": response,
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
-
-        elif "#abm" in reply:
+            return reply(response, action=action, pilot=pilot)
+
+        elif "#abm" in choice:
             state["service"] = "base-abm"
 
             if state.get("collected_inputs") is not None and state["collected_inputs"].get("area") is not None:
@@ -704,23 +525,15 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                 response = "Would you like validation to be performed ? Please type **yes** or **no** ."
             else:
                 state["current_step"] = "pilot"
-                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can type #exit at any time if you want to change parameters or service."  #, **GREECE**, **CZECHIA**
+                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can also draw your area of interest on the map below and the pilot will be detected automatically. You can type #exit at any time if you want to change parameters or service."  #, **GREECE**, **CZECHIA**
+                action = "open_map"
             
             save_state(session_id, state)
             redis_client.delete(f"chat:{session_id}:history")
 
-            return {
-                "response": response,
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply(response, action=action, pilot=pilot)
         
-        elif "#pecs" in reply:
+        elif "#pecs" in choice:
             state["service"] = "pecs-abm"
 
             if state.get("collected_inputs") is not None and state["collected_inputs"].get("area") is not None:
@@ -728,23 +541,15 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                 response = "Please enter a positive number between 0 and 1 for health status (e.g., 0.78):"
             else:
                 state["current_step"] = "pilot"
-                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can type #exit at any time if you want to change parameters or service."     #, **GREECE**, **CZECHIA**
+                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can also draw your area of interest on the map below and the pilot will be detected automatically. You can type #exit at any time if you want to change parameters or service."     #, **GREECE**, **CZECHIA**
+                action = "open_map"
             
             save_state(session_id, state)
             redis_client.delete(f"chat:{session_id}:history")
 
-            return {
-                "response": response,
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
-
-        elif "#full" in reply:
+            return reply(response, action=action, pilot=pilot)
+
+        elif "#full" in choice:
             state["service"] = "full-abm"
 
             if state.get("collected_inputs") is not None and state["collected_inputs"].get("area") is not None:
@@ -752,50 +557,24 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                 response = "Please enter a positive number between 0 and 1 for health status (e.g., 0.2):"
             else:
                 state["current_step"] = "pilot"
-                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can type #exit at any time if you want to change parameters or service."    #, **GREECE**, **CZECHIA**
+                response = "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can also draw your area of interest on the map below and the pilot will be detected automatically. You can type #exit at any time if you want to change parameters or service."    #, **GREECE**, **CZECHIA**
+                action = "open_map"
             
             save_state(session_id, state)
             redis_client.delete(f"chat:{session_id}:history")
 
-            return {
-                "response": response,
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply(response, action=action, pilot=pilot)
                 
         else:
             llm_response = call_llm(session_id, user_input)
-            return {
-                "response": llm_response,
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply(llm_response, pilot=pilot, static=False)
 
     # Step 2: Crop Suitability flow
     if service == "crop_suitability":
         if current_step == "crop_type":
             crop = validate_crop_type(user_input)
             if not crop:
-                return {
-                    "response": "Please enter a valid crop: 'wheat' or 'maize'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid crop: 'wheat' or 'maize'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
             state["collected_inputs"]["crop_type"] = crop
             
             if state.get("collected_inputs") is not None and state["collected_inputs"].get("area") is not None:
@@ -803,89 +582,39 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                 response = "Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?"
             else:
                 state["current_step"] = "pilot"
-                response = "Thanks! For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** ."   # , **GREECE**, **CZECHIA**
+                response = "Thanks! For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n **PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can also draw your area of interest on the map below and the pilot will be detected automatically."   # , **GREECE**, **CZECHIA**
+                action = "open_map"
 
             save_state(session_id, state)
 
-            return {
-                "response": response,
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": None
-            }
+            return reply(response, action=action)
 
         elif current_step == "pilot":
             pilot = validate_pilot(user_input)
             if not pilot:
-                return {
-                    "response": "Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.",   # , 'GREECE', 'CZECHIA'
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)  # , 'GREECE', 'CZECHIA'
             state["collected_inputs"]["area"] = pilot
             state["current_step"] = "geojson"
             save_state(session_id, state)
-            return {
-                "response": "Please define your area of interest by drawing a polygon on the map shown below. "
+            return reply(
+                "Please define your area of interest by drawing a polygon on the map shown below. "
                 "Once you complete the drawing, the GeoJSON format will be automatically generated and submitted.",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": "open_map",
-                "pilot": pilot
-            }
+                action="open_map", pilot=pilot
+            )
 
         elif current_step == "geojson":
-            geo = validate_geojson(user_input)
+            geo, geo_error = (drawn_area, None) if drawn_area else ingest_area(user_input, state)
             if not geo:
-                return {
-                    "response": "Please provide a valid area (GeoJSON format). You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
-            state["collected_inputs"]["geojson"] = geo
+                return reply(f"Please provide a valid area (GeoJSON format): {geo_error}. You can type #exit at any time if you want to change parameters or service.", pilot=pilot, static=False)
+            state["collected_inputs"]["geojson"] = geo.geojson
             state["current_step"] = "time_period"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?", pilot=pilot)
 
         elif current_step == "time_period":
             period = validate_time_period(user_input)
             if not period:
-                return {
-                    "response": "Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
 
             state["collected_inputs"]["time_period"] = period
 
@@ -893,16 +622,7 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                 state["current_step"] = "profit"
             
                 save_state(session_id, state)
-                return {
-                    "response": "Thanks! Would you like profit estimation to be also performed ? Please type **yes** or **no** ",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Thanks! Would you like profit estimation to be also performed ? Please type **yes** or **no** ", pilot=pilot)
             else:
                 save_state(session_id, state)
 
@@ -920,40 +640,22 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                 state["resuming"] = True
                 state["current_step"] = "select_service"
 
-                if "collected_inputs" in state and state["collected_inputs"]["time_period"] == "future": 
-                    del state["collected_inputs"]["show_profit"]
+                if "collected_inputs" in state and state["collected_inputs"].get("time_period") == "future": 
+                    state["collected_inputs"].pop("show_profit", None)
 
                 if "collected_inputs" in state:
-                    del state["collected_inputs"]["crop_type"]
-                    del state["collected_inputs"]["time_period"]
+                    state["collected_inputs"].pop("crop_type", None)
+                    state["collected_inputs"].pop("time_period", None)
 
                 save_state(session_id, state)
                 print(state)
 
-                return {
-                    "response": llm_result["text"],
-                    "chart_data": llm_result["chart_data"],
-                    "map_layers": llm_result["map_layers"],
-                    "profit_layers": llm_result["profit_layers"],
-                    "profit_chart_data": llm_result["profit_chart_data"],
-                    "map_explanation": llm_result["map_explanation"],
-                    "action": llm_result["action"],
-                    "pilot": llm_result["pilot"]
-                }
+                return result_reply(llm_result)
 
         elif current_step == "profit":
             profit = validate_validation(user_input)
             if not profit:
-                return {
-                    "response": "Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
 
             state["collected_inputs"]["show_profit"] = profit
             save_state(session_id, state)
@@ -971,206 +673,82 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
             state["current_step"] = "select_service"
 
             if "collected_inputs" in state:
-                del state["collected_inputs"]["crop_type"]
-                del state["collected_inputs"]["time_period"]
-                del state["collected_inputs"]["show_profit"]
+                state["collected_inputs"].pop("crop_type", None)
+                state["collected_inputs"].pop("time_period", None)
+                state["collected_inputs"].pop("show_profit", None)
 
             save_state(session_id, state)
             print(state)
 
-            return {
-                "response": llm_result["text"],
-                "chart_data": llm_result["chart_data"],
-                "map_layers": llm_result["map_layers"],
-                "profit_layers": llm_result["profit_layers"],
-                "profit_chart_data": llm_result["profit_chart_data"],
-                "map_explanation": llm_result["map_explanation"],
-                "action": llm_result["action"],
-                "pilot": llm_result["pilot"]
-            }
+            return result_reply(llm_result)
 
     elif service == "pv_suitability":
         if current_step == "pilot":
             pilot = validate_pilot(user_input)
             if not pilot:
-                return {
-                    "response": "Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.",    #  , 'GREECE', 'CZECHIA'
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)  #  , 'GREECE', 'CZECHIA'
             state["collected_inputs"]["area"] = pilot
             state["current_step"] = "geojson"
             save_state(session_id, state)
-            return {
-                "response": "Please define your area of interest by drawing a polygon on the map shown below. "
+            return reply(
+                "Please define your area of interest by drawing a polygon on the map shown below. "
                 "Once you complete the drawing, the GeoJSON format will be automatically generated and submitted.",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": "open_map",
-                "pilot": pilot
-            }
+                action="open_map", pilot=pilot
+            )
 
         elif current_step == "geojson":
-            geo = validate_geojson(user_input)
+            geo, geo_error = (drawn_area, None) if drawn_area else ingest_area(user_input, state)
             if not geo:
-                return {
-                    "response": "Please provide a valid area (GeoJSON format). You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": "open_map",
-                    "pilot": pilot
-            }
-            state["collected_inputs"]["geojson"] = geo
+                return reply(f"Please provide a valid area (GeoJSON format): {geo_error}. You can type #exit at any time if you want to change parameters or service.", action="open_map", pilot=pilot, static=False)
+            state["collected_inputs"]["geojson"] = geo.geojson
             state["current_step"] = "proximity_to_powerlines"
 
-            pv_area = calculate_area_sq_meters(geo)
-            state["collected_inputs"]["PV_area"] = parse_number(pv_area)
+            state["collected_inputs"]["PV_area"] = parse_number(geo.area_m2)
 
             save_state(session_id, state)
-            return {
-                "response": "Please enter the distance from powerlines in kilometers (e.g., 1.5):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter the distance from powerlines in kilometers (e.g., 1.5):", pilot=pilot)
 
         elif current_step == "proximity_to_powerlines":
             distance = parse_number(user_input)
             if distance is None:
-                return {
-                    "response": "Please enter a valid positive number for the distance from powerlines in km.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number for the distance from powerlines in km.", pilot=pilot)
             state["collected_inputs"]["proximity_to_powerlines"] = distance
             state["current_step"] = "road_network_accessibility"
             save_state(session_id, state)
-            return {
-                "response": "Please enter the distance from roads in kilometers (e.g., 2.0):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter the distance from roads in kilometers (e.g., 2.0):", pilot=pilot)
 
         elif current_step == "road_network_accessibility":
             road_access = parse_number(user_input)
             if road_access is None:
-                return {
-                    "response": "Please enter a valid positive number for road network accessibility in km.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number for road network accessibility in km.", pilot=pilot)
             state["collected_inputs"]["road_network_accessibility"] = road_access
             state["current_step"] = "electricity_rate"
             save_state(session_id, state)
-            return {
-                "response": "Please enter the electricity rate in $/kWh (e.g., 0.15):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter the electricity rate in $/kWh (e.g., 0.15):", pilot=pilot)
 
         elif current_step == "electricity_rate":
             rate = parse_number(user_input)
             if rate is None:
-                return {
-                    "response": "Please enter a valid positive number for electricity rate in $/kWh.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number for electricity rate in $/kWh.", pilot=pilot)
             state["collected_inputs"]["electricity_rate"] = rate
             state["current_step"] = "efficiency"
             save_state(session_id, state)
-            return {
-                "response": "Please enter the efficiency of the PV installation in % (e.g., 18.5):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter the efficiency of the PV installation in % (e.g., 18.5):", pilot=pilot)
 
         elif current_step == "efficiency":
             eff = parse_number(user_input)
             if eff is None:
-                return {
-                    "response": "Please enter a valid positive number for efficiency percentage (e.g., 18.5).",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number for efficiency percentage (e.g., 18.5).", pilot=pilot)
 
             state["collected_inputs"]["efficiency"] = eff
             state["current_step"] = "time_period"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": "show_pv_indicator",
-                "pilot": pilot
-            }
+            return reply("Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?", action="show_pv_indicator", pilot=pilot)
 
         elif current_step == "time_period":
             period = validate_time_period(user_input)
             if not period:
-                return {
-                    "response": "Please enter 'past' or 'future'.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'past' or 'future'.", pilot=pilot)
 
             state["collected_inputs"]["time_period"] = period
             save_state(session_id, state)
@@ -1190,123 +768,54 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
             state["current_step"] = "select_service"
 
             if "collected_inputs" in state:
-                del state["collected_inputs"]["PV_area"]
-                del state["collected_inputs"]["proximity_to_powerlines"]
-                del state["collected_inputs"]["road_network_accessibility"]
-                del state["collected_inputs"]["electricity_rate"]
-                del state["collected_inputs"]["efficiency"]
-                del state["collected_inputs"]["time_period"]
+                state["collected_inputs"].pop("PV_area", None)
+                state["collected_inputs"].pop("proximity_to_powerlines", None)
+                state["collected_inputs"].pop("road_network_accessibility", None)
+                state["collected_inputs"].pop("electricity_rate", None)
+                state["collected_inputs"].pop("efficiency", None)
+                state["collected_inputs"].pop("time_period", None)
 
             save_state(session_id, state)
             print(state)
 
-            return {
-                "response": llm_result["text"],
-                "chart_data": llm_result["chart_data"],
-                "map_layers": llm_result["map_layers"],
-                "profit_layers": llm_result["profit_layers"],
-                "profit_chart_data": llm_result["profit_chart_data"],
-                "map_explanation": llm_result["map_explanation"],
-                "action": llm_result["action"],
-                "pilot": llm_result["pilot"]
-            }
+            return result_reply(llm_result)
         
     elif service == "base-abm":
         if current_step == "pilot":
             pilot = validate_pilot(user_input)
             if not pilot:
-                return {
-                    "response": "Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.",   # , 'GREECE', 'CZECHIA'
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)  # , 'GREECE', 'CZECHIA'
             state["collected_inputs"]["area"] = pilot
             state["current_step"] = "geojson"
             save_state(session_id, state)
-            return {
-                "response": "Please define your area of interest by drawing a polygon on the map shown below. "
+            return reply(
+                "Please define your area of interest by drawing a polygon on the map shown below. "
                 "Once you complete the drawing, the GeoJSON format will be automatically generated and submitted.",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": "open_map",
-                "pilot": pilot
-            }
+                action="open_map", pilot=pilot
+            )
 
         elif current_step == "geojson":
-            geo = validate_geojson(user_input)
+            geo, geo_error = (drawn_area, None) if drawn_area else ingest_area(user_input, state)
             if not geo:
-                return {
-                    "response": "Please provide a valid area (GeoJSON format). You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
-            state["collected_inputs"]["geojson"] = geo
+                return reply(f"Please provide a valid area (GeoJSON format): {geo_error}. You can type #exit at any time if you want to change parameters or service.", pilot=pilot, static=False)
+            state["collected_inputs"]["geojson"] = geo.geojson
             state["current_step"] = "validation"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! Would you like validation to be performed ? Please type **yes** or **no** ",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Thanks! Would you like validation to be performed ? Please type **yes** or **no** ", pilot=pilot)
         
         elif current_step == "validation":
             validation = validate_validation(user_input)
             if not validation:
-                return {
-                    "response": "Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
             state["collected_inputs"]["validation"] = validation
             state["current_step"] = "time_period"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?", pilot=pilot)
 
         elif current_step == "time_period":
             period = validate_time_period(user_input)
             if not period:
-                return {
-                    "response": "Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
 
             state["collected_inputs"]["time_period"] = period
             save_state(session_id, state)
@@ -1332,8 +841,8 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
 
                 if "collected_inputs" in state:
                     # leave geojson/area in state if you need them later, or clean them too
-                    del state["collected_inputs"]["validation"]
-                    del state["collected_inputs"]["time_period"]
+                    state["collected_inputs"].pop("validation", None)
+                    state["collected_inputs"].pop("time_period", None)
                 save_state(session_id, state)
 
                 # Immediate response to the SPA
@@ -1344,16 +853,7 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                     f"I’ll email you at **{notify_email}** when the results are ready. "
                     f"You can also open this link later to view the session directly: {link}"
                 )
-                return {
-                    "response": immediate_msg,
-                    "chart_data": [],
-                    "map_layers": [],
-                    "profit_layers": [],
-                    "profit_chart_data": [],
-                    "map_explanation": None,
-                    "action": None,
-                    "pilot": pilot     # collected_copy.get("area", None)
-                }
+                return reply(immediate_msg, pilot=pilot, static=False)  # collected_copy.get("area", None)
 
             # ✅ Τώρα που όλα τα inputs υπάρχουν, κάνε handle
             llm_result = handle_llm_response("", session_id, service, sub)
@@ -1368,335 +868,122 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
             state["current_step"] = "select_service"
 
             if "collected_inputs" in state:
-                del state["collected_inputs"]["validation"]
-                del state["collected_inputs"]["time_period"]
+                state["collected_inputs"].pop("validation", None)
+                state["collected_inputs"].pop("time_period", None)
 
             save_state(session_id, state)
             print(state)
 
-            return {
-                "response": llm_result["text"],
-                "chart_data": llm_result["chart_data"],
-                "map_layers": llm_result["map_layers"],
-                "profit_layers": llm_result["profit_layers"],
-                "profit_chart_data": llm_result["profit_chart_data"],
-                "map_explanation": llm_result["map_explanation"],
-                "action": llm_result["action"],
-                "pilot": llm_result["pilot"]
-            }
+            return result_reply(llm_result)
 
     elif service == "pecs-abm":
         if current_step == "pilot":
             pilot = validate_pilot(user_input)
             if not pilot:
-                return {
-                    "response": "Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.",      # , 'GREECE', 'CZECHIA'
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)  # , 'GREECE', 'CZECHIA'
             state["collected_inputs"]["area"] = pilot
             state["current_step"] = "geojson"
             save_state(session_id, state)
-            return {
-                "response": "Please define your area of interest by drawing a polygon on the map shown below. "
+            return reply(
+                "Please define your area of interest by drawing a polygon on the map shown below. "
                 "Once you complete the drawing, the GeoJSON format will be automatically generated and submitted.",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": "open_map",
-                "pilot": pilot
-            }
+                action="open_map", pilot=pilot
+            )
 
         elif current_step == "geojson":
-            geo = validate_geojson(user_input)
+            geo, geo_error = (drawn_area, None) if drawn_area else ingest_area(user_input, state)
             if not geo:
-                return {
-                    "response": "Please provide a valid area (GeoJSON format). You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
-            state["collected_inputs"]["geojson"] = geo
+                return reply(f"Please provide a valid area (GeoJSON format): {geo_error}. You can type #exit at any time if you want to change parameters or service.", pilot=pilot, static=False)
+            state["collected_inputs"]["geojson"] = geo.geojson
             state["current_step"] = "health_status"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! Please enter a positive number between 0 and 1 for health status (e.g., 0.78):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Thanks! Please enter a positive number between 0 and 1 for health status (e.g., 0.78):", pilot=pilot)
         
         elif current_step == "health_status":
             health = validate_zero_one(parse_number(user_input))
             if health is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for health status.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for health status.", pilot=pilot)
             state["collected_inputs"]["health_status"] = health
             state["current_step"] = "labor_availability"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for labor availability (e.g., 0.25):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for labor availability (e.g., 0.25):", pilot=pilot)
         
         elif current_step == "labor_availability":
             labor = validate_zero_one(parse_number(user_input))
             if labor is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for labor availability.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for labor availability.", pilot=pilot)
             state["collected_inputs"]["labor_availability"] = labor
             state["current_step"] = "stress_level"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for stress level (e.g., 0.45):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for stress level (e.g., 0.45):", pilot=pilot)
 
         elif current_step == "stress_level":
             stress = validate_zero_one(parse_number(user_input))
             if stress is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for stress level.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for stress level.", pilot=pilot)
             state["collected_inputs"]["stress_level"] = stress
             state["current_step"] = "satisfaction"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for satisfaction (e.g., 0.89):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for satisfaction (e.g., 0.89):", pilot=pilot)
 
         elif current_step == "satisfaction":
             satisfaction = validate_zero_one(parse_number(user_input))
             if satisfaction is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for satisfaction.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for satisfaction.", pilot=pilot)
             state["collected_inputs"]["satisfaction"] = satisfaction
             state["current_step"] = "policy_incentives"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for policy incentives (e.g., 0.33):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for policy incentives (e.g., 0.33):", pilot=pilot)
 
         elif current_step == "policy_incentives":
             incntvs = validate_zero_one(parse_number(user_input))
             if incntvs is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for policy incentives.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for policy incentives.", pilot=pilot)
             state["collected_inputs"]["policy_incentives"] = incntvs
             state["current_step"] = "information_access"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for information access (e.g., 0.45):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for information access (e.g., 0.45):", pilot=pilot)
 
         elif current_step == "information_access":
             access = validate_zero_one(parse_number(user_input))
             if access is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for information access.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for information access.", pilot=pilot)
             state["collected_inputs"]["information_access"] = access
             state["current_step"] = "social_influence"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for social influence (e.g., 0.2):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for social influence (e.g., 0.2):", pilot=pilot)
 
         elif current_step == "social_influence":
             infl = validate_zero_one(parse_number(user_input))
             if infl is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for social influence.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for social influence.", pilot=pilot)
             state["collected_inputs"]["social_influence"] = infl
             state["current_step"] = "community_participation"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for community participation (e.g., 0.8):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for community participation (e.g., 0.8):", pilot=pilot)
 
         elif current_step == "community_participation":
             prtcptn = validate_zero_one(parse_number(user_input))
             if prtcptn is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for community participation.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for community participation.", pilot=pilot)
             state["collected_inputs"]["community_participation"] = prtcptn
             state["current_step"] = "validation"
             save_state(session_id, state)
-            return {
-                "response": "Would you like validation to be performed ? Please type **yes** or **no** ",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Would you like validation to be performed ? Please type **yes** or **no** ", pilot=pilot)
                                                         
         elif current_step == "validation":
             validation = validate_validation(user_input)
             if not validation:
-                return {
-                    "response": "Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
             state["collected_inputs"]["validation"] = validation
             state["current_step"] = "time_period"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": "show_pv_indicator",
-                "pilot": pilot
-            }
+            return reply("Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?", action="show_pv_indicator", pilot=pilot)
 
         elif current_step == "time_period":
             period = validate_time_period(user_input)
             if not period:
-                return {
-                    "response": "Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
 
             state["collected_inputs"]["time_period"] = period
             save_state(session_id, state)
@@ -1722,16 +1009,16 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
 
                 if "collected_inputs" in state:
                     # leave geojson/area in state if you need them later, or clean them too
-                    del state["collected_inputs"]["health_status"]
-                    del state["collected_inputs"]["labor_availability"]
-                    del state["collected_inputs"]["stress_level"]
-                    del state["collected_inputs"]["satisfaction"]
-                    del state["collected_inputs"]["policy_incentives"]
-                    del state["collected_inputs"]["information_access"]
-                    del state["collected_inputs"]["social_influence"]
-                    del state["collected_inputs"]["community_participation"]
-                    del state["collected_inputs"]["validation"]
-                    del state["collected_inputs"]["time_period"]
+                    state["collected_inputs"].pop("health_status", None)
+                    state["collected_inputs"].pop("labor_availability", None)
+                    state["collected_inputs"].pop("stress_level", None)
+                    state["collected_inputs"].pop("satisfaction", None)
+                    state["collected_inputs"].pop("policy_incentives", None)
+                    state["collected_inputs"].pop("information_access", None)
+                    state["collected_inputs"].pop("social_influence", None)
+                    state["collected_inputs"].pop("community_participation", None)
+                    state["collected_inputs"].pop("validation", None)
+                    state["collected_inputs"].pop("time_period", None)
 
                 save_state(session_id, state)
 
@@ -1743,16 +1030,7 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                     f"I’ll email you at **{notify_email}** when the results are ready. "
                     f"You can also open this link later to view the session directly: {link}"
                 )
-                return {
-                    "response": immediate_msg,
-                    "chart_data": [],
-                    "map_layers": [],
-                    "profit_layers": [],
-                    "profit_chart_data": [],
-                    "map_explanation": None,
-                    "action": None,
-                    "pilot": pilot     # collected_copy.get("area", None)
-                }
+                return reply(immediate_msg, pilot=pilot, static=False)  # collected_copy.get("area", None)
             
             # ✅ Normal (non-validation) ABM path – run synchronously like before
             # ✅ Τώρα που όλα τα inputs υπάρχουν, κάνε handle
@@ -1768,479 +1046,175 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
             state["current_step"] = "select_service"
 
             if "collected_inputs" in state:
-                del state["collected_inputs"]["health_status"]
-                del state["collected_inputs"]["labor_availability"]
-                del state["collected_inputs"]["stress_level"]
-                del state["collected_inputs"]["satisfaction"]
-                del state["collected_inputs"]["policy_incentives"]
-                del state["collected_inputs"]["information_access"]
-                del state["collected_inputs"]["social_influence"]
-                del state["collected_inputs"]["community_participation"]
-                del state["collected_inputs"]["validation"]
-                del state["collected_inputs"]["time_period"]
+                state["collected_inputs"].pop("health_status", None)
+                state["collected_inputs"].pop("labor_availability", None)
+                state["collected_inputs"].pop("stress_level", None)
+                state["collected_inputs"].pop("satisfaction", None)
+                state["collected_inputs"].pop("policy_incentives", None)
+                state["collected_inputs"].pop("information_access", None)
+                state["collected_inputs"].pop("social_influence", None)
+                state["collected_inputs"].pop("community_participation", None)
+                state["collected_inputs"].pop("validation", None)
+                state["collected_inputs"].pop("time_period", None)
 
             save_state(session_id, state)
             print(state)
 
-            return {
-                "response": llm_result["text"],
-                "chart_data": llm_result["chart_data"],
-                "map_layers": llm_result["map_layers"],
-                "profit_layers": llm_result["profit_layers"],
-                "profit_chart_data": llm_result["profit_chart_data"],
-                "map_explanation": llm_result["map_explanation"],
-                "action": llm_result["action"],
-                "pilot": llm_result["pilot"]
-            }
+            return result_reply(llm_result)
         
     elif service == "full-abm":
         if current_step == "pilot":
             pilot = validate_pilot(user_input)
             if not pilot:
-                return {
-                    "response": "Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.",      #, 'GREECE', 'CZECHIA'
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please provide a valid pilot: 'PILOT_THESSALONIKI', 'PILOT_PILSEN', 'PILOT_OLOMOUC'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)  #, 'GREECE', 'CZECHIA'
             state["collected_inputs"]["area"] = pilot
             state["current_step"] = "geojson"
             save_state(session_id, state)
-            return {
-                "response": "Please define your area of interest by drawing a polygon on the map shown below. "
+            return reply(
+                "Please define your area of interest by drawing a polygon on the map shown below. "
                 "Once you complete the drawing, the GeoJSON format will be automatically generated and submitted.",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": "open_map",
-                "pilot": pilot
-            }
+                action="open_map", pilot=pilot
+            )
 
         elif current_step == "geojson":
-            geo = validate_geojson(user_input)
+            geo, geo_error = (drawn_area, None) if drawn_area else ingest_area(user_input, state)
             if not geo:
-                return {
-                    "response": "Please provide a valid area (GeoJSON format). You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
-            state["collected_inputs"]["geojson"] = geo
+                return reply(f"Please provide a valid area (GeoJSON format): {geo_error}. You can type #exit at any time if you want to change parameters or service.", pilot=pilot, static=False)
+            state["collected_inputs"]["geojson"] = geo.geojson
             state["current_step"] = "health_status"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! Please enter a positive number between 0 and 1 for health status (e.g., 0.2):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Thanks! Please enter a positive number between 0 and 1 for health status (e.g., 0.2):", pilot=pilot)
         
         elif current_step == "health_status":
             health = validate_zero_one(parse_number(user_input))
             if health is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for health status.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for health status.", pilot=pilot)
             state["collected_inputs"]["health_status"] = health
             state["current_step"] = "labor_availability"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for labor availability (e.g., 0.3):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for labor availability (e.g., 0.3):", pilot=pilot)
         
         elif current_step == "labor_availability":
             labor = validate_zero_one(parse_number(user_input))
             if labor is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for labor availability.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for labor availability.", pilot=pilot)
             state["collected_inputs"]["labor_availability"] = labor
             state["current_step"] = "stress_level"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for stress level (e.g., 0.6):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for stress level (e.g., 0.6):", pilot=pilot)
 
         elif current_step == "stress_level":
             stress = validate_zero_one(parse_number(user_input))
             if stress is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for stress level.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for stress level.", pilot=pilot)
             state["collected_inputs"]["stress_level"] = stress
             state["current_step"] = "satisfaction"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for satisfaction (e.g., 0.5):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for satisfaction (e.g., 0.5):", pilot=pilot)
 
         elif current_step == "satisfaction":
             satisfaction = validate_zero_one(parse_number(user_input))
             if satisfaction is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for satisfaction.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for satisfaction.", pilot=pilot)
             state["collected_inputs"]["satisfaction"] = satisfaction
             state["current_step"] = "policy_incentives"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for policy incentives (e.g., 0.7):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for policy incentives (e.g., 0.7):", pilot=pilot)
 
         elif current_step == "policy_incentives":
             incntvs = validate_zero_one(parse_number(user_input))
             if incntvs is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for policy incentives.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for policy incentives.", pilot=pilot)
             state["collected_inputs"]["policy_incentives"] = incntvs
             state["current_step"] = "information_access"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for information access (e.g., 0.1):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for information access (e.g., 0.1):", pilot=pilot)
 
         elif current_step == "information_access":
             access = validate_zero_one(parse_number(user_input))
             if access is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for information access.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for information access.", pilot=pilot)
             state["collected_inputs"]["information_access"] = access
             state["current_step"] = "social_influence"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for social influence (e.g., 0.5):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for social influence (e.g., 0.5):", pilot=pilot)
 
         elif current_step == "social_influence":
             infl = validate_zero_one(parse_number(user_input))
             if infl is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for social influence.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for social influence.", pilot=pilot)
             state["collected_inputs"]["social_influence"] = infl
             state["current_step"] = "community_participation"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for community participation (e.g., 0.9):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for community participation (e.g., 0.9):", pilot=pilot)
 
         elif current_step == "community_participation":
             prtcptn = validate_zero_one(parse_number(user_input))
             if prtcptn is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for community participation.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for community participation.", pilot=pilot)
             state["collected_inputs"]["community_participation"] = prtcptn
             state["current_step"] = "total_budget"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number for the total budget in euros (e.g., 800000)",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number for the total budget in euros (e.g., 800000)", pilot=pilot)
 
         elif current_step == "total_budget":
             budget = parse_number(user_input)
             if budget is None:
-                return {
-                    "response": "Please enter a valid positive number for the total budget in euros (€).",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number for the total budget in euros (€).", pilot=pilot)
             state["collected_inputs"]["total_budget"] = budget
             state["current_step"] = "pv_installation_cost"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number for the photovoltaic installation cost in euros (e.g., 3000)",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number for the photovoltaic installation cost in euros (e.g., 3000)", pilot=pilot)
 
         elif current_step == "pv_installation_cost":
             cost = parse_number(user_input)
             if cost is None:
-                return {
-                    "response": "Please enter a valid positive number for the photovoltaic installation cost in euros (€).",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number for the photovoltaic installation cost in euros (€).", pilot=pilot)
             state["collected_inputs"]["pv_installation_cost"] = cost
             state["current_step"] = "adoption_weight"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for adoption weight (e.g., 0.9)",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for adoption weight (e.g., 0.9)", pilot=pilot)
 
         elif current_step == "adoption_weight":
             adpt_weight = validate_zero_one(parse_number(user_input))
             if adpt_weight is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for adoption weight.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for adoption weight.", pilot=pilot)
             state["collected_inputs"]["adoption_weight"] = adpt_weight
             state["current_step"] = "resilience_weight"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for resilience weight (e.g., 0.1):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for resilience weight (e.g., 0.1):", pilot=pilot)
 
         elif current_step == "resilience_weight":
             resil_weight = validate_zero_one(parse_number(user_input))
             if resil_weight is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for resilience weight.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for resilience weight.", pilot=pilot)
             state["collected_inputs"]["resilience_weight"] = resil_weight
             state["current_step"] = "budget_overshoot_weight"
             save_state(session_id, state)
-            return {
-                "response": "Please enter a positive number between 0 and 1 for budget overshoot weight (e.g., 0.5):",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Please enter a positive number between 0 and 1 for budget overshoot weight (e.g., 0.5):", pilot=pilot)
                                 
         elif current_step == "budget_overshoot_weight":
             budget_wght = validate_zero_one(parse_number(user_input))
             if budget_wght is None:
-                return {
-                    "response": "Please enter a valid positive number between 0 and 1 for budget overshoot weight.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter a valid positive number between 0 and 1 for budget overshoot weight.", pilot=pilot)
             state["collected_inputs"]["budget_overshoot_weight"] = budget_wght
             state["current_step"] = "validation"
             save_state(session_id, state)
-            return {
-                "response": "Would you like validation to be performed ? Please type **yes** or **no** ",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                "action": None,
-                "pilot": pilot
-            }
+            return reply("Would you like validation to be performed ? Please type **yes** or **no** ", pilot=pilot)
                                                                 
         elif current_step == "validation":
             validation = validate_validation(user_input)
             if not validation:
-                return {
-                    "response": "Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'yes' or 'no'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
             state["collected_inputs"]["validation"] = validation
             state["current_step"] = "time_period"
             save_state(session_id, state)
-            return {
-                "response": "Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?",
-                "chart_data": chart_data,
-                "map_layers": map_layers,
-                "profit_layers": profit_layers,
-                "profit_chart_data": profit_chart_data,
-                "map_explanation": map_explanation,
-                # "action": None,
-                "action": "show_pv_indicator",
-                "pilot": pilot
-            }
+            return reply("Thanks! For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n **Future** — using climate projections under RCP scenarios?", action="show_pv_indicator", pilot=pilot)
 
         elif current_step == "time_period":
             period = validate_time_period(user_input)
             if not period:
-                return {
-                    "response": "Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.",
-                    "chart_data": chart_data,
-                    "map_layers": map_layers,
-                    "profit_layers": profit_layers,
-                    "profit_chart_data": profit_chart_data,
-                    "map_explanation": map_explanation,
-                    "action": None,
-                    "pilot": pilot
-                }
+                return reply("Please enter 'past' or 'future'. You can type #exit at any time if you want to change parameters or service.", pilot=pilot)
 
             state["collected_inputs"]["time_period"] = period
             save_state(session_id, state)
@@ -2266,21 +1240,21 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
 
                 if "collected_inputs" in state:
                     # leave geojson/area in state if you need them later, or clean them too
-                    del state["collected_inputs"]["health_status"]
-                    del state["collected_inputs"]["labor_availability"]
-                    del state["collected_inputs"]["stress_level"]
-                    del state["collected_inputs"]["satisfaction"]
-                    del state["collected_inputs"]["policy_incentives"]
-                    del state["collected_inputs"]["information_access"]
-                    del state["collected_inputs"]["social_influence"]
-                    del state["collected_inputs"]["community_participation"]
-                    del state["collected_inputs"]["total_budget"]
-                    del state["collected_inputs"]["pv_installation_cost"]
-                    del state["collected_inputs"]["adoption_weight"]
-                    del state["collected_inputs"]["resilience_weight"]
-                    del state["collected_inputs"]["budget_overshoot_weight"]
-                    del state["collected_inputs"]["validation"]
-                    del state["collected_inputs"]["time_period"]
+                    state["collected_inputs"].pop("health_status", None)
+                    state["collected_inputs"].pop("labor_availability", None)
+                    state["collected_inputs"].pop("stress_level", None)
+                    state["collected_inputs"].pop("satisfaction", None)
+                    state["collected_inputs"].pop("policy_incentives", None)
+                    state["collected_inputs"].pop("information_access", None)
+                    state["collected_inputs"].pop("social_influence", None)
+                    state["collected_inputs"].pop("community_participation", None)
+                    state["collected_inputs"].pop("total_budget", None)
+                    state["collected_inputs"].pop("pv_installation_cost", None)
+                    state["collected_inputs"].pop("adoption_weight", None)
+                    state["collected_inputs"].pop("resilience_weight", None)
+                    state["collected_inputs"].pop("budget_overshoot_weight", None)
+                    state["collected_inputs"].pop("validation", None)
+                    state["collected_inputs"].pop("time_period", None)
 
                 save_state(session_id, state)
 
@@ -2292,16 +1266,7 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
                     f"I’ll email you at **{notify_email}** when the results are ready. "
                     f"You can also open this link later to view the session directly: {link}"
                 )
-                return {
-                    "response": immediate_msg,
-                    "chart_data": [],
-                    "map_layers": [],
-                    "profit_layers": [],
-                    "profit_chart_data": [],
-                    "map_explanation": None,
-                    "action": None,
-                    "pilot": pilot     # collected_copy.get("area", None)
-                }
+                return reply(immediate_msg, pilot=pilot, static=False)  # collected_copy.get("area", None)
             
             # ✅ Normal (non-validation) ABM path – run synchronously like before
             # ✅ Τώρα που όλα τα inputs υπάρχουν, κάνε handle
@@ -2317,54 +1282,37 @@ def chat_with_mistral(request: ChatRequest, bg: BackgroundTasks, http_req: Reque
             state["current_step"] = "select_service"
 
             if "collected_inputs" in state:
-                del state["collected_inputs"]["health_status"]
-                del state["collected_inputs"]["labor_availability"]
-                del state["collected_inputs"]["stress_level"]
-                del state["collected_inputs"]["satisfaction"]
-                del state["collected_inputs"]["policy_incentives"]
-                del state["collected_inputs"]["information_access"]
-                del state["collected_inputs"]["social_influence"]
-                del state["collected_inputs"]["community_participation"]
-                del state["collected_inputs"]["total_budget"]
-                del state["collected_inputs"]["pv_installation_cost"]
-                del state["collected_inputs"]["adoption_weight"]
-                del state["collected_inputs"]["resilience_weight"]
-                del state["collected_inputs"]["budget_overshoot_weight"]
-                del state["collected_inputs"]["validation"]
-                del state["collected_inputs"]["time_period"]
+                state["collected_inputs"].pop("health_status", None)
+                state["collected_inputs"].pop("labor_availability", None)
+                state["collected_inputs"].pop("stress_level", None)
+                state["collected_inputs"].pop("satisfaction", None)
+                state["collected_inputs"].pop("policy_incentives", None)
+                state["collected_inputs"].pop("information_access", None)
+                state["collected_inputs"].pop("social_influence", None)
+                state["collected_inputs"].pop("community_participation", None)
+                state["collected_inputs"].pop("total_budget", None)
+                state["collected_inputs"].pop("pv_installation_cost", None)
+                state["collected_inputs"].pop("adoption_weight", None)
+                state["collected_inputs"].pop("resilience_weight", None)
+                state["collected_inputs"].pop("budget_overshoot_weight", None)
+                state["collected_inputs"].pop("validation", None)
+                state["collected_inputs"].pop("time_period", None)
 
             save_state(session_id, state)
             print(state)
 
-            return {
-                "response": llm_result["text"],
-                "chart_data": llm_result["chart_data"],
-                "map_layers": llm_result["map_layers"],
-                "profit_layers": llm_result["profit_layers"],
-                "profit_chart_data": llm_result["profit_chart_data"],
-                "map_explanation": llm_result["map_explanation"],
-                "action": llm_result["action"],
-                "pilot": llm_result["pilot"]
-            }
+            return result_reply(llm_result)
 
     # Αν για κάποιο λόγο δεν ταιριάζει τίποτα
-    return {
-        "response": "Something went wrong. Let's start over. Please choose a service: 'Crop Suitability', 'PV Suitability', 'Basic Agent-Based Modelling', 'Enhanced Agent-Based Modelling' or 'Full Agent-Based Modelling'.",
-        "chart_data": chart_data,
-        "map_layers": map_layers,
-        "profit_layers": profit_layers,
-        "profit_chart_data": profit_chart_data,
-        "map_explanation": map_explanation,
-        "action": None,
-        "pilot": None
-    }
+    return reply("Something went wrong. Let's start over. Please choose a service: 'Crop Suitability', 'PV Suitability', 'Basic Agent-Based Modelling', 'Enhanced Agent-Based Modelling' or 'Full Agent-Based Modelling'.")
 
 
 @app.post("/api/clear-session")
 def clear_session(request: SessionResetRequest):
     session_id = request.session_id
 
-    # 🚫 First: Delete everything from Redis
+    # 🚫 First: Delete everything from Redis (and keep a running turn from writing it back)
+    invalidate_turns(session_id)
     redis_client.delete(f"chat:{session_id}")
     redis_client.delete(f"chat:{session_id}:history")
     redis_client.delete(f"state:{session_id}")    
@@ -0,0 +1,193 @@
+# session_export.py
+"""
+Streaming export of a user's chat sessions and their results.
+
+GET /api/sessions/export writes all of the caller's sessions (or the ``ids``
+given) as one download, without building it in memory:
+
+- ``format=ndjson``: one session document per line, payloads resolved;
+- ``format=zip``: per session, ``session.json`` plus the drawn areas as
+  ``.geojson`` files and the chart data as ``.csv`` files.
+
+Sessions are read in batches of EXPORT_BATCH: the user's session index is
+walked with ZSCAN, docs come in one MGET per batch and their blobs in one more
+(archived sessions are read from the archive, not restored). Each session is
+encoded and yielded before the next batch is read, so memory stays bounded by
+a batch whatever the size of the history. NDJSON is gzip-encoded on the fly
+when the client accepts it; zip entries are deflated, and the response
+compression middleware skips this path.
+
+Config (env):
+    EXPORT_BATCH   sessions read per round trip (default: 20)
+"""
+import io
+import os
+import re
+import csv
+import zlib
+import hashlib
+import logging
+import zipfile
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+import codec
+import blobs
+from authz_keycloak import require_user
+from redis_conn import redis_client, redis_bin
+from sessions import _b2s, _k_idx, _load_owned_batch, _read_archive
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "20"))
+
+EXPORT_FORMATS = ("ndjson", "zip")
+
+
+# ---------- Reading ----------
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _resolve(docs: List[dict]) -> List[dict]:
+    """Archived stubs -> archived docs; then all blob refs of the batch in one MGET."""
+    out = []
+    for doc in docs:
+        if doc.get("archived"):
+            row = _read_archive(doc.get("id"))
+            if row is None:
+                logger.warning("Archived session missing from the archive | sess=%s", doc.get("id"))
+                continue
+            doc = row[1]
+        out.append(doc)
+    blobs.hydrate_messages([m for d in out for m in d.get("messages", [])])
+    return out
+
+def _indexed_docs(sub: str) -> Iterator[dict]:
+    """All sessions in the user's index (ZSCAN order), a batch at a time."""
+    members = (_b2s(k) for k, _ in redis_client.zscan_iter(_k_idx(sub), count=EXPORT_BATCH))
+    for keys in _batches(members, EXPORT_BATCH):
+        docs = [codec.loads(raw) for raw in redis_bin.mget(keys) if raw]
+        yield from _resolve(docs)
+
+def _selected_docs(sub: str, ids: List[str]) -> Iterator[dict]:
+    """The given sessions the caller owns, in request order."""
+    for sids in _batches(list(dict.fromkeys(ids)), EXPORT_BATCH):
+        found = _load_owned_batch(sub, sids)
+        yield from _resolve([found[s][1] for s in sids if found[s]])
+
+
+# ---------- NDJSON ----------
+def _ndjson(docs: Iterator[dict], gzip: bool) -> Iterator[bytes]:
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    for doc in docs:
+        line = codec.json_dumps(doc) + b"\n"
+        chunk = gz.compress(line) if gz else line
+        if chunk:
+            yield chunk
+    if gz:
+        yield gz.flush()
+
+
+# ---------- Zip ----------
+class _Sink(io.RawIOBase):
+    """Unseekable file zipfile writes into; the generator drains it after every entry."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        return out
+
+def _safe(name) -> str:
+    return re.sub(r"[^\w.-]", "_", str(name or "untitled"))[:100]
+
+def _chart_csv(entry: dict) -> Optional[str]:
+    """feature,index,value rows of one chart entry ({"data": [{"feature", "values"}] or [numbers]})."""
+    data = entry.get("data") if isinstance(entry, dict) else None
+    if not isinstance(data, list) or not data:
+        return None
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["feature", "index", "value"])
+    for i, f in enumerate(data):
+        if isinstance(f, dict):
+            values = f.get("values")
+            for j, v in enumerate(values if isinstance(values, list) else [values]):
+                writer.writerow([f.get("feature"), j, v])
+        else:
+            writer.writerow(["", i, f])
+    return buf.getvalue()
+
+def _session_files(doc: dict) -> Iterator[tuple]:
+    """(name, bytes) entries of one session."""
+    folder = f"sessions/{_safe(doc.get('id'))}"
+    yield f"{folder}/session.json", codec.json_dumps(doc)
+
+    seen = set()   # the drawn area is carried forward from message to message
+    for n, m in enumerate(doc.get("messages", []), start=1):
+        if not isinstance(m, dict):
+            continue
+        for part in ("mapData", "profitMapData"):
+            geojson = (m.get(part) or {}).get("geoJsonData") if isinstance(m.get(part), dict) else None
+            if not geojson:
+                continue
+            body = codec.json_dumps(geojson)
+            digest = hashlib.sha256(body).hexdigest()
+            if digest not in seen:
+                seen.add(digest)
+                yield f"{folder}/{n:03d}-{'profit-' if part == 'profitMapData' else ''}area.geojson", body
+        for k, entry in enumerate(m.get("barChartData") or [], start=1):
+            text = _chart_csv(entry)
+            if text:
+                scenario = entry.get("scenario") if isinstance(entry, dict) else None
+                yield f"{folder}/{n:03d}-chart{k}{'-' + _safe(scenario) if scenario else ''}.csv", text.encode("utf-8")
+
+def _zip(docs: Iterator[dict]) -> Iterator[bytes]:
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for doc in docs:
+            for name, body in _session_files(doc):
+                zf.writestr(name, body)
+                yield sink.drain()
+    yield sink.drain()   # central directory
+
+
+# ---------- Routes ----------
+@router.get("/sessions/export")
+def export_sessions(request: Request, format: str = "ndjson", ids: Optional[List[str]] = Query(None),
+                    user=Depends(require_user)):
+    """Download all sessions, or the given ids, as NDJSON or a zip."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="unsupported_format")
+    sub = user.get("sub")
+    docs = _selected_docs(sub, ids) if ids else _indexed_docs(sub)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    headers = {"Content-Disposition": f'attachment; filename="sessions-{stamp}.{format}"',
+               "Cache-Control": "no-store", "Vary": "Accept-Encoding"}
+
+    if format == "zip":
+        return StreamingResponse(_zip(docs), media_type="application/zip", headers=headers)
+    gzip = "gzip" in request.headers.get("accept-encoding", "")
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_ndjson(docs, gzip), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,312 @@
+# session_index.py
+"""
+Per-user search index over chat sessions (GET /api/sessions/search).
+
+Maintained incrementally whenever sessions.py saves or deletes a doc, so a
+search never loads documents. Per user (sub):
+
+- sessix:{sub}:term:{term}   SET of session ids per term: title word prefixes
+                             ("w:thess"), pilot areas ("p:PILOT_PILSEN") and
+                             services ("s:crop")
+- sessix:{sub}:terms:{sid}   SET of the terms a session is indexed under, so
+                             an update removes exactly the terms it no longer has
+- sessix:{sub}:updated       ZSET sid -> updated_at
+- sessix:{sub}:created       ZSET sid -> created_at (epoch)
+- sessix:{sub}:meta          HASH sid -> summary returned by searches
+
+Updates are one Lua script queued on the caller's pipeline; a search is one
+script that intersects the term sets, filters by date, sorts newest-first and
+returns the page with its summaries. Sessions whose doc expired are dropped
+from the index when a search meets them, and by the compaction pass
+(``prune``) once their doc is older than the session TTL. Users whose
+sessions predate the index get it built from their docs on their first search.
+
+Index keys carry the session TTL. Indexing a session renews the user's keys
+and the term sets it is in; refreshing a session's TTL (``touch_session``)
+does the same, so the index of a user who stops using the app expires with
+their sessions, and is rebuilt from the docs if they come back.
+
+Config (env):
+    SEARCH_MIN_PREFIX   shortest title word prefix that matches (default: 2)
+    SEARCH_MAX_PREFIX   longest indexed prefix; longer query words are cut to it (default: 20)
+"""
+import os
+import re
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import codec
+from redis_conn import redis_bin
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MIN_PREFIX = int(os.getenv("SEARCH_MIN_PREFIX", "2"))
+SEARCH_MAX_PREFIX = int(os.getenv("SEARCH_MAX_PREFIX", "20"))
+
+INDEX_TTL_SEC = 14 * 24 * 60 * 60  # same as SESSION_TTL_SEC
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# score bounds for "no date filter" (Lua's tonumber has no portable inf)
+TS_MIN = 0.0
+TS_MAX = 1e15
+
+
+# ---------- Key helpers ----------
+def _prefix(sub: str) -> str:
+    return f"sessix:{sub}:"
+
+def _k_term(sub: str, term: str) -> str:
+    return f"sessix:{sub}:term:{term}"
+
+def _k_terms(sub: str, sid: str) -> str:
+    return f"sessix:{sub}:terms:{sid}"
+
+def _k_updated(sub: str) -> str:
+    return f"sessix:{sub}:updated"
+
+def _k_created(sub: str) -> str:
+    return f"sessix:{sub}:created"
+
+def _k_meta(sub: str) -> str:
+    return f"sessix:{sub}:meta"
+
+def _k_built(sub: str) -> str:
+    return f"sessix:{sub}:built"
+
+
+# ---------- Terms ----------
+def _title_terms(title: str) -> set:
+    out = set()
+    for word in _WORD.findall((title or "").lower()):
+        for n in range(SEARCH_MIN_PREFIX, min(len(word), SEARCH_MAX_PREFIX) + 1):
+            out.add("w:" + word[:n])
+    return out
+
+def pilot_term(pilot: str) -> str:
+    return "p:" + pilot.strip().upper()
+
+def service_term(service: str) -> str:
+    return "s:" + service.strip().lower()
+
+def query_terms(q: Optional[str], pilot: Optional[str] = None, service: Optional[str] = None) -> List[str]:
+    """Terms a search must match: every query word (as a title prefix), the pilot and the service."""
+    terms = {"w:" + w[:SEARCH_MAX_PREFIX] for w in _WORD.findall((q or "").lower()) if len(w) >= SEARCH_MIN_PREFIX}
+    if pilot:
+        terms.add(pilot_term(pilot))
+    if service:
+        terms.add(service_term(service))
+    return sorted(terms)
+
+def _facets(messages: Iterable[dict]) -> Tuple[List[str], List[str]]:
+    """Pilot areas and services a session's messages mention."""
+    pilots, services = set(), set()
+    for m in messages:
+        if not isinstance(m, dict):
+            continue
+        md = m.get("mapData")
+        pilot = md.get("pilotArea") if isinstance(md, dict) else None
+        if isinstance(pilot, str) and pilot.strip():
+            pilots.add(pilot.strip().upper())
+        service = m.get("serviceCalled")
+        if isinstance(service, str) and service.strip():
+            services.add(service.strip().lower())
+    return sorted(pilots), sorted(services)
+
+def _epoch(ts: Any) -> Optional[float]:
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, str):
+        try:
+            return datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+# ---------- Scripts ----------
+# KEYS: terms:{sid}, updated, created, meta, built
+# ARGV: sid, updated_at, created_at, meta, term key prefix, ttl, terms...
+_INDEX_LUA = """
+local sid = ARGV[1]
+local new = {}
+for i = 7, #ARGV do new[ARGV[i]] = true end
+for _, t in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if not new[t] then redis.call('SREM', ARGV[5] .. t, sid) end
+end
+redis.call('DEL', KEYS[1])
+for i = 7, #ARGV do
+    redis.call('SADD', ARGV[5] .. ARGV[i], sid)
+    redis.call('EXPIRE', ARGV[5] .. ARGV[i], ARGV[6])
+    redis.call('SADD', KEYS[1], ARGV[i])
+end
+redis.call('ZADD', KEYS[2], ARGV[2], sid)
+redis.call('ZADD', KEYS[3], ARGV[3], sid)
+redis.call('HSET', KEYS[4], sid, ARGV[4])
+for i = 1, #KEYS do redis.call('EXPIRE', KEYS[i], ARGV[6]) end
+return 1
+"""
+_index_script = redis_bin.register_script(_INDEX_LUA)
+
+# drops one session from the index; shared by unindex and by searches meeting expired docs
+_DROP_LUA = """
+local function drop(sid)
+    local terms_key = ARGV[2] .. 'terms:' .. sid
+    for _, t in ipairs(redis.call('SMEMBERS', terms_key)) do
+        redis.call('SREM', ARGV[2] .. 'term:' .. t, sid)
+    end
+    redis.call('DEL', terms_key)
+    redis.call('ZREM', KEYS[1], sid)
+    redis.call('ZREM', KEYS[2], sid)
+    redis.call('HDEL', KEYS[3], sid)
+end
+"""
+
+# KEYS: updated, created, meta   ARGV: sid, index key prefix
+_UNINDEX_LUA = _DROP_LUA + """
+drop(ARGV[1])
+return 1
+"""
+_unindex_script = redis_bin.register_script(_UNINDEX_LUA)
+
+# renews the user's index keys and the term sets of one session; the owner is looked up when not given
+# ARGV: sid, sub or '', ttl
+_TOUCH_LUA = """
+local sid, sub = ARGV[1], ARGV[2]
+if sub == '' then sub = redis.call('GET', 'session:' .. sid .. ':owner') end
+if not sub then return 0 end
+local prefix = 'sessix:' .. sub .. ':'
+for _, t in ipairs(redis.call('SMEMBERS', prefix .. 'terms:' .. sid)) do
+    redis.call('EXPIRE', prefix .. 'term:' .. t, ARGV[3])
+end
+for _, k in ipairs({'terms:' .. sid, 'updated', 'created', 'meta', 'built'}) do
+    redis.call('EXPIRE', prefix .. k, ARGV[3])
+end
+return 1
+"""
+_touch_script = redis_bin.register_script(_TOUCH_LUA)
+
+# KEYS: updated, created, meta   ARGV: doc key prefix, index key prefix, updated_at bound, limit
+# drops sessions updated before the bound whose doc is gone; returns how many
+_PRUNE_LUA = _DROP_LUA + """
+local dropped = 0
+for _, sid in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[3], 'LIMIT', 0, tonumber(ARGV[4]))) do
+    if redis.call('EXISTS', ARGV[1] .. sid) == 0 then
+        drop(sid)
+        dropped = dropped + 1
+    end
+end
+return dropped
+"""
+_prune_script = redis_bin.register_script(_PRUNE_LUA)
+
+# KEYS: updated, created, meta, term sets...
+# ARGV: doc key prefix, index key prefix, updated min/max, created min/max, offset, limit
+# returns {total, sid, meta, sid, meta, ...}
+_SEARCH_LUA = _DROP_LUA + """
+local umin, umax = tonumber(ARGV[3]), tonumber(ARGV[4])
+local cmin, cmax = tonumber(ARGV[5]), tonumber(ARGV[6])
+local offset, limit = tonumber(ARGV[7]), tonumber(ARGV[8])
+
+local sids
+if #KEYS > 3 then
+    sids = redis.call('SINTER', unpack(KEYS, 4))
+else
+    sids = redis.call('ZRANGEBYSCORE', KEYS[1], umin, umax)
+end
+
+local hits = {}
+for _, sid in ipairs(sids) do
+    local u = tonumber(redis.call('ZSCORE', KEYS[1], sid)) or 0
+    local c = tonumber(redis.call('ZSCORE', KEYS[2], sid)) or u
+    if u >= umin and u <= umax and c >= cmin and c <= cmax then
+        hits[#hits + 1] = {sid, u}
+    end
+end
+table.sort(hits, function(a, b) return a[2] > b[2] end)
+
+local out = {0}
+local total = #hits
+local i = offset + 1
+while i <= #hits and #out < 1 + 2 * limit do
+    local sid = hits[i][1]
+    if redis.call('EXISTS', ARGV[1] .. sid) == 1 then
+        out[#out + 1] = sid
+        out[#out + 1] = redis.call('HGET', KEYS[3], sid) or ''
+    else
+        drop(sid)
+        total = total - 1
+    end
+    i = i + 1
+end
+out[1] = total
+return out
+"""
+_search_script = redis_bin.register_script(_SEARCH_LUA)
+
+
+# ---------- Index maintenance ----------
+def index_session(sub: str, sid: str, doc: dict, pipe=None, message_count: Optional[int] = None) -> None:
+    """
+    (Re)index a session doc; queued on `pipe` when given, so it rides the
+    caller's save round trip. message_count overrides len(messages) (stubs).
+    """
+    messages = doc.get("messages", [])
+    pilots, services = _facets(messages)
+    updated_at = float(doc.get("updated_at") or 0)
+    created_at = _epoch(doc.get("created_at")) or updated_at
+    meta = {
+        "id": sid,
+        "title": doc.get("title") or "Untitled Chat",
+        "created_at": doc.get("created_at"),
+        "updated_at": updated_at,
+        "message_count": len(messages) if message_count is None else message_count,
+        "pilots": pilots,
+        "services": services,
+    }
+    terms = _title_terms(meta["title"]) | {pilot_term(p) for p in pilots} | {service_term(s) for s in services}
+    _index_script(
+        keys=[_k_terms(sub, sid), _k_updated(sub), _k_created(sub), _k_meta(sub), _k_built(sub)],
+        args=[sid, updated_at, created_at, codec.dumps(meta), _prefix(sub) + "term:", INDEX_TTL_SEC, *sorted(terms)],
+        client=pipe,
+    )
+
+def unindex_session(sub: str, sid: str, pipe=None) -> None:
+    _unindex_script(keys=[_k_updated(sub), _k_created(sub), _k_meta(sub)], args=[sid, _prefix(sub)], client=pipe)
+
+def touch_session(sid: str, sub: Optional[str] = None, pipe=None) -> None:
+    """Renew the TTL of the index keys a session lives in (queued on `pipe` when given)."""
+    _touch_script(args=[sid, sub or "", INDEX_TTL_SEC], client=pipe)
+
+def prune(sub: str, doc_prefix: str, before: float, limit: int = 1000) -> int:
+    """Drop up to `limit` sessions updated before `before` whose doc (doc_prefix + sid) is gone."""
+    return int(_prune_script(keys=[_k_updated(sub), _k_created(sub), _k_meta(sub)],
+                             args=[doc_prefix, _prefix(sub), before, limit]))
+
+def is_built(sub: str) -> bool:
+    return bool(redis_bin.exists(_k_built(sub)))
+
+def mark_built(sub: str) -> None:
+    redis_bin.set(_k_built(sub), 1, ex=INDEX_TTL_SEC)
+
+
+# ---------- Search ----------
+def search(sub: str, doc_prefix: str, terms: List[str],
+           updated: Tuple[float, float] = (TS_MIN, TS_MAX), created: Tuple[float, float] = (TS_MIN, TS_MAX),
+           offset: int = 0, limit: int = 50) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    (total matches, one page of summaries newest-first) for sessions matching
+    all terms within the updated/created ranges (epoch seconds, inclusive).
+    doc_prefix + sid is the doc key whose existence keeps a session listed.
+    """
+    reply = _search_script(
+        keys=[_k_updated(sub), _k_created(sub), _k_meta(sub)] + [_k_term(sub, t) for t in terms],
+        args=[doc_prefix, _prefix(sub), updated[0], updated[1], created[0], created[1], offset, limit],
+    )
+    total, rest = int(reply[0]), reply[1:]
+    hits = []
+    for sid, raw in zip(rest[::2], rest[1::2]):
+        meta = codec.loads(raw) if raw else None
+        hits.append(meta or {"id": sid.decode("utf-8"), "title": "Untitled Chat", "updated_at": 0, "message_count": 0})
+    return total, hits
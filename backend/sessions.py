@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional, Any, Dict
 from datetime import datetime, timezone
 import logging
-import json
+import copy
+import hashlib
 
+from redis.exceptions import WatchError
+
+import codec
+import blobs
+import archive
+import session_index
 from authz_keycloak import require_user
-from redis_conn import redis_client
+from redis_conn import redis_client, redis_bin
+from notifications import publish_event
+from state_manager import SESSION_TTL_SEC, touch_session_ttl, session_keys
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -24,10 +33,68 @@ class SessionSummary(BaseModel):
     updated_at: float
     message_count: int
 
+class SessionHeader(BaseModel):
+    id: str
+    title: str
+    created_at: Optional[str] = None
+    updated_at: Optional[float] = None
+    message_count: int
+
+class MessagePage(BaseModel):
+    messages: List[Dict[str, Any]]   # newest-first
+    next_cursor: Optional[int] = None  # pass as ?cursor= for older messages; None on the last page
+    total: int
+
+class SessionHit(SessionSummary):
+    created_at: Optional[str] = None
+    pilots: List[str] = []
+    services: List[str] = []
+
+class SessionSearchResult(BaseModel):
+    sessions: List[SessionHit]   # newest-first
+    total: int
+
 class SessionTitleUpdate(BaseModel):
     title: str
     touch: bool = False  # if True, bump updated_at and ordering; default False
 
+class BulkSessionIds(BaseModel):
+    session_ids: List[str]
+
+class BulkRenameItem(BaseModel):
+    session_id: str
+    title: str
+
+class BulkRename(BaseModel):
+    items: List[BulkRenameItem]
+    touch: bool = False
+
+class BulkItemResult(BaseModel):
+    session_id: str
+    ok: bool
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]   # one per requested id, in request order
+
+class BulkExport(BulkResult):
+    sessions: List[Dict[str, Any]]
+
+
+# private data: browsers may keep it but must revalidate (If-None-Match -> 304)
+SESSION_CACHE_CONTROL = "private, no-cache"
+
+MESSAGE_PAGE_DEFAULT = 20
+MESSAGE_PAGE_MAX = 100
+
+SEARCH_PAGE_DEFAULT = 50
+SEARCH_PAGE_MAX = 200
+
+BULK_MAX_IDS = 100
+
+# archive rows keep the session's full-data blobs under this key of the doc
+ARCHIVE_BLOBS_KEY = "$blobs"
+
 
 # ---------- Time & bytes helpers ----------
 def _now_ts() -> float:
@@ -58,27 +125,9 @@ def _owner_key(sid: str) -> str:
 
 
 # ---------- Expiry (TTL) ----------
-SESSION_TTL_SEC = 14 * 24 * 60 * 60  # 14 days
-
 def _touch_session_ttl(sid: str, sub: Optional[str] = None) -> None:
-    """
-    Refresh TTL for all keys related to this session.
-    Safe to call even if some keys don't exist.
-    """
-    keys = [
-        f"chat:{sid}",
-        f"chat:{sid}:history",
-        f"state:{sid}",
-        _k_doc_global(sid),
-        _owner_key(sid),
-    ]
-    if sub:
-        keys.append(_k_doc(sub, sid))
-
-    pipe = redis_client.pipeline()
-    for k in keys:
-        pipe.expire(k, SESSION_TTL_SEC)
-    pipe.execute()
+    """Refresh TTL for all keys related to this session (lazily; see state_manager)."""
+    touch_session_ttl(sid, sub=sub)
 
 
 # ---------- Owner helpers ----------
@@ -87,11 +136,8 @@ def _set_session_owner(session_id: str, sub: str):
     if not sub:
         return
     try:
-        if redis_client.setnx(_owner_key(session_id), sub):
-            redis_client.expire(_owner_key(session_id), SESSION_TTL_SEC)
-        else:
-            # refresh on any write path
-            redis_client.expire(_owner_key(session_id), SESSION_TTL_SEC)
+        # created with its TTL; refreshed with the other session keys by _touch_session_ttl
+        redis_client.set(_owner_key(session_id), sub, nx=True, ex=SESSION_TTL_SEC)
     except Exception as e:
         logger.exception("set_session_owner failed for %s: %s", session_id, e)
         # print("set_session_owner failed for %s: %s", session_id, e)
@@ -106,19 +152,40 @@ def _get_session_owner(session_id: str) -> Optional[str]:
     
 
 # ---------- Core doc helpers ----------
-def _get_doc_for_user_or_global(sub: str, sid: str) -> Optional[dict]:
-    """Prefer per-user doc; fall back to global (caller must enforce ownership)."""
-    raw = redis_client.get(_k_doc(sub, sid))
-    if raw:
-        return json.loads(_b2s(raw))
-    raw = redis_client.get(_k_doc_global(sid))
-    return json.loads(_b2s(raw)) if raw else None
+def _load_doc(sub: str, sid: str) -> Optional[dict]:
+    raw = redis_bin.get(_k_doc(sub, sid)) or redis_bin.get(_k_doc_global(sid))
+    return codec.loads(raw) if raw else None
+
+def _get_doc_for_user_or_global(sub: str, sid: str, hydrate: bool = True, restore: bool = True) -> Optional[dict]:
+    """
+    Prefer per-user doc; fall back to global (caller must enforce ownership).
+    With hydrate=False, blob refs are left in place (cheaper for read-modify-write paths).
+    An archived session is restored from the archive first, unless restore=False
+    (then its stub is returned: no messages, but a message_count).
+    """
+    doc = _load_doc(sub, sid)
+    if doc and doc.get("archived") and restore:
+        doc = _restore_archived(sub, sid)
+    if not doc:
+        return None
+    if hydrate:
+        blobs.hydrate_messages(doc.get("messages", []))
+    return doc
 
 def _save_doc_both(sub: str, sid: str, doc: dict, touch_index: bool = True) -> None:
     """
     Save the doc to both per-user and global keys.
     Update the user's ZSET index with numeric score for newest-first.
     """
+    pipe = redis_bin.pipeline()
+    _queue_save(pipe, sub, sid, doc, touch_index=touch_index)
+    pipe.execute()
+
+    # make sure owner + other session keys are kept alive
+    _touch_session_ttl(sid, sub=sub)
+
+def _queue_save(pipe, sub: str, sid: str, doc: dict, touch_index: bool = True) -> None:
+    """The writes of _save_doc_both, queued on pipe (caller executes and touches the TTL)."""
     doc.setdefault("id", sid)
     doc.setdefault("title", "Untitled Chat")
     doc.setdefault("messages", [])
@@ -129,19 +196,126 @@ def _save_doc_both(sub: str, sid: str, doc: dict, touch_index: bool = True) -> N
     k_user = _k_doc(sub, sid)
     k_glob = _k_doc_global(sid)
 
-    pipe = redis_client.pipeline()
-    pipe.set(k_user, json.dumps(doc))
-    pipe.set(k_glob, json.dumps(doc))
-    pipe.expire(k_user, SESSION_TTL_SEC)
-    pipe.expire(k_glob, SESSION_TTL_SEC) 
+    # large payloads are stored once under blob:{sha256}; both docs keep refs
+    stored = dict(doc, messages=blobs.dehydrate_messages(doc["messages"], sid, pipe))
+    encoded = codec.dumps(stored)
+    pipe.set(k_user, encoded, ex=SESSION_TTL_SEC)
+    pipe.set(k_glob, encoded, ex=SESSION_TTL_SEC)
     if touch_index:
         pipe.zadd(_k_idx(sub), {k_user: float(doc["updated_at"])})
+    session_index.index_session(sub, sid, doc, pipe=pipe)
+    # ensure owner recorded (same round trip; no-op if it exists)
+    pipe.set(_owner_key(sid), sub, nx=True, ex=SESSION_TTL_SEC)
+
+
+# ---------- Archive (see compaction.py) ----------
+def _stub(doc: dict) -> dict:
+    """What stays in Redis of an archived session: enough for the list and the header."""
+    return {
+        "id": doc.get("id"),
+        "title": doc.get("title") or "Untitled Chat",
+        "created_at": doc.get("created_at"),
+        "updated_at": doc.get("updated_at"),
+        "message_count": len(doc.get("messages", [])),
+        "archived": True,
+    }
+
+def archive_session(sub: str, sid: str, idle_sec: int) -> Optional[int]:
+    """
+    Move a session doc into the archive and leave a stub under both keys, with
+    the TTL the doc had. Skipped (None) if the doc was written or its TTL
+    refreshed within idle_sec, if it is already archived, or if it changes
+    while being archived. Returns the archived size in bytes.
+    """
+    k_user, k_glob = _k_doc(sub, sid), _k_doc_global(sid)
+    size = None
+    with redis_bin.pipeline() as pipe:
+        try:
+            pipe.watch(k_user, k_glob)
+            raw = pipe.get(k_user)
+            ttl = pipe.ttl(k_user)
+            # every write and TTL refresh resets the TTL to SESSION_TTL_SEC
+            if not raw or ttl <= 0 or SESSION_TTL_SEC - ttl < idle_sec:
+                return None
+            doc = codec.loads(raw)
+            if doc.get("archived"):
+                return None
+            refs = blobs.refs_in_messages(doc.get("messages", []))
+            blobs.hydrate_messages(doc.get("messages", []))
+            # full-resolution plot series are fetched by hash, so they travel next to the doc
+            extra = blobs.get_blobs(blobs.full_data_refs(doc.get("messages", [])))
+            size = archive.put(sub, sid, dict(doc, **{ARCHIVE_BLOBS_KEY: extra}), expires_at=_now_ts() + ttl)
+
+            stub = codec.dumps(_stub(doc))
+            pipe.multi()
+            pipe.set(k_user, stub, keepttl=True)
+            pipe.set(k_glob, stub, keepttl=True)
+            pipe.execute()
+        except Exception as exc:
+            # no stub was written, so the row must go too (compaction skips sessions it finds archived)
+            if size is not None:
+                archive.delete(sid)
+            if isinstance(exc, WatchError):
+                return None   # the doc changed meanwhile
+            raise
+
+    # the archive row carries the payloads; blobs no other session uses can go
+    blobs.release_refs(sid, refs)
+    return size
+
+def _read_archive(sid: str) -> Optional[tuple]:
+    """(owner, doc, {hash: payload} of its full-data blobs) of an archived session, or None."""
+    row = archive.get(sid)
+    if row is None:
+        return None
+    owner, doc = row
+    return owner, doc, doc.pop(ARCHIVE_BLOBS_KEY, None) or {}
+
+def _restore_archived(sub: str, sid: str) -> Optional[dict]:
+    """Write an archived session back to Redis (fresh TTL, same updated_at) and drop its archive row."""
+    row = _read_archive(sid)
+    if row is None:
+        # restored meanwhile by another request?
+        doc = _load_doc(sub, sid)
+        if doc and not doc.get("archived"):
+            return doc
+        logger.error("Archived session missing from the archive | sess=%s", sid)
+        return None
+    owner, doc, extra = row
+
+    pipe = redis_bin.pipeline()
+    for value in extra.values():
+        blobs.put_blob(value, sid, owner, pipe=pipe)
+    stored = dict(doc, messages=blobs.dehydrate_messages(doc.get("messages", []), sid, pipe))
+    encoded = codec.dumps(stored)
+    pipe.set(_k_doc(owner, sid), encoded, ex=SESSION_TTL_SEC)
+    pipe.set(_k_doc_global(sid), encoded, ex=SESSION_TTL_SEC)
     pipe.execute()
+    archive.delete(sid)
+    logger.info("Restored archived session | sess=%s messages=%s", sid, len(stored["messages"]))
+    return stored
 
-    # ensure owner recorded
-    _set_session_owner(sid, sub)
-    # make sure owner + other session keys are kept alive
-    _touch_session_ttl(sid, sub=sub)
+
+# ---------- Search index (see session_index.py) ----------
+def _build_search_index(sub: str) -> None:
+    """Index a user's sessions saved before the search index existed (once per user)."""
+    pipe = redis_bin.pipeline()
+    for k in redis_client.zrange(_k_idx(sub), 0, -1):
+        k = _b2s(k)
+        raw = redis_bin.get(k)
+        if not raw:
+            continue
+        doc = codec.loads(raw)
+        sid = doc.get("id") or k.rsplit(":", 1)[-1]
+        count = None
+        if doc.get("archived"):
+            # index the archived messages too, without restoring the session
+            row = _read_archive(sid)
+            count = doc.get("message_count")
+            doc = dict(row[1], title=doc.get("title"), updated_at=doc.get("updated_at")) if row else doc
+        session_index.index_session(sub, sid, doc, pipe=pipe, message_count=count)
+    pipe.execute()
+    session_index.mark_built(sub)
 
 
 # ---------- High-level helpers used by routes ----------
@@ -151,19 +325,19 @@ def _list_docs(sub: str) -> List[SessionSummary]:
     out: List[SessionSummary] = []
     for k, score in keys:
         k = _b2s(k)
-        raw = redis_client.get(k)
+        raw = redis_bin.get(k)
         if not raw:
             continue
-        doc = json.loads(_b2s(raw))
+        doc = codec.loads(raw)
         out.append(SessionSummary(
             id=doc["id"],
             title=(doc.get("title") or "Untitled Chat"),
             updated_at=float(score),
-            message_count=len(doc.get("messages", [])),
+            message_count=doc.get("message_count", len(doc.get("messages", []))),
         ))
     return out
 
-def _get_doc_owned(sub: str, sid: str) -> Optional[dict]:
+def _get_doc_owned(sub: str, sid: str, hydrate: bool = True, restore: bool = True) -> Optional[dict]:
     """
     Return the session only if caller is the owner.
     We accept per-user or global storage, but enforce owner check.
@@ -171,10 +345,10 @@ def _get_doc_owned(sub: str, sid: str) -> Optional[dict]:
     owner = _get_session_owner(sid)
     if owner and owner != sub:
         return None
-    return _get_doc_for_user_or_global(sub, sid)
+    return _get_doc_for_user_or_global(sub, sid, hydrate=hydrate, restore=restore)
 
 def _save_user_session(sub: str, sid: str, title: str, messages: list) -> None:
-    existing = _get_doc_for_user_or_global(sub, sid)
+    existing = _get_doc_for_user_or_global(sub, sid, hydrate=False)
     created_at = existing.get("created_at") if existing else _now_iso()
 
     merged_messages = _merge_messages(existing.get("messages", []) if existing else [], messages)
@@ -190,18 +364,31 @@ def _save_user_session(sub: str, sid: str, title: str, messages: list) -> None:
 
 def _delete_doc(sub: str, sid: str) -> None:
     k_user = _k_doc(sub, sid)
+    # Keep or remove global? Safer to remove only if caller is owner.
+    owner = _get_session_owner(sid)
+    doc, refs = None, set()
+    if owner == sub:
+        # an archived session holds no refs (its blobs went with the archive row, deleted below)
+        doc = _get_doc_for_user_or_global(sub, sid, hydrate=False, restore=False)
+        refs = blobs.refs_in_messages(doc.get("messages", [])) if doc else set()
+
     pipe = redis_client.pipeline()
     pipe.delete(k_user)
     pipe.zrem(_k_idx(sub), k_user)
-    # Keep or remove global? Safer to remove only if caller is owner.
-    owner = _get_session_owner(sid)
+    session_index.unindex_session(sub, sid, pipe=pipe)
     if owner == sub:
         pipe.delete(_k_doc_global(sid))
         pipe.delete(_owner_key(sid))
     pipe.execute()
 
+    # blobs live as long as some session still references them
+    if owner == sub:
+        blobs.release_refs(sid, refs)
+    if owner == sub and doc and doc.get("archived"):
+        archive.delete(sid)
+
 def _update_title(sub: str, sid: str, title: str, touch: bool = False):
-    doc = _get_doc_for_user_or_global(sub, sid)
+    doc = _get_doc_for_user_or_global(sub, sid, hydrate=False)
     if not doc:
         raise HTTPException(status_code=404, detail="session_not_found")
     doc["title"] = (title or "Untitled Chat").strip() or "Untitled Chat"
@@ -220,15 +407,15 @@ def _seed_history_from_messages(session_id: str, messages: list) -> None:
         ),
     }
 
-    pipe = redis_client.pipeline()
-    pipe.rpush(history_key, json.dumps(system_prompt))
+    pipe = redis_bin.pipeline()
+    pipe.rpush(history_key, codec.dumps(system_prompt))
 
     # Only the role/content matter for the agent call; ignore other fields safely.
     for m in messages:
         role = m.get("role")
         content = m.get("content")
         if role in ("user", "assistant") and isinstance(content, str):
-            pipe.rpush(history_key, json.dumps({"role": role, "content": content}))
+            pipe.rpush(history_key, codec.dumps({"role": role, "content": content}))
     pipe.expire(history_key, SESSION_TTL_SEC)
     pipe.execute()
 
@@ -288,7 +475,7 @@ def persist_async_result_to_session(sub: Optional[str], email: Optional[str], se
         sub = _get_session_owner(session_id)
 
     # Load existing (prefer user's doc; fallback to global)
-    doc = _get_doc_for_user_or_global(sub or "", session_id) or {
+    doc = _get_doc_for_user_or_global(sub or "", session_id, hydrate=False) or {
         "id": session_id,
         "title": result.get("title") or "#abm",
         "messages": [],
@@ -296,6 +483,7 @@ def persist_async_result_to_session(sub: Optional[str], email: Optional[str], se
     }
 
     # --- 1) Carry forward the last known GeoJSON from previous messages ---
+    # (stored docs hold a blob ref here, so carrying it forward costs no extra copy)
     last_geojson = None
     try:
         for m in reversed(doc.get("messages", [])):
@@ -339,32 +527,252 @@ def persist_async_result_to_session(sub: Optional[str], email: Optional[str], se
     else:
         # Owner not known yet → write ONLY the global copy (no index, no owner set)
         doc["updated_at"] = _now_ts()
-        redis_client.set(_k_doc_global(session_id), json.dumps(doc))
-        redis_client.expire(_k_doc_global(session_id), SESSION_TTL_SEC)
+        pipe = redis_bin.pipeline()
+        stored = dict(doc, messages=blobs.dehydrate_messages(doc["messages"], session_id, pipe))
+        pipe.set(_k_doc_global(session_id), codec.dumps(stored), ex=SESSION_TTL_SEC)
+        pipe.execute()
 
     # Seed chat history so continuing this session keeps context
     history_key = f"chat:{session_id}:history"
-    redis_client.rpush(history_key, json.dumps({"role": "assistant", "content": assistant_msg["content"]}))
+    redis_bin.rpush(history_key, codec.dumps({"role": "assistant", "content": assistant_msg["content"]}))
     redis_client.expire(history_key, SESSION_TTL_SEC) 
 
     _touch_session_ttl(session_id, sub=sub)
+
+    # Push to the owner's open tabs (stored refs resolved so the SPA can render it as-is)
+    if sub:
+        pushed = copy.deepcopy(assistant_msg)
+        blobs.hydrate_messages([pushed])
+        publish_event(sub, "session.message", {"session_id": session_id, "message": pushed})
     
 
+# ---------- Bulk ----------
+def _bulk_ids(session_ids: List[str]) -> List[str]:
+    sids = list(dict.fromkeys(s for s in session_ids if s))
+    if len(sids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail="too_many_sessions")
+    return sids
+
+def _load_owned_batch(sub: str, sids: List[str]) -> Dict[str, Optional[tuple]]:
+    """
+    sid -> (owner, doc) for the sessions the caller may access, None for the
+    rest; docs keep their blob refs and archived ones stay stubs. Same rules
+    as _get_doc_owned, in three round trips for the whole batch.
+    """
+    if not sids:
+        return {}
+    owners = redis_client.mget([_owner_key(s) for s in sids])
+    raws = redis_bin.mget([_k_doc(sub, s) for s in sids])
+    missing = [i for i, raw in enumerate(raws) if not raw]
+    if missing:
+        for i, raw in zip(missing, redis_bin.mget([_k_doc_global(sids[i]) for i in missing])):
+            raws[i] = raw
+
+    out: Dict[str, Optional[tuple]] = {}
+    for sid, owner, raw in zip(sids, owners, raws):
+        owner = _b2s(owner) if owner else None
+        out[sid] = (owner, codec.loads(raw)) if raw and (not owner or owner == sub) else None
+    return out
+
+def _bulk_report(sids: List[str], errors: Dict[str, str]) -> List[BulkItemResult]:
+    return [BulkItemResult(session_id=s, ok=s not in errors, error=errors.get(s)) for s in sids]
+
+def _bulk_delete(sub: str, sids: List[str]) -> List[BulkItemResult]:
+    """_delete_doc for many sessions, in one pipeline."""
+    found = _load_owned_batch(sub, sids)
+    errors = {}
+    pipe = redis_bin.pipeline()
+    archived = []
+    for sid in sids:
+        if found[sid] is None:
+            errors[sid] = "session_not_found"
+            continue
+        owner, doc = found[sid]
+        k_user = _k_doc(sub, sid)
+        pipe.delete(k_user)
+        pipe.zrem(_k_idx(sub), k_user)
+        session_index.unindex_session(sub, sid, pipe=pipe)
+        if owner == sub:
+            pipe.delete(_k_doc_global(sid))
+            pipe.delete(_owner_key(sid))
+            blobs.release_refs(sid, blobs.refs_in_messages(doc.get("messages", [])), pipe=pipe)
+            if doc.get("archived"):
+                archived.append(sid)
+    pipe.execute()
+    for sid in archived:
+        archive.delete(sid)
+    return _bulk_report(sids, errors)
+
+def _bulk_rename(sub: str, items: List[BulkRenameItem], touch: bool = False) -> List[BulkItemResult]:
+    """_update_title for many sessions, in one pipeline."""
+    titles = {i.session_id: i.title for i in items if i.session_id}
+    sids = _bulk_ids(list(titles))
+    found = _load_owned_batch(sub, sids)
+    errors = {}
+    pipe = redis_bin.pipeline()
+    for sid in sids:
+        doc = found[sid][1] if found[sid] else None
+        if doc and doc.get("archived"):
+            doc = _restore_archived(sub, sid)
+        if not doc:
+            errors[sid] = "session_not_found"
+            continue
+        doc["title"] = (titles[sid] or "Untitled Chat").strip() or "Untitled Chat"
+        _queue_save(pipe, sub, sid, doc, touch_index=touch)
+    pipe.execute()
+    for sid in sids:
+        if sid not in errors:
+            _touch_session_ttl(sid, sub=sub)
+    return _bulk_report(sids, errors)
+
+def _bulk_extend(sub: str, sids: List[str]) -> List[BulkItemResult]:
+    """Renew the full TTL of the sessions' keys now (not lazily), in one pipeline."""
+    found = _load_owned_batch(sub, sids)
+    errors = {}
+    pipe = redis_client.pipeline()
+    for sid in sids:
+        if found[sid] is None:
+            errors[sid] = "session_not_found"
+            continue
+        for k in session_keys(sid, sub):
+            pipe.expire(k, SESSION_TTL_SEC)
+        blobs.touch_refs(sid, pipe=pipe)
+        session_index.touch_session(sid, sub, pipe=pipe)
+    pipe.execute()
+    return _bulk_report(sids, errors)
+
+def _bulk_export(sub: str, sids: List[str]) -> tuple:
+    """(report, full docs with payloads resolved); archived sessions are read from the archive, not restored."""
+    found = _load_owned_batch(sub, sids)
+    errors, docs = {}, []
+    for sid in sids:
+        doc = found[sid][1] if found[sid] else None
+        if doc and doc.get("archived"):
+            row = _read_archive(sid)
+            doc = row[1] if row else None
+        if not doc:
+            errors[sid] = "session_not_found"
+            continue
+        docs.append(doc)
+    # one MGET for the blobs of all docs
+    blobs.hydrate_messages([m for d in docs for m in d.get("messages", [])])
+    return _bulk_report(sids, errors), docs
+
+
+# ---------- Conditional GETs ----------
+def _etag(*parts) -> str:
+    return 'W/"' + hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest() + '"'
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 when the client already has this version; None otherwise."""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": SESSION_CACHE_CONTROL})
+    return None
+
+def _cache_headers(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = SESSION_CACHE_CONTROL
+
+
 # ---------- Routes ----------
 @router.get("/sessions", response_model=List[SessionSummary])
-def list_sessions(user=Depends(require_user)):
+def list_sessions(request: Request, response: Response, user=Depends(require_user)):
+    sub = user.get("sub")
+    summaries = _list_docs(sub)
+    # renames don't always bump the index score, so the tag covers titles and counts too
+    etag = _etag(*((s.id, s.title, s.updated_at, s.message_count) for s in summaries))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    _cache_headers(response, etag)
+    return summaries
+
+# registered before /sessions/{session_id}, which would otherwise match "search"
+@router.get("/sessions/search", response_model=SessionSearchResult)
+def search_sessions(q: Optional[str] = None, pilot: Optional[str] = None, service: Optional[str] = None,
+                    created_from: Optional[float] = None, created_to: Optional[float] = None,
+                    updated_from: Optional[float] = None, updated_to: Optional[float] = None,
+                    offset: int = 0, limit: int = SEARCH_PAGE_DEFAULT, user=Depends(require_user)):
+    """
+    Sessions whose title has words starting with every word of q, that used the
+    given pilot area and service, within the date ranges (epoch seconds),
+    newest-first. Served from the search index without loading any session.
+    """
     sub = user.get("sub")
-    return _list_docs(sub)
+    if not session_index.is_built(sub):
+        _build_search_index(sub)
+    lo, hi = session_index.TS_MIN, session_index.TS_MAX
+    total, hits = session_index.search(
+        sub, _k_doc(sub, ""), session_index.query_terms(q, pilot, service),
+        updated=(updated_from if updated_from is not None else lo, updated_to if updated_to is not None else hi),
+        created=(created_from if created_from is not None else lo, created_to if created_to is not None else hi),
+        offset=max(0, offset), limit=max(1, min(limit, SEARCH_PAGE_MAX)),
+    )
+    return SessionSearchResult(sessions=[SessionHit(**h) for h in hits], total=total)
 
 @router.get("/sessions/{session_id}")
-def get_session(session_id: str, user=Depends(require_user)):
+def get_session(session_id: str, request: Request, response: Response, user=Depends(require_user)):
     sub = user.get("sub")
     # Enforce ownership, and read per-user doc with global fallback
-    doc = _get_doc_owned(sub, session_id)
+    doc = _get_doc_owned(sub, session_id, hydrate=False)
     if not doc:
         raise HTTPException(status_code=404, detail="session_not_found")
+    # a session that is read keeps its keys and blobs (lazy, at most hourly)
+    _touch_session_ttl(session_id, sub=sub)
+    # every write of the doc bumps updated_at
+    etag = _etag(session_id, doc.get("updated_at"), len(doc.get("messages", [])))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    blobs.hydrate_messages(doc.get("messages", []))
+    _cache_headers(response, etag)
     return doc
 
+@router.get("/sessions/{session_id}/header", response_model=SessionHeader)
+def get_session_header(session_id: str, request: Request, response: Response, user=Depends(require_user)):
+    """Title, timestamps and message count, without the messages."""
+    sub = user.get("sub")
+    # an archived session's stub has all of this; no need to restore it
+    doc = _get_doc_owned(sub, session_id, hydrate=False, restore=False)
+    if not doc:
+        raise HTTPException(status_code=404, detail="session_not_found")
+    etag = _etag("header", session_id, doc.get("updated_at"), doc.get("title"))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    _cache_headers(response, etag)
+    return SessionHeader(
+        id=doc.get("id", session_id),
+        title=doc.get("title") or "Untitled Chat",
+        created_at=doc.get("created_at"),
+        updated_at=doc.get("updated_at"),
+        message_count=doc.get("message_count", len(doc.get("messages", []))),
+    )
+
+@router.get("/sessions/{session_id}/messages", response_model=MessagePage)
+def get_session_messages(session_id: str, cursor: Optional[int] = None, limit: int = MESSAGE_PAGE_DEFAULT,
+                         hydrate: bool = False, user=Depends(require_user)):
+    """
+    One page of messages, newest-first. The cursor is the position of the oldest
+    message already loaded, so it stays valid while new messages are appended.
+    Heavy payloads stay {"$blob": hash} refs (fetch them from /api/blobs/{hash})
+    unless hydrate=true.
+    """
+    sub = user.get("sub")
+    doc = _get_doc_owned(sub, session_id, hydrate=False)
+    if not doc:
+        raise HTTPException(status_code=404, detail="session_not_found")
+    _touch_session_ttl(session_id, sub=sub)
+    messages = doc.get("messages", [])
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX))
+    end = len(messages) if cursor is None else max(0, min(cursor, len(messages)))
+    start = max(0, end - limit)
+    page = messages[start:end]
+    if hydrate:
+        blobs.hydrate_messages(page)
+    page.reverse()
+    return MessagePage(messages=page, next_cursor=start or None, total=len(messages))
+
 @router.post("/sessions")
 def upsert_session(body: SessionUpsert, user=Depends(require_user)):
     sub = user.get("sub")
@@ -387,8 +795,44 @@ def rename_session(session_id: str, body: SessionTitleUpdate, user=Depends(requi
 @router.post("/sessions/{session_id}/seed")
 def seed_session_history(session_id: str, user=Depends(require_user)):
     sub = user.get("sub")
-    doc = _get_doc_owned(sub, session_id)
+    doc = _get_doc_owned(sub, session_id, hydrate=False)
     if not doc:
         raise HTTPException(status_code=404, detail="session_not_found")
     _seed_history_from_messages(session_id, doc.get("messages", []))
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+
+@router.post("/sessions/bulk/delete", response_model=BulkResult)
+def bulk_delete_sessions(body: BulkSessionIds, user=Depends(require_user)):
+    sub = user.get("sub")
+    return BulkResult(results=_bulk_delete(sub, _bulk_ids(body.session_ids)))
+
+@router.post("/sessions/bulk/rename", response_model=BulkResult)
+def bulk_rename_sessions(body: BulkRename, user=Depends(require_user)):
+    sub = user.get("sub")
+    return BulkResult(results=_bulk_rename(sub, body.items, touch=body.touch))
+
+@router.post("/sessions/bulk/extend", response_model=BulkResult)
+def bulk_extend_sessions(body: BulkSessionIds, user=Depends(require_user)):
+    """Keep the sessions for another SESSION_TTL_SEC from now."""
+    sub = user.get("sub")
+    return BulkResult(results=_bulk_extend(sub, _bulk_ids(body.session_ids)))
+
+@router.post("/sessions/bulk/export", response_model=BulkExport)
+def bulk_export_sessions(body: BulkSessionIds, user=Depends(require_user)):
+    sub = user.get("sub")
+    results, docs = _bulk_export(sub, _bulk_ids(body.session_ids))
+    return BulkExport(results=results, sessions=docs)
+
+
+@router.get("/blobs/{blob_hash}")
+def get_blob(blob_hash: str, user=Depends(require_user)):
+    """A stored payload (e.g. full-resolution plot data), readable by its owners."""
+    sub = user.get("sub")
+    owners, sids = blobs.blob_readers(blob_hash)
+    if sub not in owners and not any(_get_session_owner(sid) == sub for sid in sids):
+        raise HTTPException(status_code=404, detail="blob_not_found")
+    value = blobs.get_blob(blob_hash)
+    if value is None:
+        raise HTTPException(status_code=404, detail="blob_not_found")
+    return value
@@ -0,0 +1,227 @@
+# slots.py
+"""
+Slot filling for the chat wizard: several inputs in one message.
+
+"health=0.7, stress 0.2, labour is 0.4, validation no" fills those fields of
+``collected_inputs`` at once, and the wizard then asks only for what is still
+missing. A deterministic regex parser over field names and their aliases runs
+first; only when it finds nothing in a message that carries several numbers is
+the LLM asked (via the ``llm`` callable) to extract a JSON object. Every value
+goes through the same validators as the step-by-step flow.
+
+Config (env):
+    SLOT_LLM_FALLBACK   1 to let the LLM extract values the regex parser missed (default: 1)
+"""
+import os
+import re
+import json
+import logging
+from typing import Callable, Dict, List, Optional
+
+from validators import INPUT_RULES, coerce
+
+logger = logging.getLogger(__name__)
+
+SLOT_LLM_FALLBACK = os.getenv("SLOT_LLM_FALLBACK", "1").strip().lower() in ("1", "true", "yes")
+
+PECS_STEPS = [
+    "health_status", "labor_availability", "stress_level", "satisfaction",
+    "policy_incentives", "information_access", "social_influence", "community_participation",
+]
+FULL_STEPS = PECS_STEPS + [
+    "total_budget", "pv_installation_cost", "adoption_weight", "resilience_weight", "budget_overshoot_weight",
+]
+
+# Wizard steps per service, in the order chat_with_mistral asks for them
+STEP_ORDER = {
+    "crop_suitability": ["crop_type", "pilot", "geojson", "time_period", "profit"],
+    "pv_suitability": ["pilot", "geojson", "proximity_to_powerlines", "road_network_accessibility",
+                       "electricity_rate", "efficiency", "time_period"],
+    "base-abm": ["pilot", "geojson", "validation", "time_period"],
+    "pecs-abm": ["pilot", "geojson"] + PECS_STEPS + ["validation", "time_period"],
+    "full-abm": ["pilot", "geojson"] + FULL_STEPS + ["validation", "time_period"],
+}
+
+# step name -> collected_inputs key (where they differ)
+STEP_KEYS = {"pilot": "area", "profit": "show_profit"}
+
+SERVICE_TAGS = {
+    "#crop": "crop_suitability",
+    "#pv": "pv_suitability",
+    "#abm": "base-abm",
+    "#pecs": "pecs-abm",
+    "#full": "full-abm",
+}
+
+TIME_PERIOD_PROMPT = ("For which time period would you like to evaluate ? \n **Past** — based on historical Earth Observation data \n "
+                      "**Future** — using climate projections under RCP scenarios?")
+
+STEP_PROMPTS = {
+    "crop_type": "Which crop would you like to evaluate?  Currently, we support the following crop types: **wheat** and **maize**.",
+    "pilot": "For which pilot area would you like to evaluate ? Currently, we support the following pilot areas:\n "
+             "**PILOT_THESSALONIKI**, **PILOT_PILSEN**, **PILOT_OLOMOUC** . You can also draw your area of interest "
+             "on the map below and the pilot will be detected automatically.",
+    "geojson": "Please define your area of interest by drawing a polygon on the map shown below. "
+               "Once you complete the drawing, the GeoJSON format will be automatically generated and submitted.",
+    "time_period": TIME_PERIOD_PROMPT,
+    "profit": "Would you like profit estimation to be also performed ? Please type **yes** or **no** ",
+    "validation": "Would you like validation to be performed ? Please type **yes** or **no** ",
+    "proximity_to_powerlines": "Please enter the distance from powerlines in kilometers (e.g., 1.5):",
+    "road_network_accessibility": "Please enter the distance from roads in kilometers (e.g., 2.0):",
+    "electricity_rate": "Please enter the electricity rate in $/kWh (e.g., 0.15):",
+    "efficiency": "Please enter the efficiency of the PV installation in % (e.g., 18.5):",
+    "health_status": "Please enter a positive number between 0 and 1 for health status (e.g., 0.78):",
+    "labor_availability": "Please enter a positive number between 0 and 1 for labor availability (e.g., 0.25):",
+    "stress_level": "Please enter a positive number between 0 and 1 for stress level (e.g., 0.45):",
+    "satisfaction": "Please enter a positive number between 0 and 1 for satisfaction (e.g., 0.89):",
+    "policy_incentives": "Please enter a positive number between 0 and 1 for policy incentives (e.g., 0.33):",
+    "information_access": "Please enter a positive number between 0 and 1 for information access (e.g., 0.45):",
+    "social_influence": "Please enter a positive number between 0 and 1 for social influence (e.g., 0.2):",
+    "community_participation": "Please enter a positive number between 0 and 1 for community participation (e.g., 0.8):",
+    "total_budget": "Please enter a positive number for the total budget in euros (e.g., 800000)",
+    "pv_installation_cost": "Please enter a positive number for the photovoltaic installation cost in euros (e.g., 3000)",
+    "adoption_weight": "Please enter a positive number between 0 and 1 for adoption weight (e.g., 0.9)",
+    "resilience_weight": "Please enter a positive number between 0 and 1 for resilience weight (e.g., 0.1):",
+    "budget_overshoot_weight": "Please enter a positive number between 0 and 1 for budget overshoot weight (e.g., 0.5):",
+}
+
+# Extra names users type for a field (the field name itself, with "_" or " ", always works)
+SLOT_ALIASES = {
+    "crop_type": ("crop",),
+    "area": ("pilot", "pilot area"),
+    "time_period": ("period",),
+    "show_profit": ("profit", "profit estimation"),
+    "proximity_to_powerlines": ("powerlines", "powerline distance", "distance from powerlines"),
+    "road_network_accessibility": ("roads", "road distance", "distance from roads", "road accessibility"),
+    "electricity_rate": ("electricity", "rate"),
+    "health_status": ("health",),
+    "labor_availability": ("labor", "labour", "labour availability"),
+    "stress_level": ("stress",),
+    "policy_incentives": ("policy", "incentives"),
+    "information_access": ("information",),
+    "social_influence": ("social",),
+    "community_participation": ("community", "participation"),
+    "total_budget": ("budget",),
+    "pv_installation_cost": ("installation cost", "pv cost", "cost"),
+    "adoption_weight": ("adoption",),
+    "resilience_weight": ("resilience",),
+    "budget_overshoot_weight": ("overshoot", "budget overshoot", "overshoot weight"),
+}
+
+PILOT_NAMES = {"thessaloniki": "PILOT_THESSALONIKI", "pilsen": "PILOT_PILSEN", "olomouc": "PILOT_OLOMOUC"}
+
+
+# ---------- Value coercion (validators.INPUT_RULES, plus bare pilot names) ----------
+def _coerce(key: str, value):
+    if key == "area":
+        value = PILOT_NAMES.get(str(value).strip().lower(), value)
+    return coerce(key, str(value))
+
+SLOT_FIELDS = [k for k in INPUT_RULES if k not in ("geojson", "PV_area")]
+
+
+# ---------- Regex parser (compiled once) ----------
+def _build_pattern():
+    names = {}
+    for key in SLOT_FIELDS:
+        for alias in (key, key.replace("_", " ")) + SLOT_ALIASES.get(key, ()):
+            names[alias.lower()] = key
+    # longest first so "budget overshoot weight" wins over "budget"
+    alternation = "|".join(re.escape(n).replace(r"\ ", r"\s+") for n in sorted(names, key=len, reverse=True))
+    pattern = re.compile(
+        # only the name is consumed, so a rejected value can still be the next name
+        rf"(?<![\w#])(?P<name>{alternation})(?=(?:\s*(?:=|:|\bis\b|\bof\b|\bto\b)\s*|\s+)"
+        r"(?P<value>[-+]?\d+(?:[.,]\d+)?|[A-Za-z_]+))",
+        re.IGNORECASE,
+    )
+    return pattern, names
+
+_PATTERN, _NAMES = _build_pattern()
+_NUMBERS = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+
+
+def slot_keys(service: str) -> List[str]:
+    """collected_inputs keys a service asks for (geojson excluded: it is drawn, not typed)."""
+    return [STEP_KEYS.get(s, s) for s in STEP_ORDER.get(service, []) if s != "geojson"]
+
+def detect_service(text: str) -> Optional[str]:
+    lowered = text.lower()
+    return next((svc for tag, svc in SERVICE_TAGS.items() if tag in lowered), None)
+
+def parse_slots(text: str, service: str) -> Dict[str, object]:
+    """Deterministic key/value extraction; invalid or foreign values are dropped."""
+    wanted = set(slot_keys(service))
+    out = {}
+    for m in _PATTERN.finditer(text):
+        key = _NAMES[re.sub(r"\s+", " ", m.group("name").lower())]
+        if key not in wanted:
+            continue
+        value = _coerce(key, m.group("value").replace(",", "."))
+        if value is not None:
+            out[key] = value
+    return out
+
+def _parse_llm_json(reply: str, wanted: List[str]) -> Dict[str, object]:
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        data = json.loads(reply[start:end + 1])
+    except ValueError:
+        return {}
+    out = {}
+    for key in wanted:
+        if key in data and data[key] is not None:
+            value = _coerce(key, str(data[key]))
+            if value is not None:
+                out[key] = value
+    return out
+
+def fill_slots(service: str, text: str, llm: Optional[Callable[[str], str]] = None) -> Dict[str, object]:
+    """
+    Values for the service's inputs found in a free-text message. The regex parser
+    runs first; the LLM is consulted only if it found nothing and the message
+    carries at least two numbers.
+    """
+    if service not in STEP_ORDER or text.lstrip().startswith("{"):
+        return {}
+
+    found = parse_slots(text, service)
+    if found or llm is None or not SLOT_LLM_FALLBACK or len(_NUMBERS.findall(text)) < 2:
+        return found
+
+    wanted = slot_keys(service)
+    prompt = (
+        f"Extract the values of these parameters from the message: {', '.join(wanted)}.\n"
+        "Reply with one JSON object only, using exactly these keys and leaving out any value "
+        f"the message does not give.\n\nMessage: {text}"
+    )
+    try:
+        return _parse_llm_json(llm(prompt), wanted)
+    except Exception:
+        logger.exception("LLM slot extraction failed")
+        return {}
+
+
+def next_missing_step(service: str, collected: dict) -> Optional[str]:
+    """First wizard step whose input is still missing; None when all are known."""
+    for step in STEP_ORDER.get(service, []):
+        if step == "profit" and collected.get("time_period") != "future":
+            continue
+        if collected.get(STEP_KEYS.get(step, step)) is None:
+            return step
+    return None
+
+def last_step(service: str, collected: dict) -> str:
+    """The step that triggers the model run for these inputs."""
+    if service == "crop_suitability" and collected.get("time_period") == "future":
+        return "profit"
+    return "time_period"
+
+def step_action(service: str, step: str) -> Optional[str]:
+    """SPA action that accompanies the prompt of a step (map for areas, PV indicator before the period)."""
+    if step in ("pilot", "geojson"):
+        return "open_map"
+    if step == "time_period" and service != "crop_suitability":
+        return "show_pv_indicator"
+    return None
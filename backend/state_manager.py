@@ -1,40 +1,88 @@
-import json
-from redis_conn import redis_client  # Χρησιμοποίησε τον υπάρχοντα client
+"""
+Wizard state per chat session (state:{sid}) and the TTL of the session's keys.
+
+Session keys, the blobs the session references (blobs.touch_refs) and its
+entries in the owner's search index (session_index.touch_session) expire after SESSION_TTL_SEC of inactivity. Refreshing them is lazy:
+touch_session_ttl renews all of a session's keys at most once per
+TTL_REFRESH_INTERVAL_SEC, tracked in-process and across workers with a marker
+key (one SET NX instead of an EXPIRE per key on every write). Keys are
+written with their TTL when created, so a skipped refresh never leaves a key
+without one; with a 14-day TTL, renewing hourly loses nothing.
+
+Config (env):
+    TTL_REFRESH_INTERVAL_SEC   minimum time between TTL refreshes of a session (default: 3600)
+"""
+import os
+import time
+from typing import Dict, Optional
+
+import codec
+import blobs
+import session_index
+from redis_conn import redis_client, redis_bin  # Χρησιμοποίησε τον υπάρχοντα client
+from turns import fenced_set
 
 SESSION_TTL_SEC = 14 * 24 * 60 * 60  # 14 days
+TTL_REFRESH_INTERVAL_SEC = int(os.getenv("TTL_REFRESH_INTERVAL_SEC", "3600"))
 
+_TOUCHED_MAX = 10000
+_touched: Dict[str, float] = {}  # "{sid}|{sub}" -> monotonic time of the last refresh seen by this process
 
-def touch_session_ttl(session_id: str):
-    """
-    Refresh TTL for all keys related to this session.
-    Safe to call even if some keys don't exist.
-    """
+
+def session_keys(session_id: str, sub: Optional[str] = None):
+    """Every key that lives and expires with a session."""
     keys = [
-        f"chat:{session_id}",
         f"chat:{session_id}:history",
         f"state:{session_id}",
         f"session:{session_id}",           # global doc (if present)
         f"session:{session_id}:owner",     # owner pointer (if present)
+        blobs.session_blobs_key(session_id),  # hashes of the blobs it references
     ]
+    if sub:
+        keys.append(f"user:{sub}:session:{session_id}")   # per-user doc
+    return keys
+
+def touch_session_ttl(session_id: str, sub: Optional[str] = None, force: bool = False):
+    """
+    Refresh TTL for all keys related to this session, at most once per
+    TTL_REFRESH_INTERVAL_SEC (force=True: now). Safe to call even if some keys don't exist.
+    """
+    scope = f"{session_id}|{sub or ''}"
+    now = time.monotonic()
+    if not force:
+        last = _touched.get(scope)
+        if last is not None and now - last < TTL_REFRESH_INTERVAL_SEC:
+            return
+        # another worker refreshed recently
+        if not redis_client.set(f"ttl:touched:{scope}", 1, nx=True, ex=TTL_REFRESH_INTERVAL_SEC):
+            _remember(scope, now)
+            return
+
     pipe = redis_client.pipeline()
-    for k in keys:
+    for k in session_keys(session_id, sub):
         pipe.expire(k, SESSION_TTL_SEC)
+    blobs.touch_refs(session_id, pipe=pipe)
+    session_index.touch_session(session_id, sub, pipe=pipe)
     pipe.execute()
+    _remember(scope, now)
+
+def _remember(scope: str, now: float) -> None:
+    if len(_touched) >= _TOUCHED_MAX:
+        for k in [k for k, t in _touched.items() if now - t >= TTL_REFRESH_INTERVAL_SEC] or list(_touched):
+            del _touched[k]
+    _touched[scope] = now
 
 # Επιστρέφει το Redis state ενός session
 def load_state(session_id: str):
-    key = f"state:{session_id}"
-    if redis_client.exists(key):
-        return json.loads(redis_client.get(key))
-    return None
+    raw = redis_bin.get(f"state:{session_id}")
+    return codec.loads(raw) if raw else None
 
 # Αποθηκεύει το state στο Redis
+# (μέσα σε turn: μόνο αν δεν έχει ξεκινήσει νεότερο turn, βλ. turns.py)
 def save_state(session_id: str, state: dict):
     key = f"state:{session_id}"
-    pipe = redis_client.pipeline()
-    pipe.set(key, json.dumps(state))
-    pipe.expire(key, SESSION_TTL_SEC)        # state key expires in 14d
-    pipe.execute()
+    if not fenced_set(session_id, key, codec.dumps(state), SESSION_TTL_SEC):   # state key expires in 14d
+        return
     touch_session_ttl(session_id)            # refresh all related keys
 
 # Δημιουργεί νέο state όταν ξεκινά μια συνεδρία
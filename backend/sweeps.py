@@ -0,0 +1,584 @@
+# sweeps.py
+"""
+Batch parameter sweeps for PECS-ABM and FULL-ABM.
+
+A sweep expands a parameter grid (cartesian product) or a Latin-hypercube
+sample into points, fixes the remaining parameters from ``base`` and runs
+every point against the upstream model through a shared, bounded worker pool.
+Each point takes a run slot from admission.py like any other run of the model
+(the sweep counts as the session), so sweeps queue behind, not around, the
+per-user, per-model and rate limits. It is admitted before it gets a pool
+thread: a scheduler thread keeps one queue per sweep, holds one admission
+ticket for the next point of each, and serves the sweeps round-robin with at
+most ADMISSION_SESSION_CONCURRENCY points of one sweep in flight, so pool
+threads only ever run admitted points and a large sweep cannot starve the
+sweeps queued after it. Points already computed (same model
+route and payload, ignoring task/user id) are served from a Redis point cache,
+and duplicate points within a sweep run once. Upstream responses are streamed
+and only the keys the table uses are parsed (normalize.read_api_data).
+Validation runs take hours per point, so sweeps run with validation=no.
+Each finished point is written to the sweep's Redis record, so
+``GET /api/sweeps/{id}`` returns progress and a compact comparison table
+(varied parameters, status, numeric upstream metrics, layer names) at any time.
+
+Queued points live in the process that runs them. While it has points of a
+sweep left, that process holds the sweep's lease (sweep:{id}:worker), renewed
+by a background thread; running sweeps are listed in sweeps:running. When a
+worker dies or restarts its leases expire, and any live worker takes the
+sweep over and queues the points that have no row yet (``resume_sweeps``).
+Rows are written once per point, so a point run twice is counted once.
+
+Config (env):
+    SWEEP_CONCURRENCY         parallel upstream runs across all sweeps (default: 4)
+    SWEEP_MAX_POINTS          max points per sweep (default: 500)
+    SWEEP_UPSTREAM_TIMEOUT_S  read timeout of a single run (default: 1800)
+    SWEEP_TTL_SEC             how long sweep records are kept (default: 7 days)
+    SWEEP_POINT_CACHE_TTL_SEC how long computed points are reused (default: 7 days)
+    SWEEP_LEASE_SEC           a sweep is resumed elsewhere this long after its worker died (default: 60)
+"""
+import os
+import csv
+import io
+import time
+import uuid
+import random
+import socket
+import hashlib
+import logging
+import itertools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import BaseModel
+
+import codec
+import admission
+from authz_keycloak import require_user
+from redis_conn import redis_client
+from notifications import publish_event
+from normalize import NEEDED_KEYS, read_api_data
+from payloads import PECS_FIELDS, FULL_FIELDS, build_payload, post_payload
+from validators import INPUT_RULES, coerce, validate_inputs
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+SWEEP_CONCURRENCY = int(os.getenv("SWEEP_CONCURRENCY", "4"))
+SWEEP_MAX_POINTS = int(os.getenv("SWEEP_MAX_POINTS", "500"))
+SWEEP_UPSTREAM_TIMEOUT_S = float(os.getenv("SWEEP_UPSTREAM_TIMEOUT_S", "1800"))
+SWEEP_TTL_SEC = int(os.getenv("SWEEP_TTL_SEC", str(7 * 24 * 60 * 60)))
+SWEEP_POINT_CACHE_TTL_SEC = int(os.getenv("SWEEP_POINT_CACHE_TTL_SEC", str(7 * 24 * 60 * 60)))
+SWEEP_LEASE_SEC = int(os.getenv("SWEEP_LEASE_SEC", "60"))
+
+SWEEP_FIELDS = {"pecs-abm": PECS_FIELDS, "full-abm": FULL_FIELDS}
+VALUE_DECIMALS = 6
+
+# one pool for all sweeps; the scheduler hands it admitted points only, never more than it has threads
+_pool = ThreadPoolExecutor(max_workers=SWEEP_CONCURRENCY, thread_name_prefix="sweep")
+# points of one sweep running at once; more would only wait for the sweep's session slots
+SWEEP_POINTS_IN_FLIGHT = admission.ADMISSION_SESSION_CONCURRENCY
+
+_K_RUNNING = "sweeps:running"
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# sweep id -> points queued in this process and not yet recorded
+_jobs: Dict[str, int] = {}
+_jobs_lock = threading.Lock()
+_worker: Optional[threading.Thread] = None
+
+
+# ---------- Models ----------
+class LatinHypercube(BaseModel):
+    ranges: Dict[str, List[float]]   # field -> [low, high]
+    samples: int
+    seed: Optional[int] = None
+
+class SweepRequest(BaseModel):
+    model: str                       # pecs-abm | full-abm
+    area: str
+    time_period: str = "past"
+    validation: str = "no"
+    base: Dict[str, float] = {}      # fixed values for parameters that are not swept
+    grid: Optional[Dict[str, List[float]]] = None
+    lhs: Optional[LatinHypercube] = None
+
+class SweepCreated(BaseModel):
+    sweep_id: str
+    total: int
+    cached: int
+    duplicates: int
+
+
+# ---------- Redis key helpers ----------
+def _k_sweep(sweep_id: str) -> str:
+    return f"sweep:{sweep_id}"
+
+def _k_rows(sweep_id: str) -> str:
+    return f"sweep:{sweep_id}:rows"
+
+def _k_user_sweeps(sub: str) -> str:
+    return f"sweeps:user:{sub}"
+
+def _k_point(point_hash: str) -> str:
+    return f"sweep:point:{point_hash}"
+
+def _k_lease(sweep_id: str) -> str:
+    return f"sweep:{sweep_id}:worker"
+
+
+# ---------- Points ----------
+def _check_value(field: str, value: float) -> float:
+    typed = coerce(field, value)
+    if typed is None:
+        raise ValueError(f"{field} {INPUT_RULES[field].error}")
+    return round(typed, VALUE_DECIMALS)
+
+def grid_points(grid: Dict[str, List[float]]) -> List[Dict[str, float]]:
+    """Cartesian product of the grid values (fields in the given order)."""
+    fields = list(grid)
+    return [dict(zip(fields, combo)) for combo in itertools.product(*(grid[f] for f in fields))]
+
+def lhs_points(ranges: Dict[str, List[float]], samples: int, seed: Optional[int] = None) -> List[Dict[str, float]]:
+    """Latin-hypercube sample: each field's range is cut into `samples` strata, each used once."""
+    rng = random.Random(seed)
+    columns = {}
+    for field, (low, high) in ranges.items():
+        width = (high - low) / samples
+        values = [low + (i + rng.random()) * width for i in range(samples)]
+        rng.shuffle(values)
+        columns[field] = values
+    return [{f: columns[f][i] for f in ranges} for i in range(samples)]
+
+def expand_points(req: SweepRequest) -> List[Dict[str, float]]:
+    """Validated, fully specified parameter sets for a sweep request; raises ValueError."""
+    if req.model not in SWEEP_FIELDS:
+        raise ValueError(f"unsupported model {req.model!r}; expected one of {sorted(SWEEP_FIELDS)}")
+    if bool(req.grid) == bool(req.lhs):
+        raise ValueError("give exactly one of grid or lhs")
+
+    fields = SWEEP_FIELDS[req.model]
+    if req.grid:
+        swept = list(req.grid)
+        total = 1
+        for values in req.grid.values():
+            total *= len(values)
+    else:
+        swept = list(req.lhs.ranges)
+        total = req.lhs.samples
+        for field, bounds in req.lhs.ranges.items():
+            if len(bounds) != 2 or bounds[0] > bounds[1]:
+                raise ValueError(f"lhs range of {field} must be [low, high]")
+    if total < 1:
+        raise ValueError("the sweep has no points")
+    if total > SWEEP_MAX_POINTS:
+        raise ValueError(f"the sweep has {total} points; the limit is {SWEEP_MAX_POINTS}")
+
+    unknown = [f for f in list(swept) + list(req.base) if f not in fields]
+    if unknown:
+        raise ValueError(f"unknown parameters for {req.model}: {', '.join(unknown)}")
+    missing = [f for f in fields if f not in swept and f not in req.base]
+    if missing:
+        raise ValueError(f"missing values for: {', '.join(missing)}")
+
+    raw = grid_points(req.grid) if req.grid else lhs_points(req.lhs.ranges, req.lhs.samples, req.lhs.seed)
+    base = {f: _check_value(f, v) for f, v in req.base.items() if f not in swept}
+    return [dict(base, **{f: _check_value(f, v) for f, v in p.items()}) for p in raw]
+
+def point_hash(url: str, payload: dict) -> str:
+    """Cache identity of a run: route + payload without the per-run task/user ids."""
+    ident = {k: v for k, v in payload.items() if k not in ("task_id", "user_id")}
+    return hashlib.sha256(url.encode("utf-8") + b"\x00" + codec.json_dumps(ident)).hexdigest()
+
+
+# ---------- Results ----------
+def summarize(api_data: dict) -> dict:
+    """Compact row data from an upstream response: scalar metrics + layer names."""
+    metrics = {}
+    for key, value in api_data.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[key] = value
+        elif key.startswith("Validation Statistics") and isinstance(value, dict):
+            prefix = key[len("Validation Statistics"):].strip(" -")
+            for sk, sv in value.items():
+                if isinstance(sv, (int, float)) and not isinstance(sv, bool):
+                    metrics[f"{prefix} {sk}".strip()] = sv
+    layers = (api_data.get("geoserver_data") or {}).get("layers") or []
+    return {"metrics": metrics, "layers": [l for l in layers if isinstance(l, str)]}
+
+def _run_point(url: str, payload: dict) -> dict:
+    resp = post_payload(url, payload, timeout=(10, SWEEP_UPSTREAM_TIMEOUT_S), stream=True)
+    try:
+        if resp.status_code != 200:
+            return {"status": "failed", "error": f"{resp.status_code} - {resp.text[:200]}"}
+        # summarize reads the layers, the validation statistics and top-level numbers only
+        api_data = read_api_data(resp, NEEDED_KEYS, scalars=True)
+    finally:
+        resp.close()
+    return dict(summarize(api_data), status="ok")
+
+
+# ---------- Job ----------
+def _record_row(sweep_id: str, sub: str, indexes: List[int], row: dict) -> None:
+    # HSETNX: a point re-run after a takeover is counted once
+    pipe = redis_client.pipeline()
+    for i in indexes:
+        pipe.hsetnx(_k_rows(sweep_id), str(i), codec.json_dumps(dict(row, index=i)).decode("utf-8"))
+    pipe.expire(_k_rows(sweep_id), SWEEP_TTL_SEC)
+    new = sum(pipe.execute()[:len(indexes)])
+    if not new:
+        return
+
+    pipe = redis_client.pipeline()
+    pipe.hincrby(_k_sweep(sweep_id), "done", new)
+    if row["status"] != "ok":
+        pipe.hincrby(_k_sweep(sweep_id), "failed", new)
+    pipe.hget(_k_sweep(sweep_id), "total")
+    res = pipe.execute()
+    done, total = res[0], int(res[-1] or 0)
+    if done >= total:
+        pipe = redis_client.pipeline()
+        pipe.hset(_k_sweep(sweep_id), "status", "done")
+        pipe.srem(_K_RUNNING, sweep_id)
+        pipe.execute()
+    publish_event(sub, "sweep.progress", {"sweep_id": sweep_id, "done": done, "total": total})
+
+def _point_job(sweep_id: str, ticket: str, sub: str, model: str, indexes: List[int], url: str, payload: dict,
+               phash: str) -> None:
+    """Run one admitted point (the scheduler took its slot) and record its row."""
+    try:
+        row = _run_point(url, payload)
+    except Exception as e:
+        logger.warning("Sweep point failed | sweep=%s point=%s err=%s", sweep_id, indexes[0], e)
+        row = {"status": "failed", "error": f"{type(e).__name__}: {str(e)[:200]}"}
+    finally:
+        admission.release(model, ticket)
+        _point_done(sweep_id)
+    try:
+        if row["status"] == "ok":
+            redis_client.set(_k_point(phash), codec.json_dumps(row).decode("utf-8"), ex=SWEEP_POINT_CACHE_TTL_SEC)
+        _record_row(sweep_id, sub, indexes, row)
+    except Exception:
+        logger.exception("Could not record sweep row | sweep=%s", sweep_id)
+    finally:
+        _job_finished(sweep_id)
+
+def _group_points(sweep_id: str, sub: str, model: str, common: dict, points: Dict[int, dict]) -> Dict[str, dict]:
+    """point hash -> {"indexes", "url", "payload"}: identical points (by index) grouped so each runs once."""
+    groups: Dict[str, dict] = {}
+    for i, params in points.items():
+        url, payload = build_payload(model, dict(params, **common), f"{sweep_id}-{i}", sub)
+        phash = point_hash(url, payload)
+        g = groups.setdefault(phash, {"indexes": [], "url": url, "payload": payload})
+        g["indexes"].append(i)
+    return groups
+
+def _dispatch(sweep_id: str, sub: str, model: str, groups: Dict[str, dict]) -> int:
+    """Record the groups already in the point cache and queue the rest; returns the cached point count."""
+    hashes = list(groups)
+    cached = dict(zip(hashes, redis_client.mget([_k_point(h) for h in hashes]))) if hashes else {}
+    n_cached = 0
+    for phash, g in groups.items():
+        if cached.get(phash):
+            row = dict(codec.json_loads(cached[phash]), cached=True)
+            _record_row(sweep_id, sub, g["indexes"], row)
+            n_cached += len(g["indexes"])
+        else:
+            _enqueue(sweep_id, (sub, model, g["indexes"], g["url"], g["payload"], phash))
+    return n_cached
+
+
+def start_sweep(req: SweepRequest, sub: str) -> SweepCreated:
+    """Validate, dedupe, serve cached points and queue the rest; raises ValueError."""
+    common, errors = validate_inputs(
+        {"area": req.area, "time_period": req.time_period, "validation": req.validation})
+    if errors:
+        raise ValueError("; ".join(f"{k} {e}" for k, e in errors.items()))
+    if common["validation"].strip().lower() == "yes":
+        raise ValueError("validation runs take hours per point and are not supported in sweeps; use validation=no")
+
+    points = expand_points(req)
+    sweep_id = uuid.uuid4().hex
+    swept = list(req.grid or req.lhs.ranges)
+    groups = _group_points(sweep_id, sub, req.model, common, dict(enumerate(points)))
+
+    now = datetime.now(timezone.utc).timestamp()
+    pipe = redis_client.pipeline()
+    pipe.hset(_k_sweep(sweep_id), mapping={
+        "owner": sub,
+        "model": req.model,
+        "status": "running",
+        "total": len(points),
+        "done": 0,
+        "failed": 0,
+        "created_at": now,
+        "swept": codec.json_dumps(swept).decode("utf-8"),
+        "points": codec.json_dumps(points).decode("utf-8"),
+        "inputs": codec.json_dumps(common).decode("utf-8"),
+    })
+    pipe.expire(_k_sweep(sweep_id), SWEEP_TTL_SEC)
+    pipe.zadd(_k_user_sweeps(sub), {sweep_id: now})
+    pipe.expire(_k_user_sweeps(sub), SWEEP_TTL_SEC)
+    pipe.sadd(_K_RUNNING, sweep_id)
+    pipe.set(_k_lease(sweep_id), _WORKER_ID, ex=SWEEP_LEASE_SEC)
+    pipe.execute()
+
+    _job_queued(sweep_id)   # holds the lease until every point is queued
+    n_cached = _dispatch(sweep_id, sub, req.model, groups)
+    _job_finished(sweep_id)
+
+    logger.info("Sweep started | id=%s model=%s points=%s unique=%s cached=%s",
+                sweep_id, req.model, len(points), len(groups), n_cached)
+    return SweepCreated(sweep_id=sweep_id, total=len(points), cached=n_cached,
+                        duplicates=len(points) - len(groups))
+
+
+# ---------- Scheduling ----------
+_TIMEOUT = (10, SWEEP_UPSTREAM_TIMEOUT_S)
+
+# sweep id -> its points waiting for a slot; the order is the round-robin order
+_queues: "OrderedDict[str, deque]" = OrderedDict()
+_heads: Dict[str, str] = {}        # sweep id -> admission ticket of its next point
+_in_flight: Dict[str, int] = {}    # sweep id -> admitted points running in the pool
+_sched = threading.Condition()
+_scheduler: Optional[threading.Thread] = None
+
+def _enqueue(sweep_id: str, job: tuple) -> None:
+    """Queue one point (sub, model, indexes, url, payload, hash) of a sweep for the scheduler."""
+    global _scheduler
+    _job_queued(sweep_id)
+    with _sched:
+        _queues.setdefault(sweep_id, deque()).append(job)
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_schedule_loop, name="sweep-scheduler", daemon=True)
+            _scheduler.start()
+        _sched.notify()
+
+def _point_done(sweep_id: str) -> None:
+    with _sched:
+        _in_flight[sweep_id] -= 1
+        if not _in_flight[sweep_id]:
+            del _in_flight[sweep_id]
+        _sched.notify()
+
+def _schedule_pass() -> bool:
+    """
+    Offer one slot to each sweep in round-robin order; a sweep whose ticket is
+    admitted gets its next point submitted and moves to the back. Returns
+    whether any point started.
+    """
+    with _sched:
+        free = SWEEP_CONCURRENCY - sum(_in_flight.values())
+        order = list(_queues)
+    started = False
+    for sweep_id in order:
+        with _sched:
+            queue = _queues.get(sweep_id)
+            if not queue:
+                continue
+            sub, model = queue[0][0], queue[0][1]
+            eligible = free > 0 and _in_flight.get(sweep_id, 0) < SWEEP_POINTS_IN_FLIGHT
+        ticket = _heads.get(sweep_id)
+        if not eligible:
+            # no thread or no sweep slot to run it: don't stand in the model's queue meanwhile
+            if ticket is not None:
+                admission.release(model, _heads.pop(sweep_id))
+            continue
+        if ticket is None:
+            ticket = _heads[sweep_id] = admission.ticket(sub, sweep_id)
+        if not admission.try_admit(model, ticket, timeout=_TIMEOUT):
+            continue
+
+        del _heads[sweep_id]
+        with _sched:
+            job = queue.popleft()
+            _in_flight[sweep_id] = _in_flight.get(sweep_id, 0) + 1
+            if queue:
+                _queues.move_to_end(sweep_id)
+            else:
+                del _queues[sweep_id]
+        free -= 1
+        started = True
+        _pool.submit(_point_job, sweep_id, ticket, *job)
+    return started
+
+def _schedule_loop() -> None:
+    while True:
+        try:
+            started = _schedule_pass()
+        except Exception:
+            logger.exception("Sweep scheduling pass failed")
+            started = False
+        if not started:
+            # woken early by a new point or a finished one; queued tickets are re-polled meanwhile
+            with _sched:
+                _sched.wait(admission.ADMISSION_POLL_SEC if _queues else None)
+
+
+# ---------- Leases & recovery ----------
+# compare-and-renew / compare-and-delete of a sweep's worker lease
+_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+_renew_script = redis_client.register_script(_RENEW_LUA)
+_release_script = redis_client.register_script(_RELEASE_LUA)
+
+def _job_queued(sweep_id: str) -> None:
+    with _jobs_lock:
+        _jobs[sweep_id] = _jobs.get(sweep_id, 0) + 1
+
+def _job_finished(sweep_id: str) -> None:
+    with _jobs_lock:
+        _jobs[sweep_id] = _jobs.get(sweep_id, 1) - 1
+    _release_if_idle(sweep_id)
+
+def _release_if_idle(sweep_id: str) -> None:
+    """Give up the sweep's lease once this process has no point of it left to run."""
+    with _jobs_lock:
+        if _jobs.get(sweep_id, 0) > 0:
+            return
+        _jobs.pop(sweep_id, None)
+    try:
+        _release_script(keys=[_k_lease(sweep_id)], args=[_WORKER_ID])
+    except Exception:
+        logger.warning("Could not release sweep lease | sweep=%s", sweep_id)
+
+def renew_leases() -> None:
+    """Keep the leases of the sweeps this process is running alive."""
+    with _jobs_lock:
+        ids = list(_jobs)
+    for sweep_id in ids:
+        if not _renew_script(keys=[_k_lease(sweep_id)], args=[_WORKER_ID, SWEEP_LEASE_SEC]):
+            logger.warning("Sweep lease lost; another worker resumed it | sweep=%s", sweep_id)
+
+def resume_sweeps() -> int:
+    """
+    Take over running sweeps whose worker lease expired (the worker died or
+    restarted) and queue their points that have no row yet; returns how many.
+    """
+    resumed = 0
+    for sweep_id in redis_client.smembers(_K_RUNNING):
+        meta = redis_client.hgetall(_k_sweep(sweep_id))
+        if not meta or meta.get("status") != "running":
+            redis_client.srem(_K_RUNNING, sweep_id)
+            continue
+        if not redis_client.set(_k_lease(sweep_id), _WORKER_ID, nx=True, ex=SWEEP_LEASE_SEC):
+            continue   # its worker is alive
+
+        done = {int(i) for i in redis_client.hkeys(_k_rows(sweep_id))}
+        pending = {i: p for i, p in enumerate(codec.json_loads(meta["points"])) if i not in done}
+        if not pending:
+            # its worker died between the last row and the status
+            redis_client.hset(_k_sweep(sweep_id), "status", "done")
+            redis_client.srem(_K_RUNNING, sweep_id)
+            _release_if_idle(sweep_id)
+            continue
+        sub, model = meta["owner"], meta["model"]
+        groups = _group_points(sweep_id, sub, model, codec.json_loads(meta["inputs"]), pending)
+        _job_queued(sweep_id)
+        _dispatch(sweep_id, sub, model, groups)
+        _job_finished(sweep_id)
+        resumed += 1
+        logger.info("Sweep resumed | id=%s pending=%s unique=%s", sweep_id, len(pending), len(groups))
+    return resumed
+
+def _loop() -> None:
+    while True:
+        try:
+            renew_leases()
+            resume_sweeps()
+        except Exception:
+            logger.exception("Sweep lease pass failed")
+        time.sleep(SWEEP_LEASE_SEC / 3)
+
+def start_sweep_worker() -> None:
+    """Start the thread that renews this process's sweep leases and resumes orphaned sweeps (once)."""
+    global _worker
+    if _worker is not None:
+        return
+    _worker = threading.Thread(target=_loop, name="sweep-leases", daemon=True)
+    _worker.start()
+
+
+def comparison_table(meta: dict, rows: Dict[str, str]) -> dict:
+    """{"columns": [...], "rows": [[...], ...]} ordered by point index."""
+    swept = codec.json_loads(meta["swept"])
+    points = codec.json_loads(meta["points"])
+    parsed = {int(i): codec.json_loads(r) for i, r in rows.items()}
+    metric_names = sorted({m for r in parsed.values() for m in (r.get("metrics") or {})})
+
+    columns = ["index"] + swept + ["status", "cached"] + metric_names + ["layers", "error"]
+    out = []
+    for i, params in enumerate(points):
+        r = parsed.get(i) or {"status": "pending"}
+        metrics = r.get("metrics") or {}
+        out.append(
+            [i] + [params.get(f) for f in swept]
+            + [r.get("status"), bool(r.get("cached"))]
+            + [metrics.get(m) for m in metric_names]
+            + [",".join(r.get("layers") or []), r.get("error")]
+        )
+    return {"columns": columns, "rows": out}
+
+
+def _load_owned(sub: str, sweep_id: str) -> dict:
+    meta = redis_client.hgetall(_k_sweep(sweep_id))
+    if not meta or meta.get("owner") != sub:
+        raise HTTPException(status_code=404, detail="Sweep not found")
+    return meta
+
+
+# ---------- Routes ----------
+@router.post("/sweeps", response_model=SweepCreated, status_code=202)
+def create_sweep(req: SweepRequest, user=Depends(require_user)):
+    try:
+        return start_sweep(req, user.get("sub"))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/sweeps")
+def list_sweeps(user=Depends(require_user)):
+    sub = user.get("sub")
+    ids = redis_client.zrevrange(_k_user_sweeps(sub), 0, 99)
+    pipe = redis_client.pipeline()
+    for sid in ids:
+        pipe.hmget(_k_sweep(sid), "model", "status", "total", "done", "failed", "created_at")
+    out = []
+    for sid, vals in zip(ids, pipe.execute() if ids else []):
+        model, status, total, done, failed, created_at = vals
+        if model is None:
+            continue  # expired
+        out.append({"id": sid, "model": model, "status": status, "total": int(total), "done": int(done),
+                    "failed": int(failed), "created_at": float(created_at)})
+    return out
+
+@router.get("/sweeps/{sweep_id}")
+def get_sweep(sweep_id: str, format: str = "json", user=Depends(require_user)):
+    meta = _load_owned(user.get("sub"), sweep_id)
+    table = comparison_table(meta, redis_client.hgetall(_k_rows(sweep_id)))
+
+    if format == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(table["columns"])
+        writer.writerows(table["rows"])
+        return Response(content=buf.getvalue(), media_type="text/csv",
+                        headers={"Content-Disposition": f'attachment; filename="sweep-{sweep_id}.csv"'})
+
+    return {
+        "id": sweep_id,
+        "model": meta["model"],
+        "status": meta["status"],
+        "total": int(meta["total"]),
+        "done": int(meta["done"]),
+        "failed": int(meta["failed"]),
+        "table": table,
+    }
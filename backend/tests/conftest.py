@@ -0,0 +1,5 @@
+# Backend modules are flat (imported as `import sessions`, not as a package)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+"""geometry.ingest_geojson: clipping drawn areas to the pilot's bounding area."""
+import json
+
+import pytest
+from shapely.geometry import box
+
+import geometry
+
+
+@pytest.fixture
+def pilot(monkeypatch):
+    monkeypatch.setitem(geometry.PILOT_SHAPES, "PILOT_TEST", box(0, 0, 10, 10))
+    return "PILOT_TEST"
+
+
+def _feature(coords):
+    return json.dumps({"type": "Feature", "properties": {}, "geometry": {"type": "Polygon", "coordinates": [coords]}})
+
+
+def test_clip_inside_keeps_polygon(pilot):
+    area = geometry.ingest_geojson(_feature([[1, 1], [4, 1], [4, 4], [1, 4], [1, 1]]), pilot=pilot)
+    geom = json.loads(area.geojson)["features"][0]["geometry"]
+    assert geom["type"] == "Polygon"
+    assert area.area_m2 > 0
+
+
+def test_clip_keeps_polygons_of_geometry_collection(pilot):
+    # bottom bar crosses x=10; the top arm only touches the boundary along x=10, y 6..8,
+    # so the intersection is POLYGON + LINESTRING
+    raw = _feature([[8, 2], [12, 2], [12, 8], [10, 8], [10, 6], [11, 6], [11, 4], [8, 4], [8, 2]])
+    assert geometry.PILOT_SHAPES[pilot].intersection(
+        geometry.shape(json.loads(raw)["geometry"])).geom_type == "GeometryCollection"
+
+    area = geometry.ingest_geojson(raw, pilot=pilot)
+    features = json.loads(area.geojson)["features"]
+    assert len(features) == 1
+    clipped = geometry.shape(features[0]["geometry"])
+    assert clipped.geom_type == "Polygon"
+    assert clipped.equals(box(8, 2, 10, 4))
+
+
+def test_polygonal_rebuilds_multipolygon():
+    two = box(0, 0, 1, 1).union(box(2, 0, 3, 1))
+    collection = geometry.shapely.GeometryCollection([two, box(5, 5, 6, 6), geometry.shapely.Point(9, 9)])
+    out = geometry._polygonal(collection)
+    assert out.geom_type == "MultiPolygon"
+    assert len(out.geoms) == 3
+    assert geometry._polygonal(geometry.shapely.LineString([(0, 0), (1, 1)])) is None
+
+
+def test_clip_outside_rejected(pilot):
+    with pytest.raises(geometry.GeometryError):
+        geometry.ingest_geojson(_feature([[20, 20], [21, 20], [21, 21], [20, 21], [20, 20]]), pilot=pilot)
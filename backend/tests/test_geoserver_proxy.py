@@ -0,0 +1,111 @@
+"""geoserver_proxy against a local stub WMS server: cache hits, coalescing, ETag/304, OGC errors."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import geoserver_proxy
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+SERVICE_EXCEPTION = b'<?xml version="1.0"?><ServiceExceptionReport><ServiceException>boom</ServiceException></ServiceExceptionReport>'
+
+
+class StubWMS(BaseHTTPRequestHandler):
+    hits = []
+    delay = 0.0
+
+    def do_GET(self):
+        params = {k.upper(): v for k, v in parse_qsl(urlparse(self.path).query)}
+        StubWMS.hits.append(params)
+        time.sleep(StubWMS.delay)
+        if params.get("LAYERS") == "broken":
+            body, ctype = SERVICE_EXCEPTION, "application/vnd.ogc.se_xml"
+        else:
+            body, ctype = PNG, "image/png"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWMS)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubWMS.hits = []
+    StubWMS.delay = 0.0
+    monkeypatch.setattr(geoserver_proxy, "GEOSERVER_WMS_URL", f"http://127.0.0.1:{server.server_port}/wms")
+    monkeypatch.setattr(geoserver_proxy, "_mem", geoserver_proxy._MemoryLRU(1024 * 1024))
+    monkeypatch.setattr(geoserver_proxy, "_disk", geoserver_proxy._DiskCache(str(tmp_path), 1024 * 1024))
+    yield StubWMS
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(geoserver_proxy.router, prefix="/api")
+    return TestClient(app)
+
+
+GETMAP = {"SERVICE": "WMS", "REQUEST": "GetMap", "LAYERS": "crops", "FORMAT": "image/png",
+          "BBOX": "0,0,1,1", "WIDTH": "256", "HEIGHT": "256"}
+
+
+def test_cache_hit_skips_upstream(stub, client):
+    first = client.get("/api/geoserver/wms", params=GETMAP)
+    # same request with other casing and BBOX noise normalizes to the same key
+    second = client.get("/api/geoserver/wms", params=dict(GETMAP, REQUEST="getmap", BBOX="0,0,1.0000000001,1"))
+    assert first.status_code == second.status_code == 200
+    assert second.content == PNG
+    assert len(stub.hits) == 1
+
+
+def test_disk_tier_serves_after_memory_is_lost(stub, client, monkeypatch):
+    client.get("/api/geoserver/wms", params=GETMAP)
+    monkeypatch.setattr(geoserver_proxy, "_mem", geoserver_proxy._MemoryLRU(1024 * 1024))
+    assert client.get("/api/geoserver/wms", params=GETMAP).content == PNG
+    assert len(stub.hits) == 1
+
+
+def test_concurrent_misses_are_coalesced(stub):
+    stub.delay = 0.3
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        entries = list(pool.map(lambda _: geoserver_proxy.fetch_cached(list(GETMAP.items())), range(8)))
+    assert {e.body for e in entries} == {PNG}
+    assert len(stub.hits) == 1
+
+
+def test_etag_revalidation_returns_304(stub, client):
+    first = client.get("/api/geoserver/wms", params=GETMAP)
+    etag = first.headers["etag"]
+    assert "max-age" in first.headers["cache-control"]
+    second = client.get("/api/geoserver/wms", params=GETMAP, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+
+
+def test_service_exception_is_not_cached(stub, client):
+    params = dict(GETMAP, LAYERS="broken")
+    for _ in range(2):
+        r = client.get("/api/geoserver/wms", params=params)
+        assert r.status_code == 200
+        assert r.headers["cache-control"] == "no-store"
+        assert "etag" not in r.headers
+    assert len(stub.hits) == 2
+
+
+def test_unsupported_request_is_rejected(stub, client):
+    r = client.get("/api/geoserver/wms", params={"REQUEST": "Transaction"})
+    assert r.status_code == 400
+    assert stub.hits == []
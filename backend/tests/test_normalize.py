@@ -0,0 +1,63 @@
+"""normalize.read_api_data / normalize_result: bounded memory on large validation responses."""
+import json
+import tracemalloc
+
+import pytest
+
+import normalize
+
+pytest.importorskip("ijson")
+
+FEATURES, VALUES = 10, 2000          # 20k plot points, well above PLOT_MAX_POINTS
+ROW = b"[1.25, 2.5, 3.75, 4.125, 5.5, 6.75, 7.875, 8.0],"
+ROW_BLOCKS = 60                      # ~12 MB of output normalization never reads
+
+
+def _chunks():
+    """A validation response generated chunk by chunk, never held whole."""
+    yield b'{"raw_output": ['
+    block = ROW * 4096
+    for _ in range(ROW_BLOCKS):
+        yield block
+    yield b'[0]], "geoserver_data": {"layers": ["ws:layer"]}, "User Explanation": "why", "Validation Statistics": '
+    plot = [{"feature": f"f{i}", "values": [i + j / VALUES for j in range(VALUES)]} for i in range(FEATURES)]
+    yield json.dumps({"Explainability Plot Data": plot, "Explainability Plot Offset": 0.5}).encode()
+    yield b"}"
+
+
+class StreamedResponse:
+    def iter_content(self, chunk_size):
+        return _chunks()
+
+
+def test_large_validation_response_memory_is_bounded(monkeypatch):
+    monkeypatch.setattr(normalize, "API_SPOOL_MEMORY_BYTES", 1 << 20)
+    body_size = sum(len(c) for c in _chunks())
+    stored = []
+
+    tracemalloc.start()
+    try:
+        api_data = normalize.read_api_data(StreamedResponse())
+        result = normalize.normalize_result(api_data, normalize.empty_result(),
+                                            store_full=lambda data: stored.append(data) or "hash")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # only the needed keys were built; the body itself spilled to disk past 1 MiB
+    assert "raw_output" not in api_data
+    assert peak < body_size / 3, f"peak {peak} bytes for a {body_size}-byte response"
+
+    entry = result["chart_data"][0]
+    assert normalize._point_count(entry["data"]) <= normalize.PLOT_MAX_POINTS
+    assert len(entry["data"]) == FEATURES
+    assert entry["full_data"] == "hash"
+    assert normalize._point_count(stored[0]) == FEATURES * VALUES
+    assert result["map_layers"] == ["ws:layer"]
+
+
+def test_downsample_keeps_ends():
+    series = list(range(10_000))
+    out = normalize.downsample_plot(series, limit=100)
+    assert len(out) == 100
+    assert out[0] == 0 and out[-1] == 9_999
@@ -0,0 +1,170 @@
+# tile_warmup.py
+"""
+Warm the WMS cache (geoserver_proxy) as soon as a model run returns its layers.
+
+For every returned layer the capabilities, legend and the first zoom levels of
+256px EPSG:3857 tiles over the drawn area (or the pilot area) are fetched for
+every time step the slider can show, so opening the results, also later from
+the email deep link, is served from cache. Tile parameters mirror what the
+SPA's TileWMS source requests, so the normalized cache keys match.
+
+Config (env):
+    WARMUP_ENABLED        1 to enable (default: 1; needs GEOSERVER_WMS_URL)
+    WARMUP_ZOOM_LEVELS    zoom levels to warm, starting at the one that fits the area (default: 2)
+    WARMUP_MAX_REQUESTS   cap on requests per warm-up job (default: 2000)
+    WARMUP_CONCURRENCY    parallel upstream fetches (default: 4)
+"""
+import os
+import math
+import json
+import logging
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import geoserver_proxy
+from geometry import PILOT_BOUNDS
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+WARMUP_ZOOM_LEVELS = int(os.getenv("WARMUP_ZOOM_LEVELS", "2"))
+WARMUP_MAX_REQUESTS = int(os.getenv("WARMUP_MAX_REQUESTS", "2000"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+
+TILE_SIZE = 256
+VIEW_PX = 800  # rough map width in the SPA, used to pick the first zoom level
+WEB_MERCATOR_HALF = 20037508.342789244
+
+_jobs = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wms-warmup")
+_fetchers = ThreadPoolExecutor(max_workers=WARMUP_CONCURRENCY, thread_name_prefix="wms-fetch")
+
+
+# ---------- Tile math (EPSG:3857, OpenLayers default grid) ----------
+def _to_mercator(lon: float, lat: float) -> Tuple[float, float]:
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = lon * WEB_MERCATOR_HALF / 180.0
+    y = math.log(math.tan((90 + lat) * math.pi / 360.0)) * WEB_MERCATOR_HALF / math.pi
+    return x, y
+
+def _fit_zoom(minx: float, maxx: float) -> int:
+    """Zoom at which the area's width fits roughly into the map view."""
+    width = max(maxx - minx, 1.0)
+    z = math.log2((2 * WEB_MERCATOR_HALF * VIEW_PX) / (TILE_SIZE * width))
+    return max(0, min(18, int(math.floor(z))))
+
+def tile_bboxes(bounds: Tuple[float, float, float, float], z: int) -> List[str]:
+    """BBOX strings of the tiles covering lon/lat bounds at zoom z."""
+    minx, miny = _to_mercator(bounds[0], bounds[1])
+    maxx, maxy = _to_mercator(bounds[2], bounds[3])
+    size = 2 * WEB_MERCATOR_HALF / (2 ** z)
+    x0 = int((minx + WEB_MERCATOR_HALF) // size)
+    x1 = int((maxx + WEB_MERCATOR_HALF) // size)
+    y0 = int((WEB_MERCATOR_HALF - maxy) // size)
+    y1 = int((WEB_MERCATOR_HALF - miny) // size)
+    out = []
+    for tx in range(x0, x1 + 1):
+        for ty in range(y0, y1 + 1):
+            left = -WEB_MERCATOR_HALF + tx * size
+            top = WEB_MERCATOR_HALF - ty * size
+            out.append(f"{left},{top - size},{left + size},{top}")
+    return out
+
+
+# ---------- Capabilities ----------
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def layer_time_steps(capabilities_xml: bytes, layer_names: Iterable[str]) -> Dict[str, List[str]]:
+    """Time dimension values per layer from a WMS GetCapabilities document."""
+    wanted = set(layer_names)
+    out: Dict[str, List[str]] = {}
+    root = ET.fromstring(capabilities_xml)
+    for layer in root.iter():
+        if _local(layer.tag) != "Layer":
+            continue
+        name = next((c.text for c in layer if _local(c.tag) == "Name"), None)
+        if name not in wanted:
+            continue
+        for c in layer:
+            if _local(c.tag) == "Dimension" and c.get("name") == "time" and c.text:
+                out[name] = [t.strip() for t in c.text.split(",") if t.strip()]
+    return out
+
+
+# ---------- Warm-up job ----------
+def _area_bounds(pilot: Optional[str], geojson: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    if geojson:
+        try:
+            from shapely.geometry import shape
+            data = json.loads(geojson) if isinstance(geojson, str) else geojson
+            feats = data.get("features", [data])
+            b = [shape(f["geometry"]).bounds for f in feats]
+            return (min(x[0] for x in b), min(x[1] for x in b), max(x[2] for x in b), max(x[3] for x in b))
+        except Exception:
+            logger.warning("Warm-up: could not read area bounds from GeoJSON")
+    return PILOT_BOUNDS.get((pilot or "").upper())
+
+def _requests_for(layers: List[str], steps: Dict[str, List[str]], bounds) -> List[list]:
+    reqs = []
+    for name in layers:
+        reqs.append([("REQUEST", "GetLegendGraphic"), ("VERSION", "1.3.0"), ("FORMAT", "image/png"), ("LAYER", name)])
+
+    if bounds is None:
+        return reqs
+    mx0, _ = _to_mercator(bounds[0], bounds[1])
+    mx1, _ = _to_mercator(bounds[2], bounds[3])
+    z0 = _fit_zoom(mx0, mx1)
+    for z in range(z0, z0 + WARMUP_ZOOM_LEVELS):
+        boxes = tile_bboxes(bounds, z)
+        for name in layers:
+            for t in steps.get(name) or [None]:
+                for bbox in boxes:
+                    params = [
+                        ("SERVICE", "WMS"), ("VERSION", "1.3.0"), ("REQUEST", "GetMap"),
+                        ("FORMAT", "image/png"), ("TRANSPARENT", "true"), ("TILED", "true"),
+                        ("LAYERS", name), ("STYLES", ""), ("WIDTH", str(TILE_SIZE)), ("HEIGHT", str(TILE_SIZE)),
+                        ("CRS", "EPSG:3857"), ("BBOX", bbox),
+                    ]
+                    if t:
+                        params.append(("TIME", t))
+                    reqs.append(params)
+    return reqs
+
+def _fetch_quietly(params) -> bool:
+    try:
+        return geoserver_proxy.fetch_cached(params).status == 200
+    except Exception:
+        return False
+
+def _run(layers: List[str], pilot: Optional[str], geojson: Optional[str]) -> None:
+    caps = geoserver_proxy.fetch_cached([("SERVICE", "WMS"), ("VERSION", "1.3.0"), ("REQUEST", "GetCapabilities")])
+    steps = {}
+    if caps.status == 200:
+        try:
+            steps = layer_time_steps(caps.body, layers)
+        except ET.ParseError:
+            logger.warning("Warm-up: unreadable GetCapabilities response")
+
+    reqs = _requests_for(layers, steps, _area_bounds(pilot, geojson))
+    if len(reqs) > WARMUP_MAX_REQUESTS:
+        logger.info("Warm-up: capping %s requests to %s", len(reqs), WARMUP_MAX_REQUESTS)
+        reqs = reqs[:WARMUP_MAX_REQUESTS]
+
+    ok = sum(_fetchers.map(_fetch_quietly, reqs))
+    logger.info("Warm-up done | layers=%s requests=%s ok=%s", len(layers), len(reqs), ok)
+
+
+def schedule_warmup(layers: Iterable[str], pilot: Optional[str] = None, geojson: Optional[str] = None) -> None:
+    """Queue a background warm-up for the given result layers; never raises."""
+    layers = [l for l in (layers or []) if isinstance(l, str) and l]
+    if not (WARMUP_ENABLED and geoserver_proxy.GEOSERVER_WMS_URL and layers):
+        return
+
+    def _job():
+        try:
+            _run(layers, pilot, geojson)
+        except Exception:
+            logger.exception("Warm-up failed | layers=%s", layers)
+
+    _jobs.submit(_job)
@@ -0,0 +1,195 @@
+# turns.py
+"""
+Per-session serialization of chat turns, and idempotent /api/chat replies.
+
+A turn reads ``state:{sid}``, advances the wizard and saves it back. Two turns
+of the same session (a double click, two tabs) must not interleave, so each
+turn holds ``turnlock:{sid}`` (SET NX PX with a random token, released only by
+its holder). Taking the lock also bumps the session's fencing token
+(``turnfence:{sid}``); state_manager.save_state writes only while the token it
+was issued is still current, so a turn that outlived its lock (or a session
+cleared meanwhile) cannot overwrite newer state.
+
+A turn sent with a client request ID (``request_id`` in the body, or an
+``Idempotency-Key`` header) is claimed under ``chat:{sid}:idem:{key}`` before
+it runs, and its reply is stored there when it finishes. A retry of the same
+request (axios after a 401, a client timeout behind nginx's 600s proxy
+timeout, a double click) never runs the turn or its model call again: it
+returns the stored reply, or waits briefly for the attempt still in progress
+and otherwise answers 202 with Retry-After, so duplicates never hold a worker
+thread for long. A claim carries a random token and is dropped only by the
+attempt that made it.
+
+Config (env):
+    TURN_LOCK_TTL_MS        lock lease; covers the slowest synchronous model run (default: 15 min)
+    TURN_LOCK_WAIT_SEC      how long a turn waits for the previous one (default: 30)
+    IDEMPOTENCY_TTL_SEC     how long replies are kept for duplicate submissions (default: 600)
+    IDEMPOTENCY_WAIT_SEC    how long a retry waits for the attempt in progress (default: 5)
+    IDEMPOTENCY_RETRY_AFTER_SEC  Retry-After sent when it is still running (default: 10)
+"""
+import os
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+import codec
+from redis_conn import redis_client, redis_bin
+
+logger = logging.getLogger(__name__)
+
+TURN_LOCK_TTL_MS = int(os.getenv("TURN_LOCK_TTL_MS", str(15 * 60 * 1000)))
+TURN_LOCK_WAIT_SEC = float(os.getenv("TURN_LOCK_WAIT_SEC", "30"))
+IDEMPOTENCY_TTL_SEC = int(os.getenv("IDEMPOTENCY_TTL_SEC", "600"))
+# a waiting retry holds a threadpool thread, so it only covers a double click
+IDEMPOTENCY_WAIT_SEC = float(os.getenv("IDEMPOTENCY_WAIT_SEC", "5"))
+IDEMPOTENCY_RETRY_AFTER_SEC = int(os.getenv("IDEMPOTENCY_RETRY_AFTER_SEC", "10"))
+FENCE_TTL_SEC = 14 * 24 * 60 * 60  # same as SESSION_TTL_SEC
+
+# fencing token of the turn running in this context (None outside a turn)
+_fence: ContextVar[Optional[int]] = ContextVar("turn_fence", default=None)
+
+
+class TurnBusy(Exception):
+    """The previous turn of this session is still running."""
+
+
+# ---------- Key helpers ----------
+def _k_lock(sid: str) -> str:
+    return f"turnlock:{sid}"
+
+def _k_fence(sid: str) -> str:
+    return f"turnfence:{sid}"
+
+def _k_idem(sid: str, key: str) -> str:
+    return f"chat:{sid}:idem:{key}"
+
+
+# ---------- Scripts ----------
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_script = redis_client.register_script(_RELEASE_LUA)
+
+# SET value only while the caller's fencing token is current
+_FENCED_SET_LUA = """
+local current = redis.call('GET', KEYS[2])
+if current and current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+_fenced_set_script = redis_bin.register_script(_FENCED_SET_LUA)
+
+# drops an idempotency record while it is still the claim holding ARGV[1]
+_RELEASE_CLAIM_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_claim_script = redis_bin.register_script(_RELEASE_CLAIM_LUA)
+
+
+# ---------- Lock ----------
+@contextmanager
+def session_turn(sid: str, wait_sec: float = TURN_LOCK_WAIT_SEC) -> Iterator[int]:
+    """
+    Hold the session's turn lock for the ``with`` block; yields the fencing
+    token. Raises TurnBusy if the lock is not free within ``wait_sec``.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait_sec
+    delay = 0.05
+    while not redis_client.set(_k_lock(sid), token, nx=True, px=TURN_LOCK_TTL_MS):
+        if time.monotonic() >= deadline:
+            raise TurnBusy(sid)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+    pipe = redis_client.pipeline()
+    pipe.incr(_k_fence(sid))
+    pipe.expire(_k_fence(sid), FENCE_TTL_SEC)
+    fence = pipe.execute()[0]
+    reset = _fence.set(fence)
+    try:
+        yield fence
+    finally:
+        _fence.reset(reset)
+        try:
+            _release_script(keys=[_k_lock(sid)], args=[token])
+        except Exception:
+            logger.exception("Failed to release turn lock | sess=%s", sid)
+
+def invalidate_turns(sid: str) -> None:
+    """Make writes of any running turn of this session fail (e.g. on clear)."""
+    pipe = redis_client.pipeline()
+    pipe.incr(_k_fence(sid))
+    pipe.expire(_k_fence(sid), FENCE_TTL_SEC)
+    pipe.execute()
+
+def fenced_set(sid: str, key: str, value: bytes, ttl_sec: int) -> bool:
+    """
+    SET key for session sid, unless a newer turn took over since this one
+    started. Outside a turn the write is unconditional. Returns False if fenced off.
+    """
+    fence = _fence.get()
+    if fence is None:
+        redis_bin.set(key, value, ex=ttl_sec)
+        return True
+    if _fenced_set_script(keys=[key, _k_fence(sid)], args=[fence, value, ttl_sec]):
+        return True
+    logger.warning("Stale turn write dropped | sess=%s key=%s fence=%s", sid, key, fence)
+    return False
+
+
+# ---------- Idempotent replies ----------
+# record: {"status": "running", "claim": token} while the first attempt runs, then {"status": "done", "reply": {...}}
+def _load_record(sid: str, key: str) -> Optional[dict]:
+    raw = redis_bin.get(_k_idem(sid, key))
+    return codec.loads(raw) if raw else None
+
+def cached_reply(sid: str, key: Optional[str]) -> Optional[dict]:
+    """The stored reply of a finished request, if any."""
+    record = _load_record(sid, key) if key else None
+    return record.get("reply") if record and record.get("status") == "done" else None
+
+def claim_request(sid: str, key: Optional[str]) -> Optional[bytes]:
+    """
+    Mark the request as running; returns the claim (pass it to release_request),
+    or None if another attempt already claimed it. The claim outlives a crashed
+    attempt only as long as the turn lock would.
+    """
+    claim = codec.dumps({"status": "running", "claim": uuid.uuid4().hex})
+    if key and not redis_bin.set(_k_idem(sid, key), claim, nx=True, px=TURN_LOCK_TTL_MS):
+        return None
+    return claim
+
+def release_request(sid: str, key: Optional[str], claim: Optional[bytes]) -> None:
+    """Drop this attempt's unfinished claim so a retry can run the request."""
+    if key and claim:
+        _release_claim_script(keys=[_k_idem(sid, key)], args=[claim])
+
+def wait_for_reply(sid: str, key: str, wait_sec: float = IDEMPOTENCY_WAIT_SEC) -> Optional[dict]:
+    """
+    Reply of the attempt in progress, once it finishes. None if it is still
+    running after wait_sec, or if it was dropped (then the caller may claim it).
+    """
+    deadline = time.monotonic() + wait_sec
+    while True:
+        record = _load_record(sid, key)
+        if record is None or record.get("status") == "done":
+            return record.get("reply") if record else None
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.5)
+
+def store_reply(sid: str, key: Optional[str], out: dict) -> None:
+    if key:
+        redis_bin.set(_k_idem(sid, key), codec.dumps({"status": "done", "reply": out}), ex=IDEMPOTENCY_TTL_SEC)
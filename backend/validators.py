@@ -1,23 +1,156 @@
 # validators.py
+"""
+Input validators shared by the chat wizard, slot filling, the model run API and sweeps.
+
+Allowed values are frozensets built once at import; numbers are parsed once
+(``parse_number``) and stored typed in ``collected_inputs``, so building the
+upstream payload needs no further conversion. ``INPUT_RULES`` maps every
+collected input to its coercion and error message; ``validate_inputs``
+checks a whole ``collected_inputs`` dict in one pass.
+"""
+import re
+import math
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+CROP_TYPES = frozenset({"wheat", "maize"})
+PILOTS = frozenset({"PILOT_THESSALONIKI", "PILOT_PILSEN", "PILOT_OLOMOUC", "GREECE", "CZECHIA"})
+TIME_PERIODS = frozenset({"past", "future"})
+YES_NO = frozenset({"yes", "no"})
+
+_INT_RE = re.compile(r"[+-]?\d+")
+
 
 def validate_crop_type(value: str):
     value = value.strip().lower()
-    return value if value in ["wheat", "maize"] else None
+    return value if value in CROP_TYPES else None
 
 def validate_pilot(value: str):
     value = value.strip().upper()
-    return value if value in ["PILOT_THESSALONIKI", "PILOT_PILSEN", "PILOT_OLOMOUC", "GREECE", "CZECHIA"] else None
+    return value if value in PILOTS else None
 
 def validate_time_period(value: str):
     value = value.strip().lower()
-    return value if value in ["past", "future"] else None
+    return value if value in TIME_PERIODS else None
 
 def validate_validation(value: str):
     value = value.strip().lower()
-    return value if value in ["yes", "no"] else None
+    return value if value in YES_NO else None
 
 def validate_geojson(value: str):
     return value if value.strip().startswith("{") and '"type":' in value else None
 
 def validate_zero_one(value):
-    return value if 0.0 <= value <= 1.0 else None
\ No newline at end of file
+    return value if value is not None and 0.0 <= value <= 1.0 else None
+
+def parse_number(value):
+    """int for integer text, float otherwise; numbers pass through; None if not a finite number."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value if math.isfinite(value) else None
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    if _INT_RE.fullmatch(text):
+        return int(text)
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+# ---------- Registry ----------
+@dataclass(frozen=True)
+class InputRule:
+    coerce: Callable[[Any], Any]   # typed value, or None if invalid
+    error: str
+
+def _text(validator):
+    return lambda value: validator(value) if isinstance(value, str) else None
+
+def _number(value):
+    n = parse_number(value)
+    return None if n is None else float(n)
+
+def _zero_one(value):
+    return validate_zero_one(_number(value))
+
+def _positive(value):
+    n = _number(value)
+    return n if n is not None and n > 0 else None
+
+_ZERO_ONE = InputRule(_zero_one, "must be a number between 0 and 1")
+_POSITIVE = InputRule(_positive, "must be a positive number")
+_NUMBER = InputRule(_number, "must be a number")
+_YES_NO = InputRule(_text(validate_validation), "must be yes or no")
+
+INPUT_RULES: Mapping[str, InputRule] = MappingProxyType({
+    "crop_type": InputRule(_text(validate_crop_type), "must be wheat or maize"),
+    "area": InputRule(_text(validate_pilot), "must be one of " + ", ".join(sorted(PILOTS))),
+    "time_period": InputRule(_text(validate_time_period), "must be past or future"),
+    "validation": _YES_NO,
+    "show_profit": _YES_NO,
+    "geojson": InputRule(_text(validate_geojson), "must be a GeoJSON text"),
+    "proximity_to_powerlines": _NUMBER,
+    "road_network_accessibility": _NUMBER,
+    "electricity_rate": _NUMBER,
+    "efficiency": _NUMBER,
+    "PV_area": _NUMBER,
+    "health_status": _ZERO_ONE,
+    "labor_availability": _ZERO_ONE,
+    "stress_level": _ZERO_ONE,
+    "satisfaction": _ZERO_ONE,
+    "policy_incentives": _ZERO_ONE,
+    "information_access": _ZERO_ONE,
+    "social_influence": _ZERO_ONE,
+    "community_participation": _ZERO_ONE,
+    "total_budget": _POSITIVE,
+    "pv_installation_cost": _POSITIVE,
+    "adoption_weight": _ZERO_ONE,
+    "resilience_weight": _ZERO_ONE,
+    "budget_overshoot_weight": _ZERO_ONE,
+})
+
+_PECS_INPUTS = ("health_status", "labor_availability", "stress_level", "satisfaction",
+                "policy_incentives", "information_access", "social_influence", "community_participation")
+
+# inputs each model needs before it can run
+MODEL_INPUTS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "crop_suitability": ("crop_type", "area", "time_period"),
+    "pv_suitability": ("area", "geojson", "proximity_to_powerlines", "road_network_accessibility",
+                       "PV_area", "electricity_rate", "efficiency", "time_period"),
+    "base-abm": ("area", "validation", "time_period"),
+    "pecs-abm": ("area",) + _PECS_INPUTS + ("validation", "time_period"),
+    "full-abm": ("area",) + _PECS_INPUTS + ("total_budget", "pv_installation_cost", "adoption_weight",
+                                            "resilience_weight", "budget_overshoot_weight", "validation", "time_period"),
+})
+
+
+def coerce(key: str, value: Any):
+    """Typed value for a collected input, or None if it is invalid (unknown keys pass through)."""
+    rule = INPUT_RULES.get(key)
+    return value if rule is None else rule.coerce(value)
+
+def validate_inputs(values: Mapping[str, Any], keys: Optional[Iterable[str]] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Validate many inputs in one pass. Returns (typed values, errors by key);
+    keys listed but absent from values are reported as missing.
+    """
+    out = dict(values)
+    errors = {}
+    for key in (values.keys() if keys is None else keys):
+        if values.get(key) is None:
+            errors[key] = "is missing"
+            continue
+        rule = INPUT_RULES.get(key)
+        if rule is None:
+            continue
+        typed = rule.coerce(values[key])
+        if typed is None:
+            errors[key] = rule.error
+        else:
+            out[key] = typed
+    return out, errors
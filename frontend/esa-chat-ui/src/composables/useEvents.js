@@ -0,0 +1,51 @@
+import { ref } from 'vue'
+import { keycloak } from '../auth/keycloak.js'
+
+// Server-sent events from /api/events (async job progress + results).
+// EventSource can't send headers, so the token goes in the query string;
+// on error we reconnect ourselves with a refreshed token.
+export default function useEvents(handlers = {}) {
+  const connected = ref(false)
+  let source = null
+  let retryTimer = null
+  let stopped = false
+
+  const base = import.meta.env.VITE_API_BASE || ''
+
+  async function connect() {
+    stopped = false
+    close(false)
+    try { await keycloak.updateToken(30) } catch (_) {}
+    if (!keycloak?.token) return
+
+    source = new EventSource(`${base}/api/events?access_token=${encodeURIComponent(keycloak.token)}`)
+    source.onopen = () => { connected.value = true }
+    source.onerror = () => {
+      connected.value = false
+      close(false)
+      if (!stopped) retryTimer = setTimeout(connect, 5000)
+    }
+
+    for (const [event, fn] of Object.entries(handlers)) {
+      source.addEventListener(event, e => {
+        try {
+          fn(JSON.parse(e.data))
+        } catch (err) {
+          console.warn(`Bad ${event} event:`, err)
+        }
+      })
+    }
+  }
+
+  function close(stop = true) {
+    if (stop) stopped = true
+    clearTimeout(retryTimer)
+    if (source) {
+      source.close()
+      source = null
+    }
+    connected.value = false
+  }
+
+  return { connected, connect, close }
+}
@@ -17,11 +17,67 @@ export default function useSessions(api) {
     return data
   }
 
+  // Title words (prefixes), pilot, service and date filters; served from the server's search index
+  async function searchSessions({ q = '', pilot = null, service = null, limit = 50 } = {}) {
+    const params = { limit }
+    if (q) params.q = q
+    if (pilot) params.pilot = pilot
+    if (service) params.service = service
+    const { data } = await api.get('/api/sessions/search', { params })
+    // { sessions: [{ id, title, updated_at, message_count, created_at, pilots, services }], total }
+    return data
+  }
+
   async function fetchSession(sessionId) {
     const { data } = await api.get(`/api/sessions/${sessionId}`)
     return data // { id,title,messages,created_at,updated_at }
   }
 
+  async function fetchSessionHeader(sessionId) {
+    const { data } = await api.get(`/api/sessions/${sessionId}/header`)
+    return data // { id,title,created_at,updated_at,message_count }
+  }
+
+  // One page, newest-first; pass the returned nextCursor to get older messages
+  async function fetchMessages(sessionId, { cursor = null, limit = 20 } = {}) {
+    const params = { limit }
+    if (cursor !== null && cursor !== undefined) params.cursor = cursor
+    const { data } = await api.get(`/api/sessions/${sessionId}/messages`, { params })
+    return { messages: data.messages, nextCursor: data.next_cursor, total: data.total }
+  }
+
+  // Heavy payloads (maps, charts) are stored once and fetched on demand
+  const blobCache = new Map()
+
+  function fetchBlob(hash) {
+    if (!blobCache.has(hash)) {
+      const pending = api.get(`/api/blobs/${hash}`).then(({ data }) => data)
+      pending.catch(() => blobCache.delete(hash))
+      blobCache.set(hash, pending)
+    }
+    return blobCache.get(hash)
+  }
+
+  const isBlobRef = v => v && typeof v === 'object' && !Array.isArray(v) &&
+    Object.keys(v).length === 1 && typeof v.$blob === 'string'
+
+  // Resolve {"$blob": hash} refs of a message (top level and one level down, e.g. mapData.wmsLayers)
+  async function hydrateMessage(msg) {
+    const jobs = []
+    for (const [key, value] of Object.entries(msg)) {
+      if (isBlobRef(value)) {
+        jobs.push(fetchBlob(value.$blob).then(v => { msg[key] = v }))
+      } else if (value && typeof value === 'object' && !Array.isArray(value)) {
+        for (const [k, v] of Object.entries(value)) {
+          if (isBlobRef(v)) jobs.push(fetchBlob(v.$blob).then(res => { value[k] = res }))
+        }
+      }
+    }
+    // a missing blob leaves its ref in place (saved back as-is) instead of failing the page
+    await Promise.allSettled(jobs)
+    return msg
+  }
+
   async function saveSession(sessionId, title, messages) {
     if (!sessionId || !Array.isArray(messages)) return
     saving.value = true
@@ -53,7 +109,12 @@ export default function useSessions(api) {
   return {
     saving,
     fetchSessions,
+    searchSessions,
     fetchSession,
+    fetchSessionHeader,
+    fetchMessages,
+    fetchBlob,
+    hydrateMessage,
     saveSession,
     debouncedSave,
     renameSession,
@@ -5,6 +5,7 @@ import VectorLayer from 'ol/layer/Vector'
 import VectorSource from 'ol/source/Vector'
 import ImageLayer from 'ol/layer/Image'
 import ImageWMS from 'ol/source/ImageWMS'
+import TileWMS from 'ol/source/TileWMS'
 import XYZ from 'ol/source/XYZ'
 import GeoJSON from 'ol/format/GeoJSON'
 
@@ -16,6 +17,7 @@ export {
   VectorSource,
   ImageLayer,
   ImageWMS,
+  TileWMS,
   XYZ,
   GeoJSON,
 };